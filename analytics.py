@@ -0,0 +1,247 @@
+# analytics.py - Sales and conversion reports served from trigger-maintained rollup tables
+import logging
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger("Analytics")
+
+def iso_week_sql(column):
+    """SQL for the ISO 8601 week key (2025-W47) of a timestamp column.
+
+    strftime's %G/%V need SQLite 3.46; the Thursday of the date's
+    Monday-Sunday week decides both the ISO year and the week number.
+    """
+    thursday = f"{column}, '-3 days', 'weekday 4'"
+    return f"printf('%s-W%02d', strftime('%Y', {thursday}), (strftime('%j', {thursday}) - 1) / 7 + 1)"
+
+# Rollup tables, kept current by the triggers below on every sales/conversations insert.
+# A sale's `parts` text is attributed whole; sessions come from the buyer's latest
+# WhatsApp conversation (conversations.thread_ref holds the session name).
+ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS sales_daily (
+        day TEXT,
+        payment_method TEXT,
+        currency TEXT,
+        sales INTEGER,
+        revenue REAL,
+        PRIMARY KEY (day, payment_method, currency)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sales_weekly (
+        week TEXT,
+        payment_method TEXT,
+        currency TEXT,
+        sales INTEGER,
+        revenue REAL,
+        PRIMARY KEY (week, payment_method, currency)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sales_part_daily (
+        day TEXT,
+        part TEXT,
+        sales INTEGER,
+        revenue REAL,
+        PRIMARY KEY (day, part)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS session_conversion (
+        session TEXT PRIMARY KEY,
+        conversations INTEGER DEFAULT 0,
+        converted INTEGER DEFAULT 0,
+        sales INTEGER DEFAULT 0,
+        revenue REAL DEFAULT 0
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_sales_rollup AFTER INSERT ON sales BEGIN
+        INSERT INTO sales_daily (day, payment_method, currency, sales, revenue)
+        VALUES (date(NEW.closed_at), lower(coalesce(NEW.payment_method, 'unknown')),
+                coalesce(NEW.currency, 'KES'), 1, coalesce(NEW.amount, 0))
+        ON CONFLICT (day, payment_method, currency)
+        DO UPDATE SET sales = sales + 1, revenue = revenue + excluded.revenue;
+
+        INSERT INTO sales_weekly (week, payment_method, currency, sales, revenue)
+        VALUES ({iso_week_sql('NEW.closed_at')}, lower(coalesce(NEW.payment_method, 'unknown')),
+                coalesce(NEW.currency, 'KES'), 1, coalesce(NEW.amount, 0))
+        ON CONFLICT (week, payment_method, currency)
+        DO UPDATE SET sales = sales + 1, revenue = revenue + excluded.revenue;
+
+        INSERT INTO sales_part_daily (day, part, sales, revenue)
+        VALUES (date(NEW.closed_at), lower(trim(coalesce(NEW.parts, ''))), 1, coalesce(NEW.amount, 0))
+        ON CONFLICT (day, part)
+        DO UPDATE SET sales = sales + 1, revenue = revenue + excluded.revenue;
+
+        INSERT INTO session_conversion (session, conversations, converted, sales, revenue)
+        SELECT coalesce((SELECT thread_ref FROM conversations
+                         WHERE lead_id = NEW.lead_id AND platform = 'whatsapp'
+                         ORDER BY id DESC LIMIT 1), 'unattributed'),
+               0,
+               NOT EXISTS (SELECT 1 FROM sales WHERE lead_id = NEW.lead_id AND id <> NEW.id),
+               1,
+               coalesce(NEW.amount, 0)
+        WHERE 1
+        ON CONFLICT (session) DO UPDATE SET
+            converted = converted + excluded.converted,
+            sales = sales + 1,
+            revenue = revenue + excluded.revenue;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_conversations_rollup AFTER INSERT ON conversations
+    WHEN NEW.platform = 'whatsapp' BEGIN
+        INSERT INTO session_conversion (session, conversations) VALUES (coalesce(NEW.thread_ref, 'default'), 1)
+        ON CONFLICT (session) DO UPDATE SET conversations = conversations + 1;
+    END
+    """,
+]
+
+# Rebuild the rollups from the base tables (migration backfill and manual repair)
+ROLLUP_BACKFILL = [
+    "DELETE FROM sales_daily",
+    "DELETE FROM sales_weekly",
+    "DELETE FROM sales_part_daily",
+    "DELETE FROM session_conversion",
+    """
+    INSERT INTO sales_daily (day, payment_method, currency, sales, revenue)
+    SELECT date(closed_at), lower(coalesce(payment_method, 'unknown')), coalesce(currency, 'KES'),
+           COUNT(*), SUM(coalesce(amount, 0))
+    FROM sales GROUP BY 1, 2, 3
+    """,
+    f"""
+    INSERT INTO sales_weekly (week, payment_method, currency, sales, revenue)
+    SELECT {iso_week_sql('closed_at')}, lower(coalesce(payment_method, 'unknown')), coalesce(currency, 'KES'),
+           COUNT(*), SUM(coalesce(amount, 0))
+    FROM sales GROUP BY 1, 2, 3
+    """,
+    """
+    INSERT INTO sales_part_daily (day, part, sales, revenue)
+    SELECT date(closed_at), lower(trim(coalesce(parts, ''))), COUNT(*), SUM(coalesce(amount, 0))
+    FROM sales GROUP BY 1, 2
+    """,
+    """
+    INSERT INTO session_conversion (session, conversations)
+    SELECT coalesce(thread_ref, 'default'), COUNT(*) FROM conversations
+    WHERE platform = 'whatsapp' GROUP BY 1
+    """,
+    """
+    INSERT INTO session_conversion (session, converted, sales, revenue)
+    SELECT session, COUNT(DISTINCT lead_id), COUNT(*), SUM(amount) FROM (
+        SELECT s.lead_id, coalesce(s.amount, 0) AS amount,
+               coalesce((SELECT c.thread_ref FROM conversations c
+                         WHERE c.lead_id = s.lead_id AND c.platform = 'whatsapp'
+                         ORDER BY c.id DESC LIMIT 1), 'unattributed') AS session
+        FROM sales s
+    ) WHERE 1 GROUP BY session
+    ON CONFLICT (session) DO UPDATE SET
+        converted = excluded.converted, sales = excluded.sales, revenue = excluded.revenue
+    """,
+]
+
+def install_rollups(conn):
+    """Create the rollup tables and triggers, then backfill them from existing rows"""
+    for statement in ROLLUP_SCHEMA:
+        conn.execute(statement)
+    rebuild_rollups(conn)
+
+def rebuild_rollups(conn):
+    for statement in ROLLUP_BACKFILL:
+        conn.execute(statement)
+
+def upgrade_week_keys(conn):
+    """Recreate the sales trigger and rebuild the rollups; weekly keys used to be strftime('%Y-W%W') week-start weeks"""
+    conn.execute("DROP TRIGGER IF EXISTS trg_sales_rollup")
+    install_rollups(conn)
+
+def iso_week(day):
+    """ISO 8601 week key, as stored in sales_weekly.week"""
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+class SalesAnalytics:
+    """Read side of the rollups; every query touches a bounded number of rollup rows"""
+    def __init__(self, conn):
+        self.conn = conn
+
+    def revenue_by_method(self, since_day):
+        return self.conn.execute(
+            "SELECT payment_method, currency, SUM(sales), SUM(revenue) FROM sales_daily "
+            "WHERE day >= ? GROUP BY payment_method, currency ORDER BY SUM(revenue) DESC",
+            (since_day,)
+        ).fetchall()
+
+    def day_totals(self, day):
+        return self.conn.execute(
+            "SELECT currency, SUM(sales), SUM(revenue) FROM sales_daily WHERE day = ? GROUP BY currency",
+            (day,)
+        ).fetchall()
+
+    def week_totals(self, week):
+        return self.conn.execute(
+            "SELECT currency, SUM(sales), SUM(revenue) FROM sales_weekly WHERE week = ? GROUP BY currency",
+            (week,)
+        ).fetchall()
+
+    def top_parts(self, since_day, n=5):
+        return self.conn.execute(
+            "SELECT part, SUM(sales), SUM(revenue) FROM sales_part_daily WHERE day >= ? "
+            "GROUP BY part ORDER BY SUM(revenue) DESC LIMIT ?",
+            (since_day, n)
+        ).fetchall()
+
+    def session_conversion(self):
+        return self.conn.execute(
+            "SELECT session, conversations, converted, sales, revenue FROM session_conversion "
+            "ORDER BY revenue DESC"
+        ).fetchall()
+
+    def report_text(self):
+        today = datetime.now(timezone.utc).date()
+        week_ago = (today - timedelta(days=6)).isoformat()
+
+        def money(rows):
+            return ", ".join(f"{currency} {revenue:,.0f} ({sales})" for currency, sales, revenue in rows) or "-"
+
+        lines = ["💵 Revenue (sales)"]
+        lines.append(f"Today: {money(self.day_totals(today.isoformat()))}")
+        lines.append(f"This week: {money(self.week_totals(iso_week(today)))}")
+        lines.append(f"Last week: {money(self.week_totals(iso_week(today - timedelta(days=7))))}")
+
+        lines.append("\n💳 Last 7 days by payment method")
+        by_method = self.revenue_by_method(week_ago)
+        for method, currency, sales, revenue in by_method:
+            lines.append(f"{method}: {currency} {revenue:,.0f} ({sales} sales)")
+        if not by_method:
+            lines.append("No sales in the last 7 days.")
+
+        parts = self.top_parts(week_ago)
+        if parts:
+            lines.append("\n🔧 Top parts (7 days)")
+            for part, sales, revenue in parts:
+                lines.append(f"{(part or 'unspecified')[:30]}: {revenue:,.0f} ({sales})")
+
+        lines.append("\n📱 WhatsApp conversion by session")
+        sessions = self.session_conversion()
+        for session, conversations, converted, sales, revenue in sessions:
+            if conversations:
+                lines.append(f"{session}: {converted}/{conversations} chats converted ({converted / conversations:.0%}), {revenue:,.0f} revenue")
+            else:
+                lines.append(f"{session}: {sales} sales without a WhatsApp chat, {revenue:,.0f} revenue")
+        if not sessions:
+            lines.append("No WhatsApp conversations recorded yet.")
+        return "\n".join(lines)
+
+    def export_tables(self):
+        """(name, columns, rows) for each rollup, as sent by the reports CSV export"""
+        return [
+            ("sales_daily", ["day", "payment_method", "currency", "sales", "revenue"],
+             self.conn.execute("SELECT day, payment_method, currency, sales, revenue FROM sales_daily ORDER BY day").fetchall()),
+            ("sales_weekly", ["week", "payment_method", "currency", "sales", "revenue"],
+             self.conn.execute("SELECT week, payment_method, currency, sales, revenue FROM sales_weekly ORDER BY week").fetchall()),
+            ("sales_by_part", ["day", "part", "sales", "revenue"],
+             self.conn.execute("SELECT day, part, sales, revenue FROM sales_part_daily ORDER BY day").fetchall()),
+            ("session_conversion", ["session", "conversations", "converted", "sales", "revenue"],
+             self.session_conversion()),
+        ]
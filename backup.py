@@ -0,0 +1,313 @@
+# backup.py - Online snapshots of empire.db via SQLite's backup API, with retention and restore
+# Usage: python backup.py snapshot | list | verify <name> | restore <name>   (stop the bot before restoring)
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import metrics
+
+logger = logging.getLogger("Backup")
+
+BACKUP_SECONDS = metrics.histogram(
+    "backup_seconds", "Wall time of one snapshot, copy plus compression",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+)
+BACKUP_FAILURES = metrics.counter("backup_failures_total", "Snapshots that failed or did not verify")
+BACKUP_RESTARTS = metrics.counter("backup_restarts_total", "Stepped copies restarted because another connection wrote")
+
+SUFFIX = ".db.gz"
+
+class _TooManyRestarts(Exception):
+    pass
+
+class Snapshot:
+    """One compressed snapshot on disk plus its manifest"""
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.name = path.name[:-len(SUFFIX)]
+        self.created = datetime.strptime(manifest["created_at"], "%Y-%m-%dT%H:%M:%S")
+
+    def line(self):
+        size = self.manifest["compressed_bytes"] / 1e6
+        return f"{self.name}  {size:.1f}MB  schema v{self.manifest.get('schema_version', '?')}"
+
+class BackupManager:
+    """Takes consistent snapshots of a live database without holding writers up.
+
+    The copy runs in a worker thread and moves `pages` pages per backup step,
+    pausing between steps to leave disk bandwidth to the console and the
+    WhatsApp workers. Under WAL the copy reads from one pinned snapshot, so
+    writers are never blocked and their commits don't restart it. Without
+    WAL, a copy restarted more than `max_restarts` times by other writers
+    finishes in one pass instead.
+    Each snapshot is verified with quick_check, gzipped and described by a
+    JSON manifest carrying its sha256.
+    """
+    def __init__(self, db_path="empire.db", backup_dir="backups", pages=256, pause=0.005,
+                 max_restarts=5, keep_recent=6, keep_daily=7, keep_weekly=4):
+        self.db_path = db_path
+        self.backup_dir = Path(backup_dir)
+        self.pages = pages
+        self.pause = pause
+        self.max_restarts = max_restarts
+        self.keep_recent = keep_recent
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+        self.last_result = None
+        self._lock = asyncio.Lock()
+
+    def _copy(self, dest_path):
+        """Stepped online copy of db_path into dest_path; returns (pages, restarts, stepped, schema version)"""
+        source = sqlite3.connect(self.db_path, timeout=10.0)
+        dest = sqlite3.connect(dest_path)
+        state = {"restarts": 0, "remaining": None, "pages": 0}
+
+        def progress(status, remaining, total):
+            # `remaining` going back up means another connection wrote and the copy started over
+            if state["remaining"] is not None and remaining > state["remaining"]:
+                state["restarts"] += 1
+                BACKUP_RESTARTS.inc()
+                if state["restarts"] > self.max_restarts:
+                    raise _TooManyRestarts()
+            state["remaining"] = remaining
+            state["pages"] = total
+            if remaining and self.pause:
+                time.sleep(self.pause)
+
+        try:
+            if source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+                # Pin one read snapshot for the whole copy: other connections' commits
+                # land in the WAL past our read mark instead of restarting the backup
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            try:
+                source.backup(dest, pages=self.pages, progress=progress)
+                stepped = True
+            except _TooManyRestarts:
+                logger.warning(f"Backup restarted {state['restarts']} times under write load, finishing in one pass")
+                source.backup(dest)
+                stepped = False
+                state["pages"] = dest.execute("PRAGMA page_count").fetchone()[0]
+            dest.execute("PRAGMA journal_mode=DELETE")
+            check = dest.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise sqlite3.DatabaseError(f"Snapshot failed quick_check: {check}")
+            version = dest.execute("SELECT MAX(version) FROM schema_meta").fetchone()[0]
+        finally:
+            dest.close()
+            source.close()
+        return state["pages"], state["restarts"], stepped, version
+
+    def snapshot(self):
+        """Take, verify, compress and register one snapshot (blocking; see run())"""
+        start = time.perf_counter()
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        created = datetime.now()
+        name = base = f"empire-{created.strftime('%Y%m%d-%H%M%S')}"
+        n = 1
+        while (self.backup_dir / f"{name}{SUFFIX}").exists():
+            name = f"{base}-{n}"
+            n += 1
+        fd, raw_path = tempfile.mkstemp(prefix=".copy-", suffix=".db", dir=self.backup_dir)
+        os.close(fd)
+        gz_tmp = self.backup_dir / f".{name}{SUFFIX}.tmp"
+        try:
+            pages, restarts, stepped, version = self._copy(raw_path)
+            copied = time.perf_counter() - start
+            digest = hashlib.sha256()
+            with open(raw_path, "rb") as src, open(gz_tmp, "wb") as raw_out:
+                with gzip.GzipFile(filename=f"{name}.db", mode="wb", fileobj=raw_out, compresslevel=6) as out:
+                    for chunk in iter(lambda: src.read(1 << 20), b""):
+                        out.write(chunk)
+                raw_out.flush()
+                os.fsync(raw_out.fileno())
+            with open(gz_tmp, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            manifest = {
+                "created_at": created.strftime("%Y-%m-%dT%H:%M:%S"),
+                "source": os.path.abspath(self.db_path),
+                "schema_version": version,
+                "pages": pages,
+                "raw_bytes": os.path.getsize(raw_path),
+                "compressed_bytes": gz_tmp.stat().st_size,
+                "sha256": digest.hexdigest(),
+                "stepped": stepped,
+                "restarts": restarts,
+                "copy_seconds": round(copied, 3),
+                "total_seconds": round(time.perf_counter() - start, 3),
+            }
+            final = self.backup_dir / f"{name}{SUFFIX}"
+            os.replace(gz_tmp, final)
+            self._write_manifest(final, manifest)
+        except Exception:
+            BACKUP_FAILURES.inc()
+            gz_tmp.unlink(missing_ok=True)
+            raise
+        finally:
+            os.unlink(raw_path)
+        BACKUP_SECONDS.observe(time.perf_counter() - start)
+        snap = Snapshot(final, manifest)
+        logger.info(
+            f"Snapshot {snap.name}: {manifest['raw_bytes'] / 1e6:.1f}MB -> {manifest['compressed_bytes'] / 1e6:.1f}MB "
+            f"in {manifest['total_seconds']:.1f}s ({'stepped' if stepped else 'single pass'}, {restarts} restarts)"
+        )
+        return snap
+
+    def _write_manifest(self, path, manifest):
+        tmp = path.with_name(path.name + ".json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path.with_name(path.name[:-len(SUFFIX)] + ".json"))
+
+    def list(self):
+        """Snapshots with a readable manifest, newest first"""
+        snaps = []
+        if not self.backup_dir.exists():
+            return snaps
+        for path in self.backup_dir.glob(f"empire-*{SUFFIX}"):
+            try:
+                with open(path.with_name(path.name[:-len(SUFFIX)] + ".json")) as f:
+                    snaps.append(Snapshot(path, json.load(f)))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Skipping {path.name}: unreadable manifest ({e})")
+        return sorted(snaps, key=lambda s: s.created, reverse=True)
+
+    def find(self, name):
+        name = name[:-len(SUFFIX)] if name.endswith(SUFFIX) else name
+        for snap in self.list():
+            if snap.name == name:
+                return snap
+        raise FileNotFoundError(f"No snapshot named {name} in {self.backup_dir}")
+
+    def verify(self, snap):
+        """Raise ValueError unless the compressed file still matches its manifest checksum"""
+        digest = hashlib.sha256()
+        with open(snap.path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        if digest.hexdigest() != snap.manifest["sha256"]:
+            raise ValueError(f"Checksum mismatch for {snap.name}: snapshot is corrupt")
+
+    def prune(self, now=None):
+        """Keep the newest `keep_recent`, plus the newest per day and per ISO week inside the windows"""
+        now = now or datetime.now()
+        snaps = self.list()
+        keep = set(s.name for s in snaps[:self.keep_recent])
+        days, weeks = set(), set()
+        for snap in snaps:
+            day = snap.created.date()
+            week = snap.created.isocalendar()[:2]
+            if day not in days and snap.created >= now - timedelta(days=self.keep_daily):
+                days.add(day)
+                keep.add(snap.name)
+            if week not in weeks and snap.created >= now - timedelta(weeks=self.keep_weekly):
+                weeks.add(week)
+                keep.add(snap.name)
+        removed = 0
+        for snap in snaps:
+            if snap.name in keep:
+                continue
+            snap.path.unlink(missing_ok=True)
+            snap.path.with_name(snap.name + ".json").unlink(missing_ok=True)
+            removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} old snapshots, {len(keep)} kept")
+        return removed
+
+    def restore(self, snap, target_path=None):
+        """Verify a snapshot and copy it over target_path with the backup API.
+
+        The current database is snapshotted first so a restore can be undone.
+        Run this with the bot and workers stopped: their caches would not
+        notice the rewind.
+        """
+        target_path = target_path or self.db_path
+        self.verify(snap)
+        fd, raw_path = tempfile.mkstemp(prefix=".restore-", suffix=".db", dir=self.backup_dir)
+        os.close(fd)
+        try:
+            with gzip.open(snap.path, "rb") as src, open(raw_path, "wb") as out:
+                shutil.copyfileobj(src, out, 1 << 20)
+            source = sqlite3.connect(raw_path)
+            try:
+                check = source.execute("PRAGMA quick_check").fetchone()[0]
+                if check != "ok":
+                    raise sqlite3.DatabaseError(f"Snapshot {snap.name} failed quick_check: {check}")
+                if os.path.exists(target_path):
+                    undo = BackupManager(target_path, self.backup_dir, pages=-1).snapshot()
+                    logger.info(f"Saved current database as {undo.name} before restoring")
+                target = sqlite3.connect(target_path, timeout=30.0)
+                try:
+                    source.backup(target)
+                    target.execute("PRAGMA journal_mode=WAL")
+                finally:
+                    target.close()
+            finally:
+                source.close()
+        finally:
+            os.unlink(raw_path)
+        logger.info(f"Restored {target_path} from {snap.name}")
+
+    async def run(self):
+        """Scheduler entry point: snapshot off the loop, then apply retention"""
+        if self._lock.locked():
+            logger.info("Backup already running, skipping")
+            return self.last_result
+        async with self._lock:
+            snap = await asyncio.to_thread(self.snapshot)
+            await asyncio.to_thread(self.prune)
+            self.last_result = snap
+            return snap
+
+    def report(self, limit=8):
+        snaps = self.list()
+        if not snaps:
+            return f"No snapshots yet in {self.backup_dir}/"
+        total = sum(s.manifest["compressed_bytes"] for s in snaps) / 1e6
+        lines = [f"{len(snaps)} snapshots, {total:.1f}MB in {self.backup_dir}/"]
+        lines += [s.line() for s in snaps[:limit]]
+        return "\n".join(lines)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    parser = argparse.ArgumentParser(description="Snapshot, verify and restore empire.db")
+    parser.add_argument("command", choices=["snapshot", "list", "verify", "restore", "prune"])
+    parser.add_argument("name", nargs="?", help="snapshot name for verify/restore (see list)")
+    parser.add_argument("--db", default="empire.db")
+    parser.add_argument("--dir", default=os.getenv("BACKUP_DIR", "backups"))
+    args = parser.parse_args()
+    manager = BackupManager(args.db, args.dir)
+
+    if args.command == "snapshot":
+        manager.snapshot()
+        manager.prune()
+    elif args.command == "list":
+        print(manager.report(limit=1000))
+    elif args.command == "prune":
+        manager.prune()
+    else:
+        if not args.name:
+            parser.error(f"{args.command} needs a snapshot name")
+        snap = manager.find(args.name)
+        if args.command == "verify":
+            manager.verify(snap)
+            print(f"{snap.name}: checksum ok")
+        else:
+            manager.restore(snap)
+
+if __name__ == "__main__":
+    main()
@@ -245,6 +245,7 @@ class WhatsAppManager {
                 timestamp: new Date().toISOString()
             });
             fs.writeFileSync(eventFile, JSON.stringify(events, null, 2));
+            this.pushStatus(sessionName, event);
         });
 
         this.clients.set(sessionName, client);
@@ -254,6 +255,17 @@ class WhatsAppManager {
         return client;
     }
 
+    pushStatus(sessionName, event) {
+        // One JSON line per connection change; the Python side reads it from our stdout
+        const client = this.clients.get(sessionName);
+        console.log(`[STATUS] ${JSON.stringify({
+            session: sessionName,
+            event,
+            status: client ? client.getStatus() : null,
+            messagesInQueue: this.messageQueue.length
+        })}`);
+    }
+
     getClient(sessionName) {
         return this.clients.get(sessionName);
     }
@@ -271,6 +283,7 @@ class WhatsAppManager {
             await client.disconnect();
             this.clients.delete(sessionName);
             this.saveState();
+            this.pushStatus(sessionName, 'removed');
             
             const sessionPath = path.join(__dirname, 'sessions', 'whatsapp', sessionName);
             if (fs.existsSync(sessionPath)) {
@@ -0,0 +1,83 @@
+# bench/brain_throughput.py - Drive GroqBrain against the offline LLM stand-in at fixed concurrency
+# Usage: python bench/brain_throughput.py --requests 200 --concurrency 20 --ttft 0.3 --error-rate 0.02
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm_standin import StandinConfig, serve
+
+MESSAGES = [
+    "Bei ya brake pads za Vitz 2012 ni ngapi?",
+    "Sasa bro, gari yangu inapiga kelele kwa wheel, ni nini?",
+    "Mnafanya installation pia?",
+    "Do you have shock absorbers for Fielder?",
+    "Nitalipa kesho asubuhi, sawa?",
+    "Which is better, OEM or aftermarket brake pads?",
+]
+
+def percentile(ordered, q):
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] if ordered else 0.0
+
+async def run(args):
+    config = StandinConfig(args.ttft, args.token_delay, args.jitter, args.error_rate, args.rate_limit)
+    server = serve(config, port=args.port)
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("WA_FIRST_TOKEN_DEADLINE", str(args.deadline))
+
+    from brain import GroqBrain
+
+    class TemplateStore:
+        wa_templates = ["Hiyo inakuwanga 18,500 delivered. MPESA au bank bro?", "Pics ziko hapa bro, fresh stock"]
+        fb_templates = ["I always get my parts from autopartspro.shop"]
+
+    brain = GroqBrain("", TemplateStore())
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            msg = random.choice(MESSAGES)
+            start = time.perf_counter()
+            if args.mode == "generate" and i % 2:
+                await brain.generate_response(msg, context={"platform": "other"})
+            else:
+                await brain.wa_reply(msg)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    latencies.sort()
+    print(f"Requests: {args.requests} @ concurrency {args.concurrency} ({args.mode})")
+    print(f"Throughput: {args.requests / elapsed:.1f} req/s over {elapsed:.2f}s")
+    print(f"Latency: p50={percentile(latencies, 0.5):.3f}s p95={percentile(latencies, 0.95):.3f}s "
+          f"p99={percentile(latencies, 0.99):.3f}s max={latencies[-1]:.3f}s")
+    print(f"Fallbacks: {brain.fallback_count}/{args.requests} ({brain.fallback_count / args.requests:.1%}), "
+          f"deadline misses: {brain.deadline_fallbacks}, brain online at end: {brain.online}")
+    print(f"Stand-in: {config.stats}")
+    print(brain.latency_report())
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mode", choices=["wa", "generate"], default="wa")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--deadline", type=float, default=4.0)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
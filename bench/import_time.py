@@ -0,0 +1,96 @@
+# bench/import_time.py - Cold-start budget check for `import main` and the first use of each lazy module
+# Usage: python bench/import_time.py [budget_seconds] [first_boot_budget] [first_use_budget]
+#        (exit code 1 when any is over budget)
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Deferred imports, as the code that first needs them runs them
+LAZY_MODULES = {
+    "pandas": "import pandas as pd",
+    "playwright": "from playwright.async_api import async_playwright",
+}
+
+PROBE = f"""
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, {str(ROOT)!r})
+import main
+elapsed = time.perf_counter() - start
+loaded = [m for m in {tuple(LAZY_MODULES)!r} if m in sys.modules]
+print(f"{{elapsed:.3f}} {{','.join(loaded)}}")
+print(main.startup.report(), file=sys.stderr)
+"""
+
+# Runs after `import main` in a fresh process, so the figure is what the first CSV import
+# or Facebook run pays on top of startup
+FIRST_USE_PROBE = f"""
+import sys, time
+sys.path.insert(0, {str(ROOT)!r})
+import main
+start = time.perf_counter()
+try:
+    exec(sys.argv[1])
+except ImportError as e:
+    print(f"missing {{e}}")
+else:
+    print(f"{{time.perf_counter() - start:.3f}}")
+"""
+
+ENV = dict(os.environ, BOT_TOKEN="123:standin", OWNER_ID="1")
+
+def run_probe(args, workdir, env=ENV):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", *args], cwd=workdir, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f"probe failed:\n{result.stderr}")
+    return result, wall
+
+def measure_startup(workdir):
+    """(import seconds, eagerly loaded lazy modules, wall seconds, startup report) for one `import main`"""
+    result, wall = run_probe([PROBE], workdir)
+    fields = result.stdout.split()
+    return float(fields[0]), fields[1:], wall, result.stderr
+
+def measure_first_use(statement, workdir):
+    """Seconds the deferred import takes after `import main`, or None when the module isn't installed"""
+    result, _ = run_probe([FIRST_USE_PROBE, statement], workdir)
+    output = result.stdout.strip()
+    return None if output.startswith("missing") else float(output)
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 0.8
+    first_boot_budget = float(sys.argv[2]) if len(sys.argv) > 2 else 1.5
+    first_use_budget = float(sys.argv[3]) if len(sys.argv) > 3 else 3.0
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # First run creates empire.db and runs migrations; the second is a normal restart
+        for label, limit in (("first boot", first_boot_budget), ("restart", budget)):
+            import_time, loaded, wall, report = measure_startup(workdir)
+            print(f"{label}: import main {import_time * 1000:.0f}ms, process wall {wall * 1000:.0f}ms")
+            print("  " + "\n  ".join(l for l in report.splitlines() if "ms" in l))
+            if import_time > limit:
+                failures.append(f"{label}: import main took {import_time:.3f}s, budget {limit:.3f}s")
+            if loaded:
+                failures.append(f"{label}: heavy modules imported eagerly: {loaded[0]}")
+
+        for name, statement in LAZY_MODULES.items():
+            cost = measure_first_use(statement, workdir)
+            if cost is None:
+                print(f"first use of {name}: not installed, skipped")
+                continue
+            print(f"first use of {name}: {cost * 1000:.0f}ms")
+            if cost > first_use_budget:
+                failures.append(f"first use of {name} took {cost:.3f}s, budget {first_use_budget:.3f}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# bench/intent_accuracy.py - Accuracy of the local intent extractor and LLM-call reduction
+# Usage: python bench/intent_accuracy.py [fixtures.json]
+# Fixtures are labelled with what the customer asked for, not with what extract_intent returns,
+# so misses here are real misses (e.g. "pads za mbele" for brake pads).
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from inventory import InventoryIndex, extract_intent, answer_from_inventory
+
+def main():
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).with_name("intent_fixtures.json")
+    fixtures = json.loads(path.read_text(encoding="utf-8"))
+    index = InventoryIndex(fixtures["inventory"])
+    cases = fixtures["cases"]
+
+    correct = {"intent": 0, "part": 0, "vehicle": 0, "year": 0}
+    answered = 0
+    elapsed = 0.0
+    for case in cases:
+        start = time.perf_counter()
+        entities = extract_intent(case["message"], index)
+        reply = answer_from_inventory(case["message"], index)
+        elapsed += time.perf_counter() - start
+
+        vehicle = next(iter(entities["vehicles"])) if len(entities["vehicles"]) == 1 else None
+        correct["intent"] += entities["intent"] == case["intent"]
+        correct["part"] += entities["part"] == case["part"]
+        correct["vehicle"] += vehicle == case["vehicle"]
+        correct["year"] += entities["year"] == case["year"]
+        if reply:
+            answered += 1
+        else:
+            print(f"  -> LLM: {case['message']}")
+
+    n = len(cases)
+    for field, hits in correct.items():
+        print(f"{field:8s} accuracy: {hits}/{n} ({hits / n:.0%})")
+    print(f"Answered locally: {answered}/{n} ({answered / n:.0%} fewer LLM calls)")
+    print(f"Mean extract+answer latency: {elapsed / n * 1e6:.0f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# bench/inventory_snapshot.py - Memory per SKU, build time and lookup latency of the inventory snapshot
+# Usage: python bench/inventory_snapshot.py [parts ...]   (default: 100000 1000000)
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from inventory import InventoryIndex, answer_from_inventory
+
+PARTS = ["Brake Pads", "Oil Filter", "Air Filter", "Shock Absorbers", "Clutch Kit", "Radiator",
+         "Spark Plugs", "Timing Belt", "Headlight Assembly", "Side Mirror", "Fuel Pump", "Alternator"]
+BRANDS = ["Bosch", "Denso", "Brembo", "Kyb", "Exedy", "Ngk", "Aisin", "Valeo", "Mann", "Genuine",
+          "Sachs", "Febi", "Gates", "Koyo", "Tokico", "Monroe", "Hella", "Delphi", "Mahle", "Akebono"]
+VEHICLES = ["Toyota Vitz", "Toyota Fielder", "Subaru Forester", "Subaru Impreza", "Honda Fit",
+            "Mazda Demio", "Nissan Note", "Mercedes C200", "Toyota Probox", "VW Golf"]
+QUERIES = ["bei ya brake pads brembo za vitz", "clutch kit exedy forester 2012 how much",
+           "do you have oil filter mann honda fit", "radiator denso probox price",
+           "shock absorbers kyb fielder iko stock?", "alternator bosch golf 2010 bei"]
+
+def make_rows(n, seed=7, fitments=4):
+    """Rows as fresh strings per row, the way a SQLite cursor yields them.
+
+    Real stock lists carry a part number in the part name, so part strings
+    are mostly distinct: one per part number, listed for ~`fitments`
+    vehicle/year rows. Only vehicles and year ranges repeat heavily, which
+    keeps interning from flattering the B/SKU figure.
+    """
+    rng = random.Random(seed)
+    numbers = max(n // fitments, 1)
+    for _ in range(n):
+        start = rng.randint(2000, 2016)
+        number = rng.randrange(numbers)
+        yield (f"{PARTS[number % len(PARTS)]} {BRANDS[number % len(BRANDS)]} {number:07d}",
+               float(rng.randint(500, 90000)), rng.randint(0, 20),
+               "".join(rng.choice(VEHICLES)), f"{start}-{start + rng.randint(0, 6)}")
+
+def traced_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, used
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[int((len(ordered) - 1) * q)]
+
+def run(n):
+    start = time.perf_counter()
+    index = InventoryIndex(make_rows(n))
+    build = time.perf_counter() - start
+    del index
+
+    index, snapshot_bytes = traced_bytes(lambda: InventoryIndex(make_rows(n)))
+    rows, row_bytes = traced_bytes(lambda: list(make_rows(n)))
+    del rows
+
+    latencies = []
+    for i in range(2000):
+        msg = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        answer_from_inventory(msg, index)
+        latencies.append(time.perf_counter() - start)
+
+    print(f"{n:>9,} parts ({len(index.part_keys):,} distinct names) | build {build:.2f}s | snapshot {snapshot_bytes / n:.0f} B/SKU "
+          f"vs {row_bytes / n:.0f} B/SKU as fetched tuples | answer p50 {percentile(latencies, 0.5) * 1e6:.0f}us "
+          f"p99 {percentile(latencies, 0.99) * 1e6:.0f}us")
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000]
+    for n in sizes:
+        run(n)
+
+if __name__ == "__main__":
+    main()
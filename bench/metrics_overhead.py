@@ -0,0 +1,45 @@
+# bench/metrics_overhead.py - Cost of metrics instrumentation on the storage and counter hot paths
+# Usage: python bench/metrics_overhead.py [statements]
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import metrics
+
+def time_queries(conn, n):
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+    conn.executemany("INSERT INTO t (v) VALUES (?)", ((f"row{i}",) for i in range(1000)))
+    start = time.perf_counter()
+    for i in range(n):
+        conn.execute("SELECT v FROM t WHERE id = ?", (i % 1000 + 1,)).fetchone()
+    return (time.perf_counter() - start) / n
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    plain = time_queries(sqlite3.connect(":memory:"), n)
+    timed = time_queries(sqlite3.connect(":memory:", factory=metrics.TimedConnection), n)
+    print(f"point query, plain:  {plain * 1e6:.2f}us")
+    print(f"point query, timed:  {timed * 1e6:.2f}us  (+{(timed - plain) * 1e6:.2f}us, {timed / plain - 1:+.0%})")
+
+    counter = metrics.counter("bench_counter_total", "bench")
+    hist = metrics.histogram("bench_seconds", "bench")
+    start = time.perf_counter()
+    for _ in range(n):
+        counter.inc()
+    inc = (time.perf_counter() - start) / n
+    start = time.perf_counter()
+    for i in range(n):
+        hist.observe(i * 1e-6)
+    observe = (time.perf_counter() - start) / n
+    print(f"counter.inc():       {inc * 1e9:.0f}ns")
+    print(f"histogram.observe(): {observe * 1e9:.0f}ns")
+
+    start = time.perf_counter()
+    body = metrics.REGISTRY.render()
+    print(f"render /metrics:     {(time.perf_counter() - start) * 1000:.2f}ms ({len(body)} bytes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# bench/price_history.py - Storage and query cost of delta-encoded inventory history over many imports
+# Usage: python bench/price_history.py [skus] [imports]
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from inventory_history import HISTORY_SCHEMA, InventoryHistory, record_import
+
+def percentile(ordered, q):
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return percentile(samples, 0.5) * 1000, percentile(samples, 0.95) * 1000
+
+def main():
+    skus = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    imports = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    rng = random.Random(7)
+    brands = ["Vitz", "Fielder", "Premio", "Probox", "Demio", "Note", "X-Trail", "Axio", "Harrier", "Wish"]
+    names = ["Brake pads", "Clutch kit", "Shock absorber", "Radiator", "Oil filter", "Alternator",
+             "CV joint", "Headlight", "Side mirror", "Fuel pump", "Water pump", "Tie rod end"]
+    stock_list = {}
+    while len(stock_list) < skus:
+        key = (f"{rng.choice(names)} {rng.randint(1, 60)}", rng.choice(brands), str(rng.randint(2002, 2020)))
+        stock_list[key] = [float(rng.randrange(1500, 60000, 50)), rng.randint(0, 40)]
+
+    path = os.path.join(tempfile.mkdtemp(prefix="history-bench-"), "empire.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE inventory (part TEXT, price REAL, stock INTEGER, vehicle TEXT, year TEXT)")
+    for statement in HISTORY_SCHEMA:
+        conn.execute(statement)
+
+    # Each upload: ~1% of prices move, ~5% of stock counts change, a few SKUs come and go
+    diff_time = 0.0
+    start = time.perf_counter()
+    for n in range(imports):
+        for values in stock_list.values():
+            if rng.random() < 0.01:
+                values[0] = round(values[0] * rng.uniform(0.9, 1.15), -1)
+            if rng.random() < 0.05:
+                values[1] = max(values[1] + rng.randint(-5, 8), 0)
+        rows = [(part, price, stock, vehicle, year) for (part, vehicle, year), (price, stock) in stock_list.items()
+                if rng.random() > 0.002]
+        conn.execute("DELETE FROM inventory")
+        conn.executemany("INSERT INTO inventory VALUES (?, ?, ?, ?, ?)", rows)
+        t = time.perf_counter()
+        record_import(conn, f"upload-{n}.csv")
+        diff_time += time.perf_counter() - t
+        conn.commit()
+        conn.execute("UPDATE inventory_imports SET imported_at = datetime('2020-01-01', ?) WHERE id = last_insert_rowid()",
+                     (f"+{n * 6} hours",))
+    conn.commit()
+    total = time.perf_counter() - start
+
+    deltas = conn.execute("SELECT COUNT(*) FROM inventory_deltas").fetchone()[0]
+    naive = skus * imports
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    history_bytes = sum(
+        conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (name,)).fetchone()[0] or 0
+        for name in ("inventory_deltas", "idx_inventory_deltas_import", "inventory_items", "inventory_imports")
+    ) if conn.execute("SELECT 1 FROM pragma_compile_options WHERE compile_options = 'ENABLE_DBSTAT_VTAB'").fetchone() else None
+
+    print(f"{skus} SKUs x {imports} imports in {total:.1f}s; record_import mean {diff_time / imports * 1000:.1f}ms")
+    print(f"delta rows: {deltas:,} vs {naive:,} for a full copy per import ({deltas / naive:.1%})")
+    if history_bytes:
+        print(f"history tables: {history_bytes / 1e6:.1f}MB (~{history_bytes / max(deltas, 1):.0f} B/delta, page size {page_size})")
+
+    history = InventoryHistory(conn)
+    parts = [k[0] for k in stock_list]
+    last_day = conn.execute("SELECT date(MAX(imported_at)) FROM inventory_imports").fetchone()[0]
+    days = [r[0] for r in conn.execute("SELECT DISTINCT date(imported_at) FROM inventory_imports").fetchall()]
+
+    p50, p95 = timed(lambda: history.trend(rng.choice(parts)), 300)
+    print(f"trend(part):                 p50 {p50:.2f}ms  p95 {p95:.2f}ms")
+    p50, p95 = timed(lambda: history.as_of(history.import_as_of(rng.choice(days))[0], rng.choice(parts)), 100)
+    print(f"as_of(day, part filter):     p50 {p50:.2f}ms  p95 {p95:.2f}ms")
+    p50, p95 = timed(lambda: history.as_of(history.import_as_of(rng.choice(days))[0], limit=skus), 20)
+    print(f"as_of(day) full stock list:  p50 {p50:.2f}ms  p95 {p95:.2f}ms")
+    p50, p95 = timed(lambda: history.import_as_of(last_day), 1000)
+    print(f"import_as_of(day):           p50 {p50 * 1000:.0f}us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# bench/retrieval_latency.py - Build/sync time and query latency of the inventory BM25 index
+# Usage: python bench/retrieval_latency.py [parts]
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from retrieval import InventoryRetriever
+
+PARTS = ["Brake Pads", "Oil Filter", "Air Filter", "Shock Absorbers", "Clutch Kit", "Radiator",
+         "Spark Plugs", "Timing Belt", "Headlight Assembly", "Side Mirror", "Fuel Pump", "Alternator"]
+VEHICLES = ["Toyota Vitz", "Toyota Fielder", "Subaru Forester", "Subaru Impreza", "Honda Fit",
+            "Mazda Demio", "Nissan Note", "Mercedes C200", "Toyota Probox", "VW Golf"]
+QUERIES = ["bei ya brake pads za vitz", "clutch kit forester 2012 how much", "do you have oil filter honda fit",
+           "radiator probox", "shocks ya fielder ziko?", "alternator golf 2010 price"]
+
+def make_rows(n):
+    rows = []
+    for i in range(n):
+        start = random.randint(2000, 2016)
+        rows.append((f"{random.choice(PARTS)} {i % 97}", random.randint(500, 90000), random.randint(0, 20),
+                     random.choice(VEHICLES), f"{start}-{start + random.randint(0, 6)}"))
+    return rows
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE search_docs (doc_id INTEGER PRIMARY KEY AUTOINCREMENT, signature TEXT UNIQUE, part TEXT, price REAL, stock INTEGER, vehicle TEXT, year TEXT, length INTEGER)")
+    conn.execute("CREATE TABLE search_postings (term TEXT, doc_id INTEGER, tf INTEGER, PRIMARY KEY (term, doc_id)) WITHOUT ROWID")
+    conn.execute("CREATE INDEX idx_postings_doc ON search_postings(doc_id)")
+    retriever = InventoryRetriever(conn)
+
+    rows = make_rows(n)
+    start = time.perf_counter()
+    retriever.sync(rows)
+    print(f"Full build ({n} parts): {time.perf_counter() - start:.2f}s")
+
+    changed = rows[: n - n // 20] + make_rows(n // 20)
+    changed = [(p, pr * 1.05, st, v, y) if i % 10 == 0 else (p, pr, st, v, y) for i, (p, pr, st, v, y) in enumerate(changed)]
+    start = time.perf_counter()
+    retriever.sync(changed)
+    print(f"Incremental sync (5% new, 10% repriced): {time.perf_counter() - start:.2f}s")
+
+    timings = []
+    for _ in range(50):
+        for q in QUERIES:
+            t0 = time.perf_counter()
+            retriever.search(q, k=5)
+            timings.append(time.perf_counter() - t0)
+    timings.sort()
+    print(f"Query latency over {len(timings)} queries: p50={timings[len(timings) // 2] * 1000:.2f}ms "
+          f"p95={timings[int(len(timings) * 0.95)] * 1000:.2f}ms max={timings[-1] * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,69 @@
 # brain.py
 import os
+import re
+import json
+import time
+import asyncio
 import httpx
 import random
 import logging
+from collections import deque
+
+import metrics
+from inventory import answer_from_inventory
+from retrieval import estimate_tokens, format_catalog
 
 logger = logging.getLogger("GroqBrain")
 
+REPLY_SECONDS = metrics.histogram("brain_reply_seconds", "LLM reply latency by stage", ["stage"])
+FIRST_TOKEN_SECONDS = REPLY_SECONDS.labels("first_token")
+TOTAL_REPLY_SECONDS = REPLY_SECONDS.labels("total")
+REPLIES = metrics.counter("brain_replies_total", "WhatsApp replies by source", ["source"])
+FAST_PATH_REPLIES = REPLIES.labels("inventory")
+LLM_REPLIES = REPLIES.labels("llm")
+FALLBACKS = metrics.counter("brain_fallbacks_total", "Template fallbacks sent instead of an LLM reply")
+
+# Keyword groups used to pick a fallback template that matches what the customer asked
+FALLBACK_TOPICS = {
+    "price": ("price", "bei", "how much", "ngapi", "cost"),
+    "payment": ("mpesa", "pay", "lipa", "bank", "till"),
+    "stock": ("stock", "available", "in stock", "niko na", "iko"),
+    "delivery": ("deliver", "tracking", "shipping", "ship"),
+    "pics": ("pic", "photo", "picha", "video"),
+    "fitment": ("fit", "year", "model", "manual", "auto", "gari"),
+}
+
+# Templates quoting a figure ("18,500 delivered", "17k cash") are never sent as fallbacks:
+# the figure isn't from our stock list. Price questions get a promise to confirm instead.
+PRICE_QUOTE_RE = re.compile(r"\b\d{1,3}(?:,\d{3})+\b|\b\d+(?:\.\d+)?k\b|\b(?:kes|ksh)\.?\s*\d", re.IGNORECASE)
+PRICE_FALLBACK = "Let me confirm the exact price from the shop and get back to you in a few minutes. Ni gari gani na year?"
+
+def quotes_price(template):
+    return bool(PRICE_QUOTE_RE.search(template))
+
+class LatencyRecorder:
+    """Rolling window of latency samples (seconds) with percentile summaries"""
+    def __init__(self, maxlen=500):
+        self.samples = deque(maxlen=maxlen)
+        self.count = 0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return {
+            "count": self.count,
+            "p50": ordered[int(last * 0.50)],
+            "p95": ordered[int(last * 0.95)],
+            "p99": ordered[int(last * 0.99)],
+            "max": ordered[last],
+        }
+
 class GroqBrain:
     def __init__(self, key="", storage=None):
         self.key = key or os.getenv("GROQ_KEY")
@@ -15,47 +73,246 @@ class GroqBrain:
         self.whatsapp_number = os.getenv("WHATSAPP_NUMBER", "254700123456")
         self.model = "llama-3.1-70b-versatile"
 
-    async def ask(self, prompt):
+        # LLM_BASE_URL points the brain at any OpenAI-compatible server, e.g. the
+        # offline stand-in (llm_standin.py) which needs no key
+        self.base_url = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1").rstrip("/")
+        self.api_url = f"{self.base_url}/chat/completions"
+        if os.getenv("LLM_BASE_URL") and not self.key:
+            self.key = "standin"
+            self.online = True
+        self._client = None
+
+        # After a non-transient error the brain answers from templates and
+        # probes the LLM again once per retry interval; a success ends it
+        self.retry_interval = float(os.getenv("LLM_RETRY_SECONDS", "300"))
+        self._retry_at = 0.0
+
+        # Per-reply latency SLO for WhatsApp: first token must arrive within
+        # first_token_deadline, the whole reply within reply_slo
+        self.first_token_deadline = float(os.getenv("WA_FIRST_TOKEN_DEADLINE", "4.0"))
+        self.reply_slo = float(os.getenv("WA_REPLY_SLO", "15.0"))
+        self.ttft = LatencyRecorder()
+        self.total_time = LatencyRecorder()
+        self.deadline_fallbacks = 0
+        # Replies requested from the LLM (ask and ask_with_deadline) and how many of them fell back
+        self.llm_requests = 0
+        self.fallback_count = 0
+
+        # WhatsApp messages answered from inventory vs sent to the LLM
+        self.fast_path_hits = 0
+        self.llm_calls = 0
+
+        # Catalog grounding for LLM prompts
+        self.retrieval_k = int(os.getenv("WA_RETRIEVAL_K", "5"))
+        self.prompt_token_budget = int(os.getenv("WA_PROMPT_TOKEN_BUDGET", "700"))
+        self.retrieval_time = LatencyRecorder()
+        metrics.gauge("brain_fallback_ratio", "Share of LLM-bound replies that fell back to templates", func=self.fallback_ratio)
+        metrics.gauge("brain_online", "1 while the LLM backend is considered reachable", func=lambda: self.online)
+
+    def http(self):
+        """Shared HTTP client; building one per request costs an SSL context on the event loop"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=20.0, limits=httpx.Limits(max_connections=50))
+        return self._client
+
+    def llm_available(self):
+        """True if this request should try the LLM; while offline, one request per retry interval probes it"""
+        if self.online:
+            return True
+        if not self.key or time.monotonic() < self._retry_at:
+            return False
+        self._retry_at = time.monotonic() + self.retry_interval
+        return True
+
+    def mark_offline(self, reason):
+        if self.online:
+            logger.warning(f"LLM marked offline ({reason}), retrying in {self.retry_interval:.0f}s")
+        self.online = False
+        self._retry_at = time.monotonic() + self.retry_interval
+
+    def mark_online(self):
         if not self.online:
+            logger.info("LLM reachable again, leaving template fallback mode")
+        self.online = True
+
+    async def ask(self, prompt):
+        self.llm_requests += 1
+        if not self.llm_available():
             logger.warning("Groq AI offline, using fallback templates")
+            self.fallback_count += 1
+            FALLBACKS.inc()
             if self.storage and hasattr(self.storage, 'fb_templates') and hasattr(self.storage, 'wa_templates'):
-                all_templates = self.storage.fb_templates + self.storage.wa_templates
+                all_templates = [t for t in self.storage.fb_templates + self.storage.wa_templates if not quotes_price(t)]
                 if all_templates:
                     return random.choice(all_templates)
             return f"Check out {self.shop_url} for quality parts!"
         
         try:
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                response = await client.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers={"Authorization": f"Bearer {self.key}"},
-                    json={
-                        "model": self.model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.9
-                    }
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data["choices"][0]["message"]["content"].strip()
+            response = await self.http().post(
+                self.api_url,
+                headers={"Authorization": f"Bearer {self.key}"},
+                json={
+                    "model": self.model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "temperature": 0.9
+                }
+            )
+            response.raise_for_status()
+            data = response.json()
+            reply = data["choices"][0]["message"]["content"].strip()
+            self.mark_online()
+            return reply
         except httpx.TimeoutException as e:
             logger.error(f"Groq API timeout: {e}")
-            self.online = False
         except httpx.HTTPStatusError as e:
             logger.error(f"Groq API HTTP error {e.response.status_code}: {e}")
-            self.online = False
+            if not self.is_transient(e):
+                self.mark_offline(f"HTTP {e.response.status_code}")
         except (KeyError, IndexError) as e:
             logger.error(f"Groq API response parsing error: {e}")
-            self.online = False
         except Exception as e:
             logger.error(f"Unexpected Groq API error: {e}", exc_info=True)
-            self.online = False
+            if not self.is_transient(e):
+                self.mark_offline(type(e).__name__)
         
+        self.fallback_count += 1
+        FALLBACKS.inc()
         if self.storage and hasattr(self.storage, 'fb_templates'):
             if self.storage.fb_templates:
                 return random.choice(self.storage.fb_templates)
         return f"Check out {self.shop_url} for quality parts!"
 
+    @staticmethod
+    def is_transient(error):
+        """Timeouts, dropped connections, rate limits and server errors should not switch the brain to offline mode"""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code == 429 or error.response.status_code >= 500
+        return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+    async def stream(self, prompt):
+        """Stream completion tokens from Groq as they arrive (async iterator of str)"""
+        async with self.http().stream(
+            "POST",
+            self.api_url,
+            headers={"Authorization": f"Bearer {self.key}"},
+            json={
+                "model": self.model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": 0.9,
+                "stream": True
+            }
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                delta = json.loads(payload)["choices"][0].get("delta", {})
+                token = delta.get("content")
+                if token:
+                    yield token
+
+    def fallback_reply(self, msg=""):
+        """Pick a WA template relevant to the customer message, random if nothing matches.
+
+        Price questions never get a template figure: they get PRICE_FALLBACK.
+        """
+        self.fallback_count += 1
+        FALLBACKS.inc()
+        text = msg.lower()
+        if any(kw in text for kw in FALLBACK_TOPICS["price"]):
+            return PRICE_FALLBACK
+        templates = []
+        if self.storage and getattr(self.storage, 'wa_templates', None):
+            templates = [t for t in self.storage.wa_templates if not quotes_price(t)]
+        if not templates:
+            return f"Check out {self.shop_url} for quality parts!"
+
+        topics = [kws for kws in FALLBACK_TOPICS.values() if any(kw in text for kw in kws)]
+        relevant = [t for t in templates if any(kw in t.lower() for kws in topics for kw in kws)]
+        return random.choice(relevant or templates)
+
+    async def ask_with_deadline(self, prompt, msg=""):
+        """Stream a reply under the latency SLO, falling back to a template if it is missed"""
+        self.llm_requests += 1
+        if not self.llm_available():
+            return self.fallback_reply(msg)
+
+        start = time.perf_counter()
+        tokens = self.stream(prompt)
+        try:
+            try:
+                first = await asyncio.wait_for(anext(tokens), timeout=self.first_token_deadline)
+            except asyncio.TimeoutError:
+                self.deadline_fallbacks += 1
+                logger.warning(f"No first token within {self.first_token_deadline}s, sending fallback")
+                return self.fallback_reply(msg)
+            except StopAsyncIteration:
+                return self.fallback_reply(msg)
+            self.mark_online()
+            self.ttft.record(time.perf_counter() - start)
+            FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start)
+
+            # First token arrived on pace: keep streaming within what is left of the SLO
+            parts = [first]
+            remaining = max(self.reply_slo - (time.perf_counter() - start), 0.1)
+            try:
+                async with asyncio.timeout(remaining):
+                    async for token in tokens:
+                        parts.append(token)
+            except TimeoutError:
+                self.deadline_fallbacks += 1
+                logger.warning(f"Reply exceeded {self.reply_slo}s SLO, sending fallback")
+                return self.fallback_reply(msg)
+
+            self.total_time.record(time.perf_counter() - start)
+            TOTAL_REPLY_SECONDS.observe(time.perf_counter() - start)
+            return "".join(parts).strip() or self.fallback_reply(msg)
+
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Groq API HTTP error {e.response.status_code}: {e}")
+            if not self.is_transient(e):
+                self.mark_offline(f"HTTP {e.response.status_code}")
+        except (KeyError, IndexError, json.JSONDecodeError) as e:
+            logger.error(f"Groq stream parsing error: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected Groq streaming error: {e}", exc_info=True)
+            if not self.is_transient(e):
+                self.mark_offline(type(e).__name__)
+        finally:
+            await tokens.aclose()
+
+        return self.fallback_reply(msg)
+
+    def fallback_ratio(self):
+        """Share of LLM requests answered from templates; both counts cover ask() and ask_with_deadline()"""
+        return self.fallback_count / self.llm_requests if self.llm_requests else 0.0
+
+    def latency_report(self):
+        """Text summary of WhatsApp reply latency distributions"""
+        lines = []
+        for label, recorder in (("First token", self.ttft), ("Total reply", self.total_time)):
+            s = recorder.summary()
+            lines.append(
+                f"{label}: n={s['count']} p50={s['p50']:.2f}s p95={s['p95']:.2f}s "
+                f"p99={s['p99']:.2f}s max={s['max']:.2f}s"
+            )
+        r = self.retrieval_time.summary()
+        lines.append(f"Retrieval: n={r['count']} p50={r['p50'] * 1000:.1f}ms p95={r['p95'] * 1000:.1f}ms")
+        lines.append(
+            f"Deadline fallbacks: {self.deadline_fallbacks} "
+            f"(all fallbacks: {self.fallback_count}/{self.llm_requests} LLM requests)"
+        )
+        handled = self.fast_path_hits + self.llm_calls
+        if handled:
+            lines.append(
+                f"Inventory fast path: {self.fast_path_hits}/{handled} "
+                f"({self.fast_path_hits / handled:.0%} LLM calls avoided)"
+            )
+        return "\n".join(lines)
+
     async def fb_reply(self, post_text):
         prompt = f"""You are a Kenyan car owner replying in a Facebook group. Never sound like staff.
 Use 40% English, 40% Sheng, 20% mix. Include both links at the end.
@@ -65,12 +322,51 @@ Reply:"""
         return f"{base_reply}\n\n{self.shop_url}\nwa.me/{self.whatsapp_number}"
 
     async def wa_reply(self, msg, history=""):
-        prompt = f"""WhatsApp chat with customer. Goal: close the sale. Never greet first.
+        index = getattr(self.storage, 'inventory_index', None)
+        local = answer_from_inventory(msg, index)
+        if local:
+            self.fast_path_hits += 1
+            FAST_PATH_REPLIES.inc()
+            return local
+
+        self.llm_calls += 1
+        LLM_REPLIES.inc()
+        prompt = await self.build_wa_prompt(msg, history)
+        return await self.ask_with_deadline(prompt, msg)
+
+    async def build_wa_prompt(self, msg, history=""):
+        """WhatsApp prompt with the top-k matching inventory rows, kept within the token budget"""
+        hits = []
+        retriever = getattr(self.storage, 'retriever', None)
+        if retriever:
+            start = time.perf_counter()
+            try:
+                hits = await retriever.asearch(msg, k=self.retrieval_k)
+            except Exception as e:
+                logger.error(f"Inventory retrieval failed: {e}")
+            self.retrieval_time.record(time.perf_counter() - start)
+
+        def render(catalog_hits, hist):
+            catalog = format_catalog(catalog_hits)
+            catalog_block = (
+                f"Our stock (part|vehicle|price|stock) - quote ONLY these prices:\n{catalog}\n"
+                if catalog else "No matching parts in stock - never invent a price.\n"
+            )
+            return f"""WhatsApp chat with customer. Goal: close the sale. Never greet first.
 Use authentic Kenyan English/Sheng mix.
-History: {history}
+{catalog_block}History: {hist}
 Customer: {msg}
 Your reply:"""
-        return await self.ask(prompt)
+
+        # Trim the oldest history first, then the lowest-ranked catalog rows
+        prompt = render(hits, history)
+        while estimate_tokens(prompt) > self.prompt_token_budget and history:
+            history = history[len(history) // 2:] if len(history) > 200 else ""
+            prompt = render(hits, history)
+        while estimate_tokens(prompt) > self.prompt_token_budget and hits:
+            hits = hits[:-1]
+            prompt = render(hits, history)
+        return prompt
     
     async def generate_response(self, message, context=None):
         """Generate a response based on platform and context"""
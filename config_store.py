@@ -0,0 +1,91 @@
+# config_store.py - Cached, atomically-written JSON config files shared by every module
+import copy
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger("ConfigStore")
+
+class ConfigStore:
+    """In-memory cache of JSON config files, revalidated against each file's stat.
+
+    get() costs one os.stat() while the file is unchanged; the file is only
+    re-parsed when its mtime, inode or size moves (our own writes or a hand
+    edit). save() writes a temp file and renames it over the original, so a
+    crash mid-write never leaves a truncated file behind. Subscribers are
+    called with the new data whenever a file changes either way.
+    """
+    def __init__(self, base_dir="."):
+        self.base_dir = Path(base_dir)
+        self._cache = {}          # filename -> (stat signature, parsed data)
+        self._subscribers = {}    # filename -> [callback(data)]
+        self.reads = 0
+        self.hits = 0
+
+    def _path(self, filename):
+        return self.base_dir / filename
+
+    @staticmethod
+    def _signature(st):
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def get(self, filename, default=None):
+        """Shared cached snapshot of a config file; treat it as read-only (use copy() to edit)"""
+        path = self._path(filename)
+        try:
+            signature = self._signature(os.stat(path))
+        except FileNotFoundError:
+            self._cache.pop(filename, None)
+            return default
+        cached = self._cache.get(filename)
+        if cached and cached[0] == signature:
+            self.hits += 1
+            return cached[1]
+
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load {filename}: {e}")
+            return cached[1] if cached else default
+        self.reads += 1
+        self._cache[filename] = (signature, data)
+        if cached is not None:
+            logger.info(f"{filename} changed on disk, reloaded")
+            self._notify(filename, data)
+        return data
+
+    def copy(self, filename, default=None):
+        """Private deep copy of a config file for callers that modify and save() it"""
+        return copy.deepcopy(self.get(filename, default))
+
+    def save(self, filename, data, indent=2):
+        """Atomically replace a config file and update the cache; raises OSError on failure"""
+        path = self._path(filename)
+        fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=indent, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self._cache[filename] = (self._signature(os.stat(path)), data)
+        self._notify(filename, data)
+
+    def subscribe(self, filename, callback):
+        """Call callback(data) whenever filename changes (saved here or edited on disk)"""
+        self._subscribers.setdefault(filename, []).append(callback)
+
+    def _notify(self, filename, data):
+        for callback in self._subscribers.get(filename, []):
+            try:
+                callback(data)
+            except Exception as e:
+                logger.error(f"Config subscriber for {filename} failed: {e}", exc_info=True)
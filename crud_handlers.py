@@ -24,19 +24,13 @@ class CRUDHandlers:
         self.wa_numbers_file = "wa_numbers.json"
     
     def load_json(self, filename):
-        """Load JSON file"""
-        try:
-            with open(filename, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Failed to load {filename}: {e}")
-            return []
+        """Editable copy of a JSON config file from the shared config store"""
+        return self.storage.config.copy(filename, [])
     
     def save_json(self, filename, data):
-        """Save JSON file"""
+        """Atomically save a JSON config file through the shared config store"""
         try:
-            with open(filename, 'w') as f:
-                json.dump(data, f, indent=2)
+            self.storage.config.save(filename, data)
             return True
         except Exception as e:
             logger.error(f"Failed to save {filename}: {e}")
@@ -78,8 +72,6 @@ class CRUDHandlers:
         groups.append(url)
         
         if self.save_json(self.groups_file, groups):
-            self.storage.groups = groups
-            self.storage.reload_groups()
             await update.message.reply_text(
                 f"✅ GROUP ADDED!\n\n"
                 f"URL: {url}\n\n"
@@ -152,8 +144,6 @@ class CRUDHandlers:
             groups.pop(index)
             
             if self.save_json(self.groups_file, groups):
-                self.storage.groups = groups
-                self.storage.reload_groups()
                 await update.message.reply_text(
                     f"✅ GROUP DELETED!\n\n"
                     f"Removed: {deleted_url}\n\n"
@@ -275,7 +265,6 @@ class CRUDHandlers:
             accounts.append(new_account)
             
             if self.save_json(self.accounts_file, accounts):
-                self.storage.fb_accounts = accounts
                 await update.message.reply_text(
                     f"✅ FACEBOOK ACCOUNT ADDED!\n\n"
                     f"Name: {name}\n"
@@ -330,7 +319,6 @@ class CRUDHandlers:
         accounts.append(new_account)
         
         if self.save_json(self.accounts_file, accounts):
-            self.storage.fb_accounts = accounts
             
             await update.message.delete()
             
@@ -444,7 +432,6 @@ class CRUDHandlers:
                 "active": True
             })
             self.save_json(self.wa_numbers_file, wa_numbers)
-            self.storage.wa_numbers = wa_numbers
         
         return ConversationHandler.END
     
@@ -493,6 +480,64 @@ class CRUDHandlers:
             )
         ]
     
+    async def show_add_group_help(self, query):
+        await query.edit_message_text(
+            "👥 ADD FACEBOOK GROUP\n\n"
+            "To add a Facebook group, use the command:\n"
+            "/add_group\n\n"
+            "Then send the Facebook group URL.\n"
+            "Example: https://www.facebook.com/groups/kenyacarscene",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="fb_groups_menu")]])
+        )
+    
+    async def list_groups_callback(self, query):
+        """List all Facebook groups (callback query version)"""
+        groups = self.storage.groups
+        back = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="fb_groups_menu")]])
+        if not groups:
+            await query.edit_message_text(
+                "📋 NO GROUPS\n\n"
+                "No Facebook groups configured.\n\n"
+                "Use /add_group to add your first group.",
+                reply_markup=back
+            )
+            return
+        
+        text = f"📋 FACEBOOK GROUPS ({len(groups)})\n\n"
+        for i, group_url in enumerate(groups, 1):
+            group_name = group_url.split('/groups/')[-1][:40]
+            text += f"{i}. {group_name}\n"
+        text += f"\n✅ All {len(groups)} groups actively monitored\n"
+        text += "\nUse /delete_group to remove a group."
+        await query.edit_message_text(text, reply_markup=back)
+    
+    async def show_delete_group_help(self, query):
+        await query.edit_message_text(
+            "❌ DELETE FACEBOOK GROUP\n\n"
+            "To delete a Facebook group, use the command:\n"
+            "/delete_group\n\n"
+            "You'll be shown a list of groups to choose from.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="fb_groups_menu")]])
+        )
+    
+    async def show_add_fb_account_help(self, query):
+        keyboard = [[InlineKeyboardButton("◀️ Back", callback_data="fb_accounts")]]
+        await query.edit_message_text(
+            "👤 ADD FACEBOOK ACCOUNT\n\n"
+            "To add a Facebook account, use the command:\n"
+            "/add_fb_account\n\n"
+            "You can add accounts using cookies or email/password.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
+    def register_routes(self, router):
+        """Register this module's callback handlers with the CallbackRouter"""
+        router.exact("fb_groups_add", self.show_add_group_help)
+        router.exact("fb_groups_list", self.list_groups_callback)
+        router.exact("fb_groups_delete", self.show_delete_group_help)
+        router.exact("fb_accounts_add", self.show_add_fb_account_help)
+        router.exact("fb_accounts_list", self.list_fb_accounts_callback)
+    
     def get_command_handlers(self):
         """Get simple command handlers"""
         return [
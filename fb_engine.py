@@ -1,5 +1,4 @@
 # fb_engine.py
-from playwright.async_api import async_playwright
 import random
 import asyncio
 import logging
@@ -9,9 +8,10 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 logger = logging.getLogger("FBEngine")
 
 class FBEngine:
-    def __init__(self, brain, storage):
+    def __init__(self, brain, storage, scheduler):
         self.brain = brain
         self.storage = storage
+        self.scheduler = scheduler
         self.active = False
         self.hist_progress = {"running": False, "current_group": None, "posts_scraped": 0}
 
@@ -54,6 +54,51 @@ class FBEngine:
         )
         await query.edit_message_text(text, reply_markup=reply_markup)
 
+    async def on_toggle(self, query):
+        status = await self.toggle()
+        await query.answer(f"FB scanning {status}!")
+        await self.show_menu(query)
+
+    async def on_force(self, query):
+        if self.scheduler.spawn("fb_force_scan", self.force_scan):
+            await query.answer("Force scan started in background...")
+        else:
+            await query.answer("Force scan already running")
+        await self.show_menu(query)
+
+    async def on_hist_start(self, query):
+        msg = await self.start_historical_scrape()
+        await query.answer(msg)
+        await self.show_historical_menu(query)
+
+    async def show_historical_progress(self, query):
+        prog = self.hist_progress
+        if prog["running"]:
+            text = (
+                f"⏳ Historical Scrape Progress\n\n"
+                f"Status: RUNNING\n"
+                f"Current Group: {prog['current_group'] or 'N/A'}\n"
+                f"Posts Scraped: {prog['posts_scraped']}"
+            )
+        else:
+            text = (
+                f"⏳ Historical Scrape Progress\n\n"
+                f"Status: IDLE\n"
+                f"Total Posts Scraped: {prog['posts_scraped']}"
+            )
+        keyboard = [[InlineKeyboardButton("🔄 Refresh", callback_data="hist_progress")], 
+                    [InlineKeyboardButton("◀️ Back", callback_data="hist_menu")]]
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+    def register_routes(self, router):
+        """Register this module's callback handlers with the CallbackRouter"""
+        router.exact("fb_menu", self.show_menu)
+        router.exact("fb_toggle", self.on_toggle)
+        router.exact("fb_force", self.on_force)
+        router.exact("hist_menu", self.show_historical_menu)
+        router.exact("hist_start", self.on_hist_start)
+        router.exact("hist_progress", self.show_historical_progress)
+
     async def toggle(self):
         self.active = not self.active
         status = "started" if self.active else "stopped"
@@ -81,10 +126,11 @@ class FBEngine:
         
         self.hist_progress = {"running": True, "current_group": None, "posts_scraped": 0}
         await self.storage.log_action('fb_engine', 'start_historical_scrape', {})
-        asyncio.create_task(self._historical_scrape_worker())
+        self.scheduler.spawn("fb_historical_scrape", self._historical_scrape_worker)
         return "Historical scrape started"
     
     async def _historical_scrape_worker(self):
+        from playwright.async_api import async_playwright
         try:
             async with async_playwright() as p:
                 for group in self.storage.groups:
@@ -124,6 +170,7 @@ class FBEngine:
         if not self.active:
             return
         
+        from playwright.async_api import async_playwright
         async with async_playwright() as p:
             for acc in self.storage.fb_accounts:
                 if not self.active:
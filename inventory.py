@@ -0,0 +1,221 @@
+# inventory.py - Compact in-memory inventory snapshot and local price/stock intent extraction
+import re
+import sys
+import logging
+from array import array
+from bisect import bisect_left
+
+logger = logging.getLogger("Inventory")
+
+PRICE_WORDS = ("bei", "price", "how much", "ngapi", "cost", "pesa", "kes", "rate")
+STOCK_WORDS = ("stock", "available", "availability", "in store", "mnayo", "unayo", "do you have", "you have", "uko na", "una", "iko",
+               "ziko", "mko na", "mna")
+YEAR_RE = re.compile(r"\b(19[6-9]\d|20[0-4]\d)\b")
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"for", "the", "a", "an", "of", "and", "with", "set", "kit", "za", "ya", "la", "na", "front", "rear"}
+# Shop-floor words for a token of the stock-list name (after tokenize's plural strip)
+PART_ALIASES = {"headlamp": "headlight", "shocker": "shock", "absorber": "shock", "plug": "spark"}
+
+def tokenize(text):
+    """Lowercase word tokens with a naive plural strip (pads -> pad)"""
+    tokens = []
+    for tok in TOKEN_RE.findall(text.lower()):
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+def significant(tokens):
+    return frozenset(t for t in tokens if t not in STOPWORDS and not t.isdigit())
+
+def year_range(year_text):
+    """Parse '2012' or '2008-2014' into an inclusive (start, end) tuple, or None"""
+    years = [int(y) for y in YEAR_RE.findall(str(year_text))]
+    if not years:
+        return None
+    return min(years), max(years)
+
+class InventoryIndex:
+    """Immutable, array-backed snapshot of the inventory table, swapped whole after each CSV import.
+
+    Rows are sorted by part name so each part's rows are one contiguous
+    range; prices, stock and parsed year spans live in typed arrays and
+    repeated strings are interned, so a SKU costs a few dozen bytes plus
+    its (shared) strings. Readers never lock: a reload builds a new
+    snapshot and replaces the reference.
+    """
+    def __init__(self, rows):
+        ordered = sorted(
+            ((str(r[0]), float(r[1] or 0), int(r[2] or 0), str(r[3]), str(r[4])) for r in rows),
+            key=lambda r: r[0].lower()
+        )
+        n = len(ordered)
+        self.parts = [sys.intern(r[0]) for r in ordered]
+        self.vehicles = [sys.intern(r[3]) for r in ordered]
+        self.years = [sys.intern(r[4]) for r in ordered]
+        self.prices = array("d", (r[1] for r in ordered))
+        self.stocks = array("q", (r[2] for r in ordered))
+        self.year_lo = array("H", bytes(2 * n))
+        self.year_hi = array("H", bytes(2 * n))
+
+        # Part name -> contiguous row range [part_starts[k], part_starts[k + 1])
+        self.part_keys = []
+        self.part_ordinal = {}
+        self.part_starts = array("I")
+        spans = {}
+        by_vehicle = {}
+        for i, (part, vehicle, year) in enumerate(zip(self.parts, self.vehicles, self.years)):
+            key = part.lower()
+            if key not in self.part_ordinal:
+                self.part_ordinal[key] = len(self.part_keys)
+                self.part_keys.append(sys.intern(key))
+                self.part_starts.append(i)
+            by_vehicle.setdefault(vehicle.lower(), array("I")).append(i)
+            span = spans.get(year)
+            if span is None:
+                span = spans[year] = year_range(year) or (0, 0)
+            self.year_lo[i], self.year_hi[i] = span
+        self.part_starts.append(n)
+        self.by_vehicle = by_vehicle
+
+        # Token indexes over the distinct part and vehicle names
+        self.part_tokens = {}
+        self.by_token = {}
+        for key in self.part_keys:
+            tokens = significant(tokenize(key))
+            self.part_tokens[key] = tokens
+            for tok in tokens:
+                self.by_token.setdefault(tok, set()).add(key)
+        self.vehicle_tokens = {}
+        self.by_vehicle_token = {}
+        for vkey in by_vehicle:
+            tokens = significant(tokenize(vkey))
+            self.vehicle_tokens[vkey] = tokens
+            for tok in tokens:
+                self.by_vehicle_token.setdefault(tok, set()).add(vkey)
+
+    @classmethod
+    def from_connection(cls, conn):
+        return cls(conn.execute("SELECT part, price, stock, vehicle, year FROM inventory"))
+
+    def __len__(self):
+        return len(self.parts)
+
+    def row(self, i):
+        return (self.parts[i], self.prices[i], self.stocks[i], self.vehicles[i], self.years[i])
+
+    def __iter__(self):
+        return (self.row(i) for i in range(len(self.parts)))
+
+    def part_range(self, key):
+        k = self.part_ordinal.get(key)
+        if k is None:
+            return range(0)
+        return range(self.part_starts[k], self.part_starts[k + 1])
+
+    def match_part(self, tokens):
+        """Longest inventory part name whose significant tokens all appear in the message.
+
+        Failing that, customers use short forms ("pads", "shocks", "headlight"
+        for "Headlight Assembly"): take the part sharing the most tokens with
+        the message, as long as no other part shares as many.
+        """
+        present = set(tokens) | {PART_ALIASES[t] for t in tokens if t in PART_ALIASES}
+        candidates = set()
+        for tok in present:
+            candidates |= self.by_token.get(tok, set())
+        best, best_len = None, 0
+        for key in candidates:
+            needed = self.part_tokens[key]
+            if needed and needed <= present and len(needed) > best_len:
+                best, best_len = key, len(needed)
+        if best or not candidates:
+            return best
+
+        scored = sorted(((len(self.part_tokens[key] & present), key) for key in candidates), reverse=True)
+        if len(scored) > 1 and scored[0][0] == scored[1][0]:
+            return None
+        return scored[0][1]
+
+    def match_vehicles(self, tokens):
+        """Inventory vehicles sharing the most tokens with the message"""
+        present = set(tokens)
+        scored = {}
+        for tok in present:
+            for key in self.by_vehicle_token.get(tok, ()):
+                scored[key] = scored.get(key, 0) + 1
+        if not scored:
+            return set()
+        top = max(scored.values())
+        return {k for k, v in scored.items() if v == top}
+
+    def lookup(self, part=None, vehicles=None, year=None):
+        if part and vehicles:
+            # Vehicle row ids are ascending, so slice each to the part's range
+            span = self.part_range(part)
+            candidates = []
+            for v in vehicles:
+                ids = self.by_vehicle.get(v)
+                if ids:
+                    candidates.extend(ids[bisect_left(ids, span.start):bisect_left(ids, span.stop)])
+            candidates.sort()
+        elif part:
+            candidates = self.part_range(part)
+        elif vehicles:
+            candidates = sorted(i for v in vehicles for i in self.by_vehicle.get(v, ()))
+        else:
+            candidates = range(len(self.parts))
+        results = []
+        for i in candidates:
+            if vehicles and self.vehicles[i].lower() not in vehicles:
+                continue
+            if year and self.year_lo[i] and not (self.year_lo[i] <= year <= self.year_hi[i]):
+                continue
+            results.append(self.row(i))
+        return results
+
+def extract_intent(msg, index):
+    """Local intent/entity extraction: {'intent', 'part', 'vehicles', 'year'}"""
+    text = f" {' '.join(TOKEN_RE.findall(msg.lower()))} "
+    tokens = tokenize(msg)
+    if any(f" {w} " in text for w in PRICE_WORDS):
+        intent = "price"
+    elif any(f" {w} " in text for w in STOCK_WORDS):
+        intent = "stock"
+    else:
+        intent = None
+    year_match = YEAR_RE.search(msg)
+    return {
+        "intent": intent,
+        "part": index.match_part(tokens) if index else None,
+        "vehicles": index.match_vehicles(tokens) if index else set(),
+        "year": int(year_match.group(1)) if year_match else None,
+    }
+
+def format_row(row):
+    part, price, stock, vehicle, year = row
+    return f"{part} ({vehicle} {year}) - KES {price:,.0f}, {'stock ' + str(stock) if stock > 0 else 'out of stock'}"
+
+def answer_from_inventory(msg, index):
+    """Answer a price/stock question straight from the index, or None to defer to the LLM"""
+    if index is None or not len(index):
+        return None
+    entities = extract_intent(msg, index)
+    if not entities["intent"] or not entities["part"]:
+        return None
+
+    rows = index.lookup(entities["part"], entities["vehicles"], entities["year"])
+    if not rows:
+        return "Hiyo haiko stock kwa sasa lakini naeza confirm na boss. Ni gari gani na year gani haswa?"
+
+    if len(rows) == 1:
+        part, price, stock, vehicle, year = rows[0]
+        if stock <= 0:
+            return f"{part} ya {vehicle} {year} imeisha stock kwa sasa. Naeza kuconfirm restock date?"
+        if entities["intent"] == "stock":
+            return f"Iko stock bro - {stock} pcs za {part} ({vehicle} {year}), KES {price:,.0f}. Nikutumie?"
+        return f"{part} ya {vehicle} {year} ni KES {price:,.0f}, tuko na {stock} pcs. MPESA au bank?"
+
+    lines = "\n".join(f"- {format_row(r)}" for r in rows[:3])
+    more = f"\n+ {len(rows) - 3} more" if len(rows) > 3 else ""
+    return f"Tuko na hizi:\n{lines}{more}\nGari gani na year gani haswa?"
@@ -0,0 +1,201 @@
+# inventory_history.py - Delta-encoded price/stock history across inventory CSV imports
+import logging
+
+logger = logging.getLogger("InventoryHistory")
+
+# A SKU is (part, vehicle, year). inventory_items holds its current state; inventory_deltas
+# gets a row only for imports where its price or stock changed, or it appeared/disappeared.
+HISTORY_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS inventory_imports (
+        id INTEGER PRIMARY KEY,
+        imported_at TEXT DEFAULT (datetime('now')),
+        filename TEXT,
+        parts INTEGER,
+        changed INTEGER DEFAULT 0,
+        removed INTEGER DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_inventory_imports_at ON inventory_imports(imported_at)",
+    """
+    CREATE TABLE IF NOT EXISTS inventory_items (
+        id INTEGER PRIMARY KEY,
+        part TEXT COLLATE NOCASE,
+        vehicle TEXT COLLATE NOCASE,
+        year TEXT,
+        price REAL,
+        stock INTEGER,
+        present INTEGER DEFAULT 0,
+        UNIQUE (part, vehicle, year)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inventory_deltas (
+        item_id INTEGER,
+        import_id INTEGER,
+        price REAL,
+        stock INTEGER,
+        present INTEGER,
+        PRIMARY KEY (item_id, import_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_inventory_deltas_import ON inventory_deltas(import_id)",
+]
+
+# Applied after `inventory` holds the new upload, inside the upload's transaction
+IMPORT_STEPS = [
+    "CREATE TEMP TABLE IF NOT EXISTS import_stage (part TEXT COLLATE NOCASE, vehicle TEXT COLLATE NOCASE, year TEXT, price REAL, stock INTEGER, item_id INTEGER)",
+    "DELETE FROM import_stage",
+    # Duplicate rows in one CSV: the last one wins, as it does for the bot's answers
+    """
+    INSERT INTO import_stage (part, vehicle, year, price, stock)
+    SELECT part, vehicle, year, price, stock FROM (
+        SELECT part, vehicle, year, price, stock, MAX(rowid) FROM inventory
+        GROUP BY part COLLATE NOCASE, vehicle COLLATE NOCASE, year
+    )
+    """,
+    """
+    INSERT INTO inventory_items (part, vehicle, year)
+    SELECT part, vehicle, year FROM import_stage WHERE 1
+    ON CONFLICT (part, vehicle, year) DO NOTHING
+    """,
+    """
+    UPDATE import_stage SET item_id = (
+        SELECT id FROM inventory_items i
+        WHERE i.part = import_stage.part AND i.vehicle = import_stage.vehicle AND i.year = import_stage.year
+    )
+    """,
+    """
+    INSERT INTO inventory_deltas (item_id, import_id, price, stock, present)
+    SELECT s.item_id, :import_id, s.price, s.stock, 1
+    FROM import_stage s JOIN inventory_items i ON i.id = s.item_id
+    WHERE i.present = 0 OR i.price IS NOT s.price OR i.stock IS NOT s.stock
+    """,
+    """
+    INSERT INTO inventory_deltas (item_id, import_id, price, stock, present)
+    SELECT i.id, :import_id, NULL, NULL, 0 FROM inventory_items i
+    WHERE i.present = 1 AND i.id NOT IN (SELECT item_id FROM import_stage)
+    """,
+    """
+    UPDATE inventory_items SET price = d.price, stock = d.stock, present = d.present
+    FROM (SELECT item_id, price, stock, present FROM inventory_deltas WHERE import_id = :import_id) AS d
+    WHERE inventory_items.id = d.item_id
+    """,
+    """
+    UPDATE inventory_imports SET
+        changed = (SELECT COUNT(*) FROM inventory_deltas WHERE import_id = :import_id AND present = 1),
+        removed = (SELECT COUNT(*) FROM inventory_deltas WHERE import_id = :import_id AND present = 0)
+    WHERE id = :import_id
+    """,
+    "DELETE FROM import_stage",
+]
+
+def install_history(conn):
+    """Create the history tables and record the current inventory as the baseline import"""
+    for statement in HISTORY_SCHEMA:
+        conn.execute(statement)
+    if conn.execute("SELECT 1 FROM inventory LIMIT 1").fetchone():
+        record_import(conn, "baseline")
+
+def record_import(conn, filename):
+    """Diff `inventory` against the last import; returns (import_id, changed, removed). Does not commit."""
+    parts = conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+    import_id = conn.execute(
+        "INSERT INTO inventory_imports (filename, parts) VALUES (?, ?)", (filename, parts)
+    ).lastrowid
+    for statement in IMPORT_STEPS:
+        conn.execute(statement, {"import_id": import_id} if ":import_id" in statement else ())
+    changed, removed = conn.execute(
+        "SELECT changed, removed FROM inventory_imports WHERE id = ?", (import_id,)
+    ).fetchone()
+    logger.info(f"Import {import_id} ({filename}): {parts} parts, {changed} changed, {removed} removed")
+    return import_id, changed, removed
+
+class InventoryHistory:
+    """Read side: every lookup is an index seek on (item_id, import_id) per SKU, whatever the import count"""
+    def __init__(self, conn):
+        self.conn = conn
+
+    def import_as_of(self, day):
+        """Last import on or before the end of `day` (YYYY-MM-DD), or None"""
+        row = self.conn.execute(
+            "SELECT id, imported_at FROM inventory_imports WHERE imported_at < date(?, '+1 day') "
+            "ORDER BY imported_at DESC, id DESC LIMIT 1",
+            (day,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def as_of(self, import_id, part=None, limit=50):
+        """(part, vehicle, year, price, stock) in stock-list state right after `import_id`"""
+        pattern = f"%{part}%" if part else None
+        return self.conn.execute(
+            """
+            SELECT i.part, i.vehicle, i.year, d.price, d.stock
+            FROM inventory_items i
+            JOIN inventory_deltas d ON d.item_id = i.id AND d.import_id = (
+                SELECT MAX(import_id) FROM inventory_deltas WHERE item_id = i.id AND import_id <= ?
+            )
+            WHERE d.present = 1 AND (? IS NULL OR i.part LIKE ?)
+            ORDER BY i.part, i.vehicle, i.year LIMIT ?
+            """,
+            (import_id, pattern, pattern, limit)
+        ).fetchall()
+
+    def trend(self, part, vehicle=None):
+        """Change points (vehicle, year, imported_at, price, stock, present) for one part, oldest first.
+
+        `vehicle` matches anywhere in the stored name, so "Vitz" finds "Toyota Vitz".
+        """
+        return self.conn.execute(
+            """
+            SELECT i.vehicle, i.year, m.imported_at, d.price, d.stock, d.present
+            FROM inventory_items i
+            JOIN inventory_deltas d ON d.item_id = i.id
+            JOIN inventory_imports m ON m.id = d.import_id
+            WHERE i.part = ? AND (? IS NULL OR i.vehicle LIKE '%' || ? || '%')
+            ORDER BY i.vehicle, i.year, d.import_id
+            """,
+            (part, vehicle, vehicle)
+        ).fetchall()
+
+    def suggest(self, part, n=5):
+        return [r[0] for r in self.conn.execute(
+            "SELECT DISTINCT part FROM inventory_items WHERE part LIKE ? ORDER BY part LIMIT ?", (f"%{part}%", n)
+        ).fetchall()]
+
+    def trend_text(self, part, vehicle=None, points=8):
+        rows = self.trend(part, vehicle)
+        if not rows:
+            similar = self.suggest(part)
+            hint = f"\n\nDid you mean: {', '.join(similar)}" if similar else ""
+            return f"No history for '{part}'.{hint}"
+        by_sku = {}
+        for vehicle_name, year, imported_at, price, stock, present in rows:
+            by_sku.setdefault((vehicle_name, year), []).append((imported_at, price, stock, present))
+        lines = [f"📉 PRICE HISTORY: {part}"]
+        for (vehicle_name, year), changes in list(by_sku.items())[:10]:
+            lines.append(f"\n{vehicle_name} {year} ({len(changes)} changes)")
+            for imported_at, price, stock, present in changes[-points:]:
+                if present:
+                    lines.append(f"{imported_at[:10]}: KES {price:,.0f}, stock {stock}")
+                else:
+                    lines.append(f"{imported_at[:10]}: removed from stock list")
+            prices = [c[1] for c in changes if c[3]]
+            if len(prices) > 1 and prices[0]:
+                lines.append(f"Trend: {prices[0]:,.0f} → {prices[-1]:,.0f} ({prices[-1] / prices[0] - 1:+.0%})")
+        return "\n".join(lines)
+
+    def as_of_text(self, day, part=None, limit=30):
+        found = self.import_as_of(day)
+        if found is None:
+            return f"No inventory imports on or before {day}."
+        import_id, imported_at = found
+        rows = self.as_of(import_id, part, limit)
+        lines = [f"🗓 INVENTORY AS OF {day} (import #{import_id}, {imported_at[:16]})"]
+        for part_name, vehicle, year, price, stock in rows:
+            lines.append(f"{part_name} | {vehicle} {year} | KES {price:,.0f} | stock {stock}")
+        if not rows:
+            lines.append("Nothing matched.")
+        elif len(rows) == limit:
+            lines.append(f"(first {limit}; add a part name to narrow)")
+        return "\n".join(lines)
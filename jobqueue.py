@@ -0,0 +1,154 @@
+# jobqueue.py - SQLite-backed job/command queue shared by the console and WhatsApp worker processes
+import asyncio
+import inspect
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+
+logger = logging.getLogger("JobQueue")
+
+def connect(db_path):
+    """Connection tuned for several processes sharing one WAL database"""
+    conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=10.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=10000")
+    return conn
+
+class Job:
+    def __init__(self, job_id, kind, payload, attempts):
+        self.id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+
+class JobQueue:
+    """Durable queue over the `jobs` table (migration 7) plus worker heartbeats in `workers`.
+
+    Each process owns its own connection. claim() takes the oldest pending
+    job inside BEGIN IMMEDIATE, so two workers never run the same job;
+    jobs left 'running' by a crashed worker are put back by requeue_stale().
+    Queue names: 'wa_inbox' for incoming WhatsApp messages (any worker),
+    'worker:<id>' for commands addressed to one process.
+    """
+    def __init__(self, db_path, worker_id=None):
+        self.conn = connect(db_path)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+    def put(self, queue, kind, payload=None):
+        cursor = self.conn.execute(
+            "INSERT INTO jobs (queue, kind, payload_json) VALUES (?, ?, ?)",
+            (queue, kind, json.dumps(payload or {}))
+        )
+        return cursor.lastrowid
+
+    def broadcast(self, role, kind, payload=None, within=60):
+        """Send a command to every live worker of `role`; returns how many were addressed"""
+        workers = self.live_workers(role, within)
+        for worker in workers:
+            self.put(f"worker:{worker['worker_id']}", kind, payload)
+        return len(workers)
+
+    def claim(self, queue):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT id, kind, payload_json, attempts FROM jobs WHERE queue = ? AND status = 'pending' ORDER BY id LIMIT 1",
+                (queue,)
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', claimed_by = ?, claimed_at = datetime('now'), attempts = attempts + 1 WHERE id = ?",
+                (self.worker_id, row[0])
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return Job(row[0], row[1], json.loads(row[2] or "{}"), row[3] + 1)
+
+    def complete(self, job_id):
+        self.conn.execute(
+            "UPDATE jobs SET status = 'done', finished_at = datetime('now') WHERE id = ?", (job_id,)
+        )
+
+    def fail(self, job, error, max_attempts=3):
+        status = "pending" if job.attempts < max_attempts else "failed"
+        self.conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = datetime('now') WHERE id = ?",
+            (status, str(error)[:500], job.id)
+        )
+        return status
+
+    def requeue_stale(self, timeout=300):
+        """Put back jobs whose worker died mid-run"""
+        count = self.conn.execute(
+            "UPDATE jobs SET status = 'pending' WHERE status = 'running' AND claimed_at < datetime('now', ?)",
+            (f"-{int(timeout)} seconds",)
+        ).rowcount
+        if count:
+            logger.warning(f"Requeued {count} stale jobs")
+        return count
+
+    def prune(self, keep_days=7):
+        return self.conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < datetime('now', ?)",
+            (f"-{int(keep_days)} days",)
+        ).rowcount
+
+    def depth(self, queue):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE queue = ? AND status = 'pending'", (queue,)
+        ).fetchone()[0]
+
+    def heartbeat(self, role, info=None):
+        self.conn.execute(
+            "INSERT INTO workers (worker_id, role, pid, last_seen, info_json) VALUES (?, ?, ?, datetime('now'), ?) "
+            "ON CONFLICT (worker_id) DO UPDATE SET role = excluded.role, pid = excluded.pid, "
+            "last_seen = excluded.last_seen, info_json = excluded.info_json",
+            (self.worker_id, role, os.getpid(), json.dumps(info or {}))
+        )
+
+    def live_workers(self, role=None, within=60):
+        rows = self.conn.execute(
+            "SELECT worker_id, role, pid, last_seen, info_json FROM workers "
+            "WHERE last_seen >= datetime('now', ?) AND (? IS NULL OR role = ?) ORDER BY worker_id",
+            (f"-{int(within)} seconds", role, role)
+        ).fetchall()
+        return [
+            {"worker_id": r[0], "role": r[1], "pid": r[2], "last_seen": r[3], "info": json.loads(r[4] or "{}")}
+            for r in rows
+        ]
+
+    async def consume(self, queue, handler, idle=0.5, max_attempts=3, ready=None):
+        """Claim and run jobs from `queue` forever; handler(kind, payload) may be sync or async.
+
+        While `ready()` is false nothing is claimed, so jobs stay pending for another consumer.
+        """
+        while True:
+            if ready is not None and not ready():
+                await asyncio.sleep(idle)
+                continue
+            job = self.claim(queue)
+            if job is None:
+                await asyncio.sleep(idle)
+                continue
+            start = time.perf_counter()
+            try:
+                result = handler(job.kind, job.payload)
+                if inspect.isawaitable(result):
+                    await result
+                self.complete(job.id)
+            except asyncio.CancelledError:
+                self.fail(job, "cancelled", max_attempts)
+                raise
+            except Exception as e:
+                status = self.fail(job, f"{type(e).__name__}: {e}", max_attempts)
+                logger.error(f"Job {job.id} ({queue}/{job.kind}) failed, now {status}: {e}", exc_info=True)
+            else:
+                logger.debug(f"Job {job.id} ({queue}/{job.kind}) done in {time.perf_counter() - start:.2f}s")
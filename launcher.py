@@ -0,0 +1,113 @@
+# launcher.py - Runs the Telegram console and WhatsApp worker processes and restarts them if they die
+# Usage: python launcher.py [--wa-workers N]
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+logger = logging.getLogger("Launcher")
+
+ROOT = Path(__file__).resolve().parent
+
+class Child:
+    """One supervised process with exponential restart backoff"""
+    def __init__(self, name, args, env):
+        self.name = name
+        self.args = args
+        self.env = env
+        self.process = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = 1.0
+        self.next_start = 0.0
+
+    def start(self):
+        self.process = subprocess.Popen(self.args, env=self.env)
+        self.started_at = time.monotonic()
+        logger.info(f"Started {self.name} (pid {self.process.pid})")
+
+    def check(self, now):
+        """Restart the child once its backoff has elapsed after an exit"""
+        if self.process is not None:
+            code = self.process.poll()
+            if code is None:
+                return
+            uptime = now - self.started_at
+            # A child that stayed up a while gets a fresh backoff
+            self.backoff = 1.0 if uptime > 60 else min(self.backoff * 2, 60.0)
+            self.next_start = now + self.backoff
+            self.process = None
+            logger.error(f"{self.name} exited with code {code} after {uptime:.0f}s, restarting in {self.backoff:.0f}s")
+        elif now >= self.next_start:
+            self.restarts += 1
+            self.start()
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+class Launcher:
+    def __init__(self, wa_workers=1):
+        base_env = dict(os.environ, WA_MODE="worker")
+        metrics_port = int(os.getenv("METRICS_PORT", "9108"))
+        self.children = [Child("console", [sys.executable, str(ROOT / "main.py")], base_env)]
+        for i in range(wa_workers):
+            args = [sys.executable, str(ROOT / "wa_worker.py"), "--id", f"wa-{i}"]
+            if i == 0:
+                args.append("--poller")
+            env = dict(base_env, METRICS_PORT=str(metrics_port + 1 + i) if metrics_port else "0")
+            self.children.append(Child(f"wa-{i}", args, env))
+        self.stopping = False
+
+    def migrate(self):
+        """Run schema migrations once, before several processes open the database"""
+        sys.path.insert(0, str(ROOT))
+        from storage import Storage
+        storage = Storage()
+        storage.conn.close()
+
+    def run(self):
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: setattr(self, "stopping", True))
+        self.migrate()
+        for child in self.children:
+            child.start()
+        while not self.stopping:
+            now = time.monotonic()
+            for child in self.children:
+                child.check(now)
+            time.sleep(1)
+        self.shutdown()
+
+    def shutdown(self, timeout=15):
+        logger.info("Stopping all processes...")
+        for child in self.children:
+            child.stop()
+        deadline = time.monotonic() + timeout
+        for child in self.children:
+            if child.process is None:
+                continue
+            try:
+                child.process.wait(max(deadline - time.monotonic(), 0.1))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"{child.name} did not stop in time, killing")
+                child.process.kill()
+        logger.info("All processes stopped")
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run the EMPIRE console and WhatsApp workers as separate processes")
+    parser.add_argument("--wa-workers", type=int, default=int(os.getenv("WA_WORKERS", "1")),
+                        help="WhatsApp worker processes; the first one also owns the Baileys server")
+    args = parser.parse_args()
+    Launcher(max(args.wa_workers, 1)).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# llm_standin.py - Local OpenAI-compatible stand-in for the Groq API (offline testing/benchmarks)
+# Usage: python llm_standin.py --port 8089 --ttft 0.4 --token-delay 0.02 --error-rate 0.01 --rate-limit 30
+# Then point the bot at it with LLM_BASE_URL=http://127.0.0.1:8089/v1
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("LLMStandin")
+
+CANNED_REPLY = (
+    "Sawa bro, hiyo part iko stock na bei ni poa kabisa. "
+    "Ni gari gani haswa na year gani? Nikuconfirm fitment then tunafanya MPESA au bank."
+)
+
+class StandinConfig:
+    def __init__(self, ttft=0.3, token_delay=0.02, jitter=0.1, error_rate=0.0, rate_limit=0.0, reply=CANNED_REPLY):
+        self.ttft = ttft                  # seconds before the first token / response
+        self.token_delay = token_delay    # seconds between streamed tokens
+        self.jitter = jitter              # +/- fraction applied to every delay
+        self.error_rate = error_rate      # probability of a 500 response
+        self.rate_limit = rate_limit      # requests per second before 429s (0 = unlimited)
+        self.reply = reply
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "streams": 0}
+
+    def delay(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def admit(self):
+        """Fixed one-second window rate limiter; False means respond 429"""
+        with self._lock:
+            self.stats["requests"] += 1
+            if not self.rate_limit:
+                return True
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_count = now, 0
+            self._window_count += 1
+            if self._window_count > self.rate_limit:
+                self.stats["rate_limited"] += 1
+                return False
+            return True
+
+def make_handler(config):
+    class StandinHandler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            logger.debug(fmt % args)
+
+        def _json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                self._json(200, config.stats)
+            else:
+                self._json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "Not found"}})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+
+            if not config.admit():
+                self._json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}}, {"Retry-After": "1"})
+                return
+            if random.random() < config.error_rate:
+                config.stats["errors"] += 1
+                self._json(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+                return
+
+            model = request.get("model", "standin")
+            tokens = [w + " " for w in config.reply.split(" ")]
+            config.delay(config.ttft)
+
+            if not request.get("stream"):
+                for _ in tokens:
+                    config.delay(config.token_delay)
+                self._json(200, {
+                    "id": "standin",
+                    "object": "chat.completion",
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": config.reply}, "finish_reason": "stop"}]
+                })
+                return
+
+            config.stats["streams"] += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            try:
+                for i, token in enumerate(tokens):
+                    if i:
+                        config.delay(config.token_delay)
+                    chunk = {
+                        "id": "standin",
+                        "object": "chat.completion.chunk",
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                logger.debug("Client cancelled stream")
+
+    return StandinHandler
+
+def serve(config, host="127.0.0.1", port=8089):
+    """Start the stand-in in a daemon thread and return the server (call .shutdown() to stop)"""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"LLM stand-in listening on http://{host}:{server.server_address[1]}/v1")
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible LLM stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    config = StandinConfig(args.ttft, args.token_delay, args.jitter, args.error_rate, args.rate_limit)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    server.daemon_threads = True
+    logger.info(f"LLM stand-in listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# loop_watchdog.py - Event-loop stall detection and on-demand sampling profiles of the live process
+import asyncio
+import io
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+
+import metrics
+
+logger = logging.getLogger("Watchdog")
+
+LOOP_LAG = metrics.histogram(
+    "event_loop_lag_seconds", "How late the watchdog heartbeat woke up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+STALLS = metrics.counter("event_loop_stalls_total", "Event-loop stalls longer than the watchdog threshold")
+
+class Stall:
+    """One detected stall: when it started, how long it lasted and what the loop was running"""
+    def __init__(self, started, stack):
+        self.started = started
+        self.stack = stack
+        self.duration = None
+
+    def text(self):
+        when = datetime.fromtimestamp(self.started).strftime('%Y-%m-%d %H:%M:%S')
+        duration = f"{self.duration:.2f}s" if self.duration is not None else "ongoing"
+        return f"Stall at {when} lasting {duration}\n{self.stack}"
+
+class LoopWatchdog:
+    """Heartbeat coroutine on the loop plus a monitor thread that notices when it stops beating.
+
+    When the heartbeat is older than `threshold` the monitor grabs the loop
+    thread's current stack, so the log shows the code that blocked it.
+    """
+    def __init__(self, threshold=0.5, interval=0.1, keep=20):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = deque(maxlen=keep)
+        self.last_beat = time.monotonic()
+        self.max_lag = 0.0
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat(), name="loop-watchdog")
+        self._thread = threading.Thread(target=self._monitor, daemon=True, name="loop-watchdog")
+        self._thread.start()
+        logger.info(f"Event-loop watchdog started (threshold {self.threshold:g}s)")
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            LOOP_LAG.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            self.last_beat = now
+
+    def _monitor(self):
+        current = None
+        while not self._stop.wait(self.interval / 2):
+            behind = time.monotonic() - self.last_beat
+            if behind > self.threshold and current is None:
+                current = Stall(time.time() - behind, self.loop_stack())
+                self.stalls.append(current)
+                STALLS.inc()
+                logger.warning(f"Event loop blocked for {behind:.2f}s, loop thread is in:\n{current.stack}")
+            elif current is not None and behind <= self.threshold:
+                current.duration = time.time() - current.started
+                logger.warning(f"Event loop unblocked after {current.duration:.2f}s")
+                current = None
+
+    def loop_stack(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return "(loop thread not found)"
+        return "".join(traceback.format_stack(frame))
+
+    def report(self):
+        lag = LOOP_LAG.quantile(0.95)
+        lines = [
+            f"Threshold: {self.threshold:g}s | stalls: {int(STALLS.total())} | max lag: {self.max_lag * 1000:.0f}ms | p95 lag <= {lag * 1000:g}ms"
+        ]
+        for stall in list(self.stalls)[-5:]:
+            when = datetime.fromtimestamp(stall.started).strftime('%H:%M:%S')
+            duration = f"{stall.duration:.2f}s" if stall.duration is not None else "ongoing"
+            last_line = stall.stack.strip().splitlines()[-2:] if stall.stack else []
+            lines.append(f"{when} {duration}: {' '.join(l.strip() for l in last_line)[:150]}")
+        return "\n".join(lines)
+
+    def stalls_document(self):
+        """Full stacks of the recent stalls as a text file for Telegram"""
+        body = "\n\n".join(stall.text() for stall in self.stalls) or "No stalls recorded."
+        doc = io.BytesIO(body.encode("utf-8"))
+        doc.name = f"loop_stalls_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        return doc
+
+def _frame_key(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})"
+
+def sample_profile(seconds=10.0, interval=0.005, thread_id=None):
+    """Sample a thread's stack every `interval` seconds; returns (samples, collapsed stacks, self counts, total counts).
+
+    Runs in the calling thread, so call it via asyncio.to_thread to profile the loop thread.
+    """
+    thread_id = thread_id or threading.main_thread().ident
+    collapsed = Counter()
+    self_counts = Counter()
+    total_counts = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stack = []
+            while frame is not None:
+                stack.append(_frame_key(frame))
+                frame = frame.f_back
+            stack.reverse()
+            collapsed[";".join(stack)] += 1
+            self_counts[stack[-1]] += 1
+            for key in set(stack):
+                total_counts[key] += 1
+            samples += 1
+        time.sleep(interval)
+    return samples, collapsed, self_counts, total_counts
+
+def profile_report(seconds, samples, collapsed, self_counts, total_counts, top=25):
+    """Plain-text profile: top self/cumulative functions plus collapsed stacks for flamegraph tools"""
+    out = io.StringIO()
+    out.write(f"Sampling profile: {seconds:g}s, {samples} samples of the event-loop thread\n\n")
+    for title, counts in (("Top functions by own samples", self_counts), ("Top functions including callees", total_counts)):
+        out.write(f"{title}\n")
+        for key, count in counts.most_common(top):
+            out.write(f"{count / max(samples, 1):6.1%} {count:6d}  {key}\n")
+        out.write("\n")
+    out.write("Collapsed stacks (flamegraph.pl / speedscope format)\n")
+    for stack, count in collapsed.most_common():
+        out.write(f"{stack} {count}\n")
+    return out.getvalue()
+
+async def profile_document(seconds, thread_id=None):
+    """Profile the loop thread for `seconds` without blocking it; returns a named BytesIO report"""
+    thread_id = thread_id or threading.get_ident()
+    samples, collapsed, self_counts, total_counts = await asyncio.to_thread(sample_profile, seconds, 0.005, thread_id)
+    report = profile_report(seconds, samples, collapsed, self_counts, total_counts)
+    doc = io.BytesIO(report.encode("utf-8"))
+    doc.name = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    return doc
@@ -4,37 +4,59 @@ import json
 import logging
 import os
 import random
+import signal
 from datetime import datetime
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes, filters
-from dotenv import load_dotenv
+import startup
+from startup import phase
+
+with phase("import telegram"):
+    from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+    from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes, filters
+    from dotenv import load_dotenv
 
 load_dotenv()
 
-from brain import GroqBrain
-from storage import Storage
-from fb_engine import FBEngine
-from wa_engine import WAEngine
-from crud_handlers import CRUDHandlers
+with phase("import modules"):
+    from brain import GroqBrain
+    from storage import Storage
+    from fb_engine import FBEngine
+    from wa_engine import WAEngine
+    from crud_handlers import CRUDHandlers
+    from router import CallbackRouter
+    from scheduler import Scheduler
+    import metrics
+    import loop_watchdog
+    from jobqueue import JobQueue
+    from backup import BackupManager
+    from traffic import recorder_from_env
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 logger = logging.getLogger("EMPIRE")
 
 TOKEN = os.getenv("BOT_TOKEN")
+# "worker": WhatsApp runs in wa_worker.py processes started by launcher.py
+WA_MODE = os.getenv("WA_MODE", "inprocess")
 owner_id_raw = os.getenv("OWNER_ID", "0")
 OWNER_ID = int(owner_id_raw.replace("Id:", "").strip())
 
 if not TOKEN or not OWNER_ID:
     raise ValueError("Set BOT_TOKEN and OWNER_ID in .env")
 
-storage = Storage()
-brain = GroqBrain(os.getenv("GROQ_KEY", ""), storage)
-fb = FBEngine(brain, storage)
-wa = WAEngine(brain, storage)
-crud = CRUDHandlers(storage, wa)
+with phase("storage + migrations"):
+    storage = Storage()
+
+with phase("engines"):
+    scheduler = Scheduler()
+    watchdog = loop_watchdog.LoopWatchdog(threshold=float(os.getenv("LOOP_STALL_THRESHOLD", "0.5")))
+    brain = GroqBrain(os.getenv("GROQ_KEY", ""), storage)
+    fb = FBEngine(brain, storage, scheduler)
+    wa = WAEngine(brain, storage, scheduler)
+    crud = CRUDHandlers(storage, wa)
+    backups = BackupManager(storage.db_path, os.getenv("BACKUP_DIR", "backups"))
 
-app = Application.builder().token(TOKEN).build()
+with phase("telegram app"):
+    app = Application.builder().token(TOKEN).build()
 
 PERSISTENT_MENU = ReplyKeyboardMarkup([
     [KeyboardButton("🏠 Home"), KeyboardButton("📊 Leads"), KeyboardButton("⚙️ Operations")],
@@ -42,16 +64,16 @@ PERSISTENT_MENU = ReplyKeyboardMarkup([
 ], resize_keyboard=True)
 
 def get_main_stats_text():
-    parts_count = storage.conn.execute('SELECT COUNT(*) FROM inventory').fetchone()[0]
-    leads_today_count = storage.conn.execute("SELECT COUNT(*) FROM seen WHERE date(timestamp) = date('now')").fetchone()[0] or 0
+    stats = storage.stats
     return (
         "🚀 EMPIRE v13 — HUNTING & CLOSING\n\n"
         f"🧠 Groq Brain: {'ON 🔥' if brain.online else 'Fallback'}\n"
         f"📘 FB Accounts: {len(storage.fb_accounts)}\n"
         f"👥 Groups: {len(storage.groups)}\n"
         f"📱 WA Numbers: {len(storage.wa_numbers)}\n"
-        f"🔧 Parts: {parts_count}\n"
-        f"📈 Leads Today: {leads_today_count}\n\n"
+        f"🔧 Parts: {stats.inventory_parts}\n"
+        f"📈 Leads Today: {stats.leads_today}\n\n"
+        f"{stats.staleness_text()}\n\n"
         "Choose a module:"
     )
 
@@ -93,14 +115,13 @@ async def handle_persistent_menu(update: Update, context: ContextTypes.DEFAULT_T
             [InlineKeyboardButton("📥 Export CSV", callback_data="leads_export")],
             [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]
         ]
-        stats = storage.conn.execute(
-            "SELECT COUNT(*), COUNT(CASE WHEN replied=1 THEN 1 END) FROM seen WHERE date(timestamp) = date('now')"
-        ).fetchone()
+        stats = storage.stats
         text = (
             f"📊 LEADS DASHBOARD\n\n"
-            f"Today: {stats[0]} leads\n"
-            f"Replied: {stats[1]}\n"
-            f"Pending: {stats[0] - stats[1]}\n\n"
+            f"Today: {stats.leads_today} leads\n"
+            f"Replied: {stats.replied_today}\n"
+            f"Pending: {stats.leads_today - stats.replied_today}\n\n"
+            f"{stats.staleness_text()}\n\n"
             "What would you like to do?"
         )
         await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
@@ -125,8 +146,10 @@ async def handle_persistent_menu(update: Update, context: ContextTypes.DEFAULT_T
             [InlineKeyboardButton("📤 Upload CSV", callback_data="upload_csv")],
             [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")]
         ]
-        total_parts = storage.conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
-        text = f"📁 DATABASE MANAGER\n\nInventory Parts: {total_parts}\n\nWhat would you like to do?"
+        text = (
+            f"📁 DATABASE MANAGER\n\nInventory Parts: {storage.stats.inventory_parts}\n\n"
+            f"{storage.stats.staleness_text()}\n\nWhat would you like to do?"
+        )
         await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
     elif text == "🔧 Settings":
         keyboard = [
@@ -140,151 +163,37 @@ async def handle_persistent_menu(update: Update, context: ContextTypes.DEFAULT_T
         )
         await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
 
+async def show_groq_settings(query):
+    text = (
+        f"🧠 Groq API Configuration\n\n"
+        f"Status: {'ACTIVE' if brain.online else 'INACTIVE'}\n"
+        f"Model: llama-3.1-70b-versatile\n\n"
+        f"The Groq API key is set via environment variables.\n"
+        f"Current key: {'✅ Set' if os.getenv('GROQ_KEY') else '❌ Not set'}\n\n"
+        f"⏱️ WA reply SLO: first token {brain.first_token_deadline}s, total {brain.reply_slo}s\n"
+        f"{brain.latency_report()}"
+    )
+    keyboard = [[InlineKeyboardButton("◀️ Back to Settings", callback_data="settings_menu")]]
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+router = CallbackRouter()
+router.exact("main_menu", lambda query: render_main_menu(query, edit=True))
+router.exact("settings_groq", show_groq_settings)
+storage.register_routes(router)
+fb.register_routes(router)
+wa.register_routes(router)
+crud.register_routes(router)
+scheduler.register_routes(router)
+
 async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     data = query.data
     
     try:
-        await storage.log_action('navigation', 'button_click', {'callback_data': data})
+        storage.queue_action('navigation', 'button_click', {'callback_data': data})
         
-        if data == "main_menu":
-            await render_main_menu(query, edit=True)
-        elif data == "fb_menu":
-            await fb.show_menu(query)
-        elif data == "wa_menu":
-            await wa.show_menu(query)
-        elif data == "fb_groups_menu":
-            await storage.show_fb_groups_menu(query)
-        elif data == "fb_groups_add":
-            await query.edit_message_text(
-                "👥 ADD FACEBOOK GROUP\n\n"
-                "To add a Facebook group, use the command:\n"
-                "/add_group\n\n"
-                "Then send the Facebook group URL.\n"
-                "Example: https://www.facebook.com/groups/kenyacarscene",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="fb_groups_menu")]])
-            )
-        elif data == "fb_groups_list":
-            storage.reload_groups()
-            if not storage.groups:
-                await query.edit_message_text(
-                    "📋 NO GROUPS\n\n"
-                    "No Facebook groups configured.\n\n"
-                    "Use /add_group to add your first group.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="fb_groups_menu")]])
-                )
-            else:
-                text = f"📋 FACEBOOK GROUPS ({len(storage.groups)})\n\n"
-                for i, group_url in enumerate(storage.groups, 1):
-                    group_name = group_url.split('/groups/')[-1][:40]
-                    text += f"{i}. {group_name}\n"
-                text += f"\n✅ All {len(storage.groups)} groups actively monitored\n"
-                text += "\nUse /delete_group to remove a group."
-                await query.edit_message_text(
-                    text,
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="fb_groups_menu")]])
-                )
-        elif data == "fb_groups_delete":
-            await query.edit_message_text(
-                "❌ DELETE FACEBOOK GROUP\n\n"
-                "To delete a Facebook group, use the command:\n"
-                "/delete_group\n\n"
-                "You'll be shown a list of groups to choose from.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data="fb_groups_menu")]])
-            )
-        elif data == "templates_menu":
-            await storage.show_templates_menu(query)
-        elif data == "leads_menu":
-            await storage.show_leads_menu(query)
-        elif data == "hist_menu":
-            await fb.show_historical_menu(query)
-        elif data == "db_menu":
-            await storage.show_db_menu(query)
-        elif data == "fb_accounts":
-            await storage.show_fb_accounts_menu(query)
-        elif data == "settings_menu":
-            await storage.show_settings_menu(query)
-        elif data == "fb_toggle":
-            status = await fb.toggle()
-            await query.answer(f"FB scanning {status}!")
-            await fb.show_menu(query)
-        elif data == "fb_force":
-            await query.answer("Force scan started in background...")
-            asyncio.create_task(fb.force_scan())
-            await fb.show_menu(query)
-        elif data == "wa_toggle":
-            status = await wa.toggle()
-            await query.answer(f"WhatsApp service {status}!")
-            await wa.show_menu(query)
-        elif data == "wa_list":
-            await wa.list_numbers(query)
-        elif data == "leads_today":
-            await storage.show_leads_today(query)
-        elif data == "leads_export":
-            await storage.export_leads_csv(query, app.bot)
-        elif data == "hist_start":
-            msg = await fb.start_historical_scrape()
-            await query.answer(msg)
-            await fb.show_historical_menu(query)
-        elif data == "hist_progress":
-            prog = fb.hist_progress
-            if prog["running"]:
-                text = (
-                    f"⏳ Historical Scrape Progress\n\n"
-                    f"Status: RUNNING\n"
-                    f"Current Group: {prog['current_group'] or 'N/A'}\n"
-                    f"Posts Scraped: {prog['posts_scraped']}"
-                )
-            else:
-                text = (
-                    f"⏳ Historical Scrape Progress\n\n"
-                    f"Status: IDLE\n"
-                    f"Total Posts Scraped: {prog['posts_scraped']}"
-                )
-            keyboard = [[InlineKeyboardButton("🔄 Refresh", callback_data="hist_progress")], 
-                        [InlineKeyboardButton("◀️ Back", callback_data="hist_menu")]]
-            await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
-        elif data == "upload_csv":
-            await storage.prompt_csv_upload(query)
-        elif data == "view_inventory":
-            await storage.show_inventory(query)
-        elif data == "edit_fb":
-            await storage.show_edit_templates(query, "fb")
-        elif data == "edit_wa":
-            await storage.show_edit_templates(query, "wa")
-        elif data == "settings_groq":
-            text = (
-                f"🧠 Groq API Configuration\n\n"
-                f"Status: {'ACTIVE' if brain.online else 'INACTIVE'}\n"
-                f"Model: llama-3.1-70b-versatile\n\n"
-                f"The Groq API key is set via environment variables.\n"
-                f"Current key: {'✅ Set' if os.getenv('GROQ_KEY') else '❌ Not set'}"
-            )
-            keyboard = [[InlineKeyboardButton("◀️ Back to Settings", callback_data="settings_menu")]]
-            await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
-        elif data == "wa_add_wizard":
-            keyboard = [[InlineKeyboardButton("◀️ Cancel", callback_data="wa_menu")]]
-            await query.edit_message_text(
-                "📱 ADD WHATSAPP NUMBER\n\n"
-                "To add a WhatsApp number, use the command:\n"
-                "/add_wa_number\n\n"
-                "This will start a wizard that generates a QR code\n"
-                "for you to scan with WhatsApp.",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-        elif data == "fb_accounts_add":
-            keyboard = [[InlineKeyboardButton("◀️ Back", callback_data="fb_accounts")]]
-            await query.edit_message_text(
-                "👤 ADD FACEBOOK ACCOUNT\n\n"
-                "To add a Facebook account, use the command:\n"
-                "/add_fb_account\n\n"
-                "You can add accounts using cookies or email/password.",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-        elif data == "fb_accounts_list":
-            await crud.list_fb_accounts_callback(query)
-        else:
+        if not await router.dispatch(query):
             await query.answer(f"Handler for '{data}' coming soon!")
             logger.warning(f"Unhandled callback: {data}")
             
@@ -300,7 +209,110 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except:
             pass
 
+async def perf(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(
+        "🐢 SLOWEST HANDLERS (p95)\n\n"
+        f"{router.report()}\n\n"
+        "🧠 BRAIN\n\n"
+        f"{brain.latency_report()}\n\n"
+        "🚀 STARTUP\n\n"
+        f"{startup.report()}\n\n"
+        "🐌 EVENT LOOP\n\n"
+        f"{watchdog.report()}"
+    )
+
+async def sale(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/sale <lead_id> <amount> <mpesa|bank|cash> <parts...> [ref:MPESAREF]"""
+    args = context.args or []
+    try:
+        lead_id, amount, method = args[0], float(args[1].replace(",", "")), args[2].lower()
+    except (IndexError, ValueError):
+        await update.message.reply_text(
+            "Usage: /sale <lead_id> <amount> <mpesa|bank|cash> <parts...> [ref:MPESAREF]\n\n"
+            "Example: /sale 254700123456 18500 mpesa Clutch kit Vitz ref:QWE12RTY"
+        )
+        return
+    ref = next((a[4:] for a in args[3:] if a.lower().startswith("ref:")), None)
+    parts = " ".join(a for a in args[3:] if not a.lower().startswith("ref:"))
+    sale_id = storage.record_sale(lead_id, amount, method, parts, mpesa_ref=ref)
+    await update.message.reply_text(f"✅ Sale #{sale_id} recorded: KES {amount:,.0f} via {method}")
+
+async def price_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/pricehistory <part> [| vehicle]"""
+    text = " ".join(context.args or [])
+    part, _, vehicle = (x.strip() for x in text.partition("|"))
+    if not part:
+        await update.message.reply_text("Usage: /pricehistory <part> [| vehicle]\n\nExample: /pricehistory Brake pads | Vitz")
+        return
+    await update.message.reply_text(storage.history.trend_text(part, vehicle or None)[:4000])
+
+async def inventory_as_of(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/asof <YYYY-MM-DD> [part]"""
+    args = context.args or []
+    try:
+        day = datetime.strptime(args[0], "%Y-%m-%d").date().isoformat()
+    except (IndexError, ValueError):
+        await update.message.reply_text("Usage: /asof <YYYY-MM-DD> [part]\n\nExample: /asof 2025-11-01 clutch")
+        return
+    await update.message.reply_text(storage.history.as_of_text(day, " ".join(args[1:]) or None)[:4000])
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = f"📟 METRICS\n\n{metrics.REGISTRY.summary()}"
+    await update.message.reply_text(text[:4000])
+
+profiling = False
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [seconds] - sample the live event loop and send the report as a document"""
+    global profiling
+    try:
+        seconds = min(max(float(context.args[0]), 1.0), 120.0) if context.args else 15.0
+    except ValueError:
+        await update.message.reply_text("Usage: /profile [seconds]  (1-120, default 15)")
+        return
+    if profiling:
+        await update.message.reply_text("⏳ A profile is already running.")
+        return
+    profiling = True
+    try:
+        await update.message.reply_text(f"🔬 Profiling the event loop for {seconds:g}s...")
+        doc = await loop_watchdog.profile_document(seconds)
+        await context.bot.send_document(update.effective_chat.id, document=doc, filename=doc.name,
+                                        caption=f"Sampling profile ({seconds:g}s)")
+    finally:
+        profiling = False
+
+async def stalls_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(f"🐌 EVENT LOOP\n\n{watchdog.report()}")
+    if watchdog.stalls:
+        doc = watchdog.stalls_document()
+        await context.bot.send_document(update.effective_chat.id, document=doc, filename=doc.name,
+                                        caption="Blocking stacks of recent stalls")
+
+async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/backup - take a snapshot now; /backup list - show the ones on disk"""
+    if context.args and context.args[0].lower() == "list":
+        await update.message.reply_text(f"💾 BACKUPS\n\n{backups.report()}")
+        return
+    await update.message.reply_text("💾 Taking a snapshot...")
+    try:
+        snap = await backups.run()
+    except Exception as e:
+        logger.error(f"Manual backup failed: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Backup failed: {str(e)[:200]}")
+        return
+    await update.message.reply_text(
+        f"✅ Snapshot {snap.name} ({snap.manifest['compressed_bytes'] / 1e6:.1f}MB, "
+        f"{snap.manifest['total_seconds']:.1f}s)\n\n{backups.report()}\n\n"
+        "Restore with the bot stopped: python backup.py restore <name>"
+    )
+
 app.add_handler(CommandHandler("start", start))
+for command, callback in (
+    ("perf", perf), ("stats", stats_command), ("profile", profile_command), ("stalls", stalls_command),
+    ("backup", backup_command), ("sale", sale), ("pricehistory", price_history), ("asof", inventory_as_of),
+):
+    app.add_handler(CommandHandler(command, callback, filters=filters.User(user_id=OWNER_ID)))
 
 for handler in crud.get_conversation_handlers():
     app.add_handler(handler)
@@ -312,28 +324,69 @@ app.add_handler(CallbackQueryHandler(button))
 app.add_handler(MessageHandler(filters.Document.ALL, storage.handle_csv_upload))
 app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_persistent_menu))
 
-async def empire_loop():
-    while True:
-        try:
-            if fb.active:
-                await fb.live_cycle()
-        except Exception as e:
-            logger.error(f"FB cycle error: {e}")
-        await asyncio.sleep(1800)
+async def fb_live_job():
+    if fb.active:
+        await fb.live_cycle()
+
+def register_jobs():
+    scheduler.every("fb_live_cycle", 1800, fb_live_job, jitter=120, run_immediately=True)
+    scheduler.every("audit_flush", 5, storage.flush_actions)
+    scheduler.every("stats_refresh", 300, storage.stats.refresh, jitter=30)
+    scheduler.cron("log_rollup", "15 3 * * *", storage.rollup_logs)
+    scheduler.cron("backup", os.getenv("BACKUP_CRON", "0 */6 * * *"), backups.run)
 
 async def main():
-    await app.initialize()
-    await app.start()
-    await app.updater.start_polling(drop_pending_updates=True)
+    with phase("telegram connect"):
+        await app.initialize()
+        await app.start()
+        await app.updater.start_polling(drop_pending_updates=True)
 
     logger.info("EMPIRE v13 — EXPANDED BUILD — ONLINE")
+    logger.info(f"Startup phases:\n{startup.report()}")
     await app.bot.send_message(OWNER_ID, "🚀 EMPIRE v13 — ONLINE\n\nPhases 1.3-1.4 complete!\n\n✅ Persistent sidebar menu\n✅ All buttons wired\n✅ Complete audit logging")
 
-    asyncio.create_task(empire_loop())
-    asyncio.create_task(wa.start_all(app.bot, OWNER_ID))
+    metrics_port = int(os.getenv("METRICS_PORT", "9108"))
+    if metrics_port:
+        try:
+            metrics.serve(metrics_port)
+        except OSError as e:
+            logger.error(f"Metrics endpoint not started on port {metrics_port}: {e}")
 
-    while True:
-        await asyncio.sleep(3600)
+    watchdog.start()
+    register_jobs()
+    await scheduler.start()
+    scheduler.spawn("warm_up", storage.warm_up)
+    if WA_MODE == "worker":
+        jobs = JobQueue(storage.db_path, "console")
+        wa.remote = storage.jobs = jobs
+        wa.active = True
+        scheduler.every("console_heartbeat", 10, lambda: jobs.heartbeat("console"))
+        logger.info("WhatsApp handled by worker processes")
+    else:
+        wa.recorder = recorder_from_env()
+        scheduler.spawn("wa_start", lambda: wa.start_all(app.bot, OWNER_ID))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Shutting down...")
+        await watchdog.stop()
+        await scheduler.shutdown()
+        await wa.stop_baileys_server()
+        if wa.recorder:
+            wa.recorder.close()
+        storage.flush_actions()
+        await app.updater.stop()
+        await app.stop()
+        await app.shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,296 @@
+# metrics.py - Process-wide counters, gauges and histograms with a Prometheus text endpoint
+import bisect
+import logging
+import math
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("Metrics")
+
+# Seconds; covers sub-millisecond SQLite calls up to slow LLM replies
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_value(value):
+    """Full float precision; {:g} would round counters past 999999 to 6 digits"""
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        """Child metric for one label combination (cache it on hot paths)"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _series(self):
+        if self.labelnames:
+            return list(self._children.items())
+        return [((), self)]
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+class Counter(_Metric, _CounterValue):
+    """Monotonic total; rates are derived by the scraper"""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        _Metric.__init__(self, name, help_text, labelnames)
+        _CounterValue.__init__(self)
+
+    _new_child = _CounterValue
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}" for values, child in self._series()]
+
+    def total(self):
+        return sum(child.value for _, child in self._series())
+
+class _GaugeValue:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+class Gauge(_Metric, _GaugeValue):
+    """Point-in-time value, either set directly or read from `func` at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), func=None):
+        _Metric.__init__(self, name, help_text, labelnames)
+        _GaugeValue.__init__(self)
+        self.func = func
+
+    _new_child = _GaugeValue
+
+    def current(self):
+        if self.func is None:
+            return self.value
+        try:
+            return float(self.func())
+        except Exception as e:
+            logger.debug(f"Gauge {self.name} callback failed: {e}")
+            return float("nan")
+
+    def render(self):
+        if self.func is not None:
+            return [f"{self.name} {_format_value(self.current())}"]
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}" for values, child in self._series()]
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+class Histogram(_Metric, _HistogramValue):
+    """Fixed-bucket distribution; observe() is one bisect and three additions"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        _Metric.__init__(self, name, help_text, labelnames)
+        _HistogramValue.__init__(self, tuple(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def render(self):
+        lines = []
+        for values, child in self._series():
+            cumulative = 0
+            for bound, count in zip(child.buckets, child.counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, [('le', '+Inf')])} {child.count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {child.count}")
+        return lines
+
+class MetricsRegistry:
+    """Named metrics for the whole process; modules register theirs at import time"""
+    def __init__(self):
+        self.metrics = {}
+        self.started_at = time.time()
+
+    def _register(self, metric):
+        """Add `metric`, or return the one already registered under its name.
+
+        Re-registering must describe the same metric; a gauge registered
+        again with a `func` reads from the newest callback (e.g. a GroqBrain
+        created later), not the first instance's.
+        """
+        existing = self.metrics.get(metric.name)
+        if existing is None:
+            self.metrics[metric.name] = metric
+            return metric
+        if (type(existing) is not type(metric) or existing.labelnames != metric.labelnames
+                or getattr(existing, "buckets", None) != getattr(metric, "buckets", None)):
+            raise ValueError(f"Metric {metric.name} is already registered with a different type, labels or buckets")
+        if isinstance(metric, Gauge) and metric.func is not None:
+            existing.func = metric.func
+        return existing
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), func=None):
+        return self._register(Gauge(name, help_text, labelnames, func))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Short human-readable digest for the owner /stats command"""
+        uptime = max(time.time() - self.started_at, 1.0)
+        lines = [f"Uptime: {uptime / 3600:.1f}h"]
+        for metric in list(self.metrics.values()):
+            if isinstance(metric, Counter):
+                total = metric.total()
+                lines.append(f"{metric.name}: {total:g} ({total / uptime:.2f}/s)")
+            elif isinstance(metric, Gauge):
+                if metric.func is not None or not metric.labelnames:
+                    lines.append(f"{metric.name}: {metric.current():g}")
+                else:
+                    values = ", ".join(f"{'/'.join(v)}={c.value:g}" for v, c in metric._series())
+                    lines.append(f"{metric.name}: {values or '-'}")
+            else:
+                series = [child for _, child in metric._series() if child.count]
+                count = sum(child.count for child in series)
+                if not count:
+                    lines.append(f"{metric.name}: no samples")
+                    continue
+                mean = sum(child.sum for child in series) / count
+                p95 = max(child.quantile(0.95) for child in series)
+                lines.append(f"{metric.name}: n={count} mean={mean * 1000:.1f}ms p95<={p95 * 1000:g}ms")
+        return "\n".join(lines)
+
+REGISTRY = MetricsRegistry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+QUERY_SECONDS = histogram("storage_query_seconds", "SQLite execute/executemany latency")
+COMMITS = counter("storage_commits_total", "SQLite commits")
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection that records statement latency and commit count"""
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - start)
+
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - start)
+
+    def commit(self):
+        COMMITS.inc()
+        return super().commit()
+
+def make_handler(registry):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            logger.debug(fmt % args)
+
+        def do_GET(self):
+            if self.path.split("?")[0].rstrip("/") != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return MetricsHandler
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve /metrics from a daemon thread (localhost only by default) and return the server"""
+    server = ThreadingHTTPServer((host, port), make_handler(registry))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    logger.info(f"Metrics endpoint on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,85 @@
+# pagination.py - Keyset (rowid cursor) pagination for browsing tables from Telegram
+import logging
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+logger = logging.getLogger("Pagination")
+
+class KeysetPager:
+    """Pages through one table with `rowid > cursor LIMIT n` queries.
+
+    Cursors travel in callback_data as pg:<key>:<n|p>:<rowid>:<filter>, so
+    every page costs one indexed query however deep the user pages.
+    `filters` maps a short key to a (where_sql, params) pair; keep filtered
+    columns indexed so the query can seek instead of scan.
+    """
+    def __init__(self, key, title, table, columns, render_row, back_data, filters=None,
+                 page_size=10, newest_first=False, empty_text="Nothing here yet.", extra_buttons=None):
+        self.key = key
+        self.title = title
+        self.table = table
+        self.columns = columns
+        self.render_row = render_row
+        self.back_data = back_data
+        self.filters = {"all": ("1=1", ())}
+        self.filters.update(filters or {})
+        self.page_size = page_size
+        self.newest_first = newest_first
+        self.empty_text = empty_text
+        self.extra_buttons = extra_buttons or []
+
+    def fetch(self, conn, cursor=None, forward=True, filter_key="all"):
+        """One page of rows plus (has_prev, has_next) flags"""
+        where, params = self.filters.get(filter_key, self.filters["all"])
+        ascending = forward != self.newest_first
+        args = list(params)
+        if cursor is not None:
+            where = f"({where}) AND rowid {'>' if ascending else '<'} ?"
+            args.append(cursor)
+        sql = (
+            f"SELECT rowid, {', '.join(self.columns)} FROM {self.table} WHERE {where} "
+            f"ORDER BY rowid {'ASC' if ascending else 'DESC'} LIMIT ?"
+        )
+        rows = conn.execute(sql, (*args, self.page_size + 1)).fetchall()
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if forward:
+            return rows, cursor is not None, more
+        return list(reversed(rows)), more, True
+
+    def callback(self, forward, cursor, filter_key):
+        return f"pg:{self.key}:{'n' if forward else 'p'}:{'' if cursor is None else cursor}:{filter_key}"
+
+    def markup(self, rows, has_prev, has_next, filter_key):
+        keyboard = []
+        nav = []
+        if has_prev and rows:
+            nav.append(InlineKeyboardButton("◀️ Prev", callback_data=self.callback(False, rows[0][0], filter_key)))
+        if has_next and rows:
+            nav.append(InlineKeyboardButton("Next ▶️", callback_data=self.callback(True, rows[-1][0], filter_key)))
+        if nav:
+            keyboard.append(nav)
+        if len(self.filters) > 1:
+            keyboard.append([
+                InlineKeyboardButton(("• " if key == filter_key else "") + key, callback_data=self.callback(True, None, key))
+                for key in self.filters
+            ])
+        keyboard.extend(self.extra_buttons)
+        keyboard.append([InlineKeyboardButton("◀️ Back", callback_data=self.back_data)])
+        return InlineKeyboardMarkup(keyboard)
+
+    async def show(self, query, conn, cursor=None, forward=True, filter_key="all", header=""):
+        rows, has_prev, has_next = self.fetch(conn, cursor, forward, filter_key)
+        label = "" if filter_key == "all" else f" [{filter_key}]"
+        title = self.title() if callable(self.title) else self.title
+        text = f"{title}{label}\n\n{header}"
+        if rows:
+            text += "\n".join(self.render_row(row) for row in rows)
+        else:
+            text += self.empty_text
+        await query.edit_message_text(text[:4000], reply_markup=self.markup(rows, has_prev, has_next, filter_key))
+
+def parse_page_callback(rest):
+    """Split the part after 'pg:' into (key, forward, cursor, filter_key)"""
+    key, direction, cursor, filter_key = rest.split(":", 3)
+    return key, direction == "n", int(cursor) if cursor else None, filter_key or "all"
@@ -0,0 +1,316 @@
+# replay.py - Replay recorded WhatsApp traffic through the real pipeline and compare two builds
+# Usage: python replay.py run recordings/wa-console-20251120-090000.jsonl.gz --speed 10 --out head.json
+#        python replay.py run <recording> --build /tmp/empire-base --out base.json   (git worktree of the other build)
+#        python replay.py compare base.json head.json
+import argparse
+import asyncio
+import gzip
+import hashlib
+import importlib.util
+import inspect
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+logger = logging.getLogger("Replay")
+
+# Modules imported from the build under test; everything else the harness needs comes from ROOT
+BUILD_MODULES = ("storage", "brain", "wa_engine")
+
+def load_harness_module(name):
+    """Import one of this checkout's modules under a private name, so it never stands in for the build's"""
+    spec = importlib.util.spec_from_file_location(f"_replay_{name}", ROOT / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+traffic = load_harness_module("traffic")
+llm_standin = load_harness_module("llm_standin")
+
+class BaileysStandin:
+    """Answers the Baileys HTTP calls WAEngine makes and keeps every reply it was asked to send"""
+    def __init__(self, send_delay=0.05):
+        self.send_delay = send_delay
+        self.sent = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass
+
+            def _reply(self, obj):
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/messages"):
+                    self._reply([])
+                else:
+                    self._reply({"clients": [], "messagesInQueue": 0})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if standin.send_delay:
+                    time.sleep(standin.send_delay)
+                with standin._lock:
+                    standin.sent.append((payload.get("jid"), payload.get("message")))
+                self._reply({"success": True})
+
+        return Handler
+
+    def replies_digest(self):
+        """Order-independent across senders, ordered within each conversation"""
+        by_jid = {}
+        for jid, message in self.sent:
+            by_jid.setdefault(jid, []).append(message or "")
+        digest = hashlib.sha256()
+        for jid in sorted(by_jid, key=str):
+            digest.update(json.dumps([jid, by_jid[jid]], ensure_ascii=False).encode("utf-8"))
+        return digest.hexdigest()
+
+def percentile(ordered, q):
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] if ordered else 0.0
+
+def summarize(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    return {
+        "p50": percentile(ordered, 0.5), "p95": percentile(ordered, 0.95), "p99": percentile(ordered, 0.99),
+        "max": ordered[-1], "mean": sum(ordered) / len(ordered),
+    }
+
+def git_commit(build):
+    try:
+        return subprocess.run(["git", "-C", str(build), "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, timeout=10).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+def prepare_workdir(build, db):
+    """Scratch directory holding the build's JSON config and an optional starting database"""
+    work = Path(tempfile.mkdtemp(prefix="empire-replay-"))
+    for path in build.glob("*.json"):
+        if not path.name.startswith("package"):
+            shutil.copy(path, work / path.name)
+    if db:
+        if db.endswith(".gz"):
+            with gzip.open(db, "rb") as src, open(work / "empire.db", "wb") as out:
+                shutil.copyfileobj(src, out, 1 << 20)
+        else:
+            shutil.copy(db, work / "empire.db")
+    return work
+
+def use_build(build):
+    """Put `build` alone on sys.path for its modules; fail if it lacks one the replay needs"""
+    missing = [name for name in BUILD_MODULES if not (build / f"{name}.py").exists()]
+    if missing:
+        raise SystemExit(f"{build} is missing {', '.join(m + '.py' for m in missing)}; is it an EMPIRE checkout?")
+    # Without this, a module the older build lacks would quietly import from this checkout
+    sys.path[:] = [str(build)] + [p for p in sys.path if p and Path(p).resolve() != ROOT]
+
+def make_engine(WAEngine, brain, storage, build):
+    """WAEngine as the build constructs it; the scheduler argument arrived with the job scheduler"""
+    if "scheduler" not in inspect.signature(WAEngine.__init__).parameters:
+        return WAEngine(brain, storage)
+    if not (build / "scheduler.py").exists():
+        raise SystemExit(f"{build}: WAEngine takes a scheduler but scheduler.py is missing")
+    from scheduler import Scheduler
+    return WAEngine(brain, storage, Scheduler())
+
+async def replay(args, build, messages):
+    llm = llm_standin.serve(llm_standin.StandinConfig(args.ttft, args.token_delay, jitter=0.0), port=0)
+    baileys = BaileysStandin(args.send_delay)
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{llm.server_address[1]}/v1"
+    os.environ["GROQ_KEY"] = ""
+    random.seed(args.seed)
+
+    # Imported only now so they come from --build, not necessarily this checkout
+    from storage import Storage
+    from brain import GroqBrain
+    from wa_engine import WAEngine
+
+    storage = Storage()
+    if hasattr(storage, "warm_up"):
+        # Async since the off-loop inventory reload; older builds warm up synchronously
+        result = storage.warm_up()
+        if inspect.isawaitable(result):
+            await result
+    brain = GroqBrain("", storage)
+    wa = make_engine(WAEngine, brain, storage, build)
+    wa.baileys_url = baileys.url
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latency = [None] * len(messages)
+    service = [None] * len(messages)
+
+    async def handle(i, msg, arrival):
+        async with semaphore:
+            started = loop.time()
+            await wa.process_message(msg, None, None)
+            done = loop.time()
+        service[i] = done - started
+        latency[i] = done - arrival
+
+    tasks = []
+    start = loop.time()
+    for i, msg in enumerate(messages):
+        due = start + (msg["t"] / args.speed if args.speed else 0.0)
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(handle(i, msg, due)))
+    await asyncio.gather(*tasks)
+    wall = loop.time() - start
+
+    if hasattr(storage, "flush_actions"):
+        storage.flush_actions()
+    storage.conn.close()
+    llm.shutdown()
+    baileys.server.shutdown()
+
+    return {
+        "meta": {
+            "build": str(build),
+            "commit": git_commit(build),
+            "recording": os.path.abspath(args.recording),
+            "messages": len(messages),
+            "speed": args.speed,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "ttft": args.ttft,
+            "token_delay": args.token_delay,
+            "send_delay": args.send_delay,
+            "db": args.db,
+        },
+        "summary": {
+            "wall_seconds": wall,
+            "throughput": len(messages) / wall if wall else 0.0,
+            "latency": summarize(latency),
+            "service": summarize(service),
+            "sends": len(baileys.sent),
+            "fallbacks": getattr(brain, "fallback_count", None),
+            "replies_sha256": baileys.replies_digest(),
+        },
+        "latency": [round(x, 6) for x in latency],
+    }
+
+def print_summary(result):
+    meta, summary = result["meta"], result["summary"]
+    lat, svc = summary["latency"], summary["service"]
+    print(f"Build {meta['commit']} ({meta['build']}): {meta['messages']} messages at "
+          f"{'max' if not meta['speed'] else str(meta['speed']) + 'x'} speed, concurrency {meta['concurrency']}")
+    print(f"Wall {summary['wall_seconds']:.2f}s, throughput {summary['throughput']:.2f} msg/s, "
+          f"{summary['sends']} replies sent, fallbacks {summary['fallbacks']}")
+    print(f"Latency (arrival->reply): p50={lat['p50']:.3f}s p95={lat['p95']:.3f}s p99={lat['p99']:.3f}s max={lat['max']:.3f}s")
+    print(f"Service (processing only): p50={svc['p50']:.3f}s p95={svc['p95']:.3f}s p99={svc['p99']:.3f}s")
+
+def run(args):
+    build = Path(args.build).resolve()
+    header, messages = traffic.read_recording(args.recording)
+    if args.limit:
+        messages = messages[:args.limit]
+    if not messages:
+        raise SystemExit(f"{args.recording} has no messages")
+    work = prepare_workdir(build, args.db)
+    use_build(build)
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        result = asyncio.run(replay(args, build, messages))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+    result["meta"]["recorded_at"] = header.get("started_at")
+    print_summary(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    same = ("recording", "messages", "speed", "concurrency", "seed", "ttft", "token_delay", "send_delay", "db")
+    differing = [k for k in same if base["meta"].get(k) != head["meta"].get(k)]
+    if differing:
+        print(f"⚠️  Runs are not comparable, settings differ: {', '.join(differing)}")
+
+    rows = [("throughput msg/s", ("throughput",), True)]
+    for group in ("latency", "service"):
+        for q in ("p50", "p95", "p99", "max", "mean"):
+            rows.append((f"{group} {q} (s)", (group, q), False))
+
+    print(f"{'':22} {base['meta']['commit']:>12} {head['meta']['commit']:>12} {'delta':>9}")
+    for label, path, higher_is_better in rows:
+        a, b = base["summary"], head["summary"]
+        for key in path:
+            a, b = a[key], b[key]
+        delta = (b - a) / a if a else 0.0
+        better = (delta > 0) == higher_is_better
+        mark = "" if abs(delta) < 0.05 else ("  better" if better else "  WORSE")
+        print(f"{label:22} {a:12.4f} {b:12.4f} {delta:+9.1%}{mark}")
+
+    if base["summary"]["replies_sha256"] != head["summary"]["replies_sha256"]:
+        print("Replies differ between builds (behaviour changed, not just speed)")
+    else:
+        print("Replies identical")
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s | %(levelname)s | %(message)s")
+    parser = argparse.ArgumentParser(description="Deterministic replay of recorded WhatsApp traffic")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="replay a recording through one build")
+    p.add_argument("recording", help="file written with WA_RECORD_DIR set")
+    p.add_argument("--build", default=str(ROOT), help="checkout to import storage/brain/wa_engine from")
+    p.add_argument("--db", help="starting database (.db or a backup.py .db.gz snapshot); empty if omitted")
+    p.add_argument("--speed", type=float, default=1.0, help="time compression, 0 = all messages at once")
+    p.add_argument("--concurrency", type=int, default=1, help="messages processed at once (1 = one poller)")
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--ttft", type=float, default=0.3, help="LLM stand-in time to first token")
+    p.add_argument("--token-delay", type=float, default=0.01)
+    p.add_argument("--send-delay", type=float, default=0.05, help="Baileys stand-in /send latency")
+    p.add_argument("--out", help="write results JSON here for compare")
+    p.add_argument("-v", "--verbose", action="store_true")
+
+    c = sub.add_parser("compare", help="latency/throughput deltas between two run results")
+    c.add_argument("base")
+    c.add_argument("head")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        if args.verbose:
+            logging.getLogger().setLevel(logging.INFO)
+        run(args)
+    else:
+        compare(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# retrieval.py - On-disk BM25 index over inventory for LLM prompt grounding
+import asyncio
+import math
+import logging
+import sqlite3
+import threading
+from collections import Counter
+
+from inventory import tokenize
+
+logger = logging.getLogger("Retrieval")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def doc_signature(row):
+    part, price, stock, vehicle, year = row
+    return f"{part}|{vehicle}|{year}"
+
+def doc_terms(row):
+    part, price, stock, vehicle, year = row
+    return tokenize(f"{part} {vehicle} {year}")
+
+class InventoryRetriever:
+    """BM25 ranking over inventory rows, stored in the search_docs/search_postings tables.
+
+    With `db_path` set, asearch() runs in a worker thread on that thread's
+    own read-only connection, so scoring never holds the event loop.
+    """
+    def __init__(self, conn, stats_conn=None, db_path=None):
+        self.conn = conn
+        self.db_path = db_path
+        self._local = threading.local()
+        self.load_stats(stats_conn)
+
+    def load_stats(self, conn=None):
+        count, avg_len = (conn or self.conn).execute("SELECT COUNT(*), AVG(length) FROM search_docs").fetchone()
+        self.doc_count = count or 0
+        self.avg_len = avg_len or 0.0
+
+    def sync(self, rows, conn=None):
+        """Incrementally bring the index in line with the given inventory rows.
+
+        Pass the worker thread's own connection when running off the loop;
+        the diff and writes then never touch the loop's connection.
+        """
+        conn = conn or self.conn
+        existing = {
+            r[1]: (r[0], r[2], r[3])
+            for r in conn.execute("SELECT doc_id, signature, price, stock FROM search_docs")
+        }
+        wanted = {}
+        for row in rows:
+            wanted[doc_signature(row)] = tuple(row)
+
+        removed = [existing[sig][0] for sig in existing.keys() - wanted.keys()]
+        added = [wanted[sig] for sig in wanted.keys() - existing.keys()]
+        updated = [
+            (row[1], row[2], existing[sig][0])
+            for sig, row in wanted.items()
+            if sig in existing and (existing[sig][1], existing[sig][2]) != (row[1], row[2])
+        ]
+
+        if removed:
+            marks = ",".join("?" * len(removed))
+            conn.execute(f"DELETE FROM search_postings WHERE doc_id IN ({marks})", removed)
+            conn.execute(f"DELETE FROM search_docs WHERE doc_id IN ({marks})", removed)
+        for row in added:
+            terms = Counter(doc_terms(row))
+            cursor = conn.execute(
+                "INSERT INTO search_docs (signature, part, price, stock, vehicle, year, length) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (doc_signature(row), row[0], row[1], row[2], row[3], row[4], sum(terms.values()))
+            )
+            conn.executemany(
+                "INSERT INTO search_postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                [(term, cursor.lastrowid, tf) for term, tf in terms.items()]
+            )
+        if updated:
+            conn.executemany("UPDATE search_docs SET price=?, stock=? WHERE doc_id=?", updated)
+        conn.commit()
+
+        self.load_stats(conn)
+        if removed or added or updated:
+            logger.info(f"Search index synced: +{len(added)} -{len(removed)} ~{len(updated)} ({self.doc_count} docs)")
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=10.0)
+            conn.execute("PRAGMA query_only=1")
+        return conn
+
+    async def asearch(self, text, k=5):
+        """search() off the event loop; inline when there is no database file to open"""
+        if self.db_path is None:
+            return self.search(text, k)
+        return await asyncio.to_thread(lambda: self.search(text, k, self._reader()))
+
+    def search(self, text, k=5, conn=None):
+        """Top-k (score, part, price, stock, vehicle, year) rows for a customer message"""
+        terms = set(tokenize(text))
+        if not terms or not self.doc_count:
+            return []
+        conn = conn or self.conn
+        marks = ",".join("?" * len(terms))
+        postings = conn.execute(
+            f"SELECT p.term, p.doc_id, p.tf, d.length FROM search_postings p "
+            f"JOIN search_docs d ON d.doc_id = p.doc_id WHERE p.term IN ({marks})",
+            tuple(terms)
+        ).fetchall()
+
+        df = Counter(p[0] for p in postings)
+        scores = {}
+        for term, doc_id, tf, length in postings:
+            idf = math.log(1 + (self.doc_count - df[term] + 0.5) / (df[term] + 0.5))
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / (self.avg_len or 1))
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+        top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        if not top:
+            return []
+        ids = [doc_id for doc_id, _ in top]
+        rows = {
+            r[0]: tuple(r[1:])
+            for r in conn.execute(
+                f"SELECT doc_id, part, price, stock, vehicle, year FROM search_docs WHERE doc_id IN ({','.join('?' * len(ids))})",
+                ids
+            )
+        }
+        return [(score, *rows[doc_id]) for doc_id, score in top if doc_id in rows]
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for prompt budgeting"""
+    return len(text) // 4 + 1
+
+def format_catalog(hits):
+    """Compact one-line-per-part catalog block for prompt injection"""
+    return "\n".join(
+        f"{part}|{vehicle} {year}|KES {price:,.0f}|{'stock ' + str(stock) if stock > 0 else 'out'}"
+        for _, part, price, stock, vehicle, year in hits
+    )
@@ -0,0 +1,112 @@
+# router.py - Callback query routing registry with per-handler latency instrumentation
+import time
+import logging
+from collections import deque
+
+import metrics
+
+logger = logging.getLogger("Router")
+
+CALLBACK_SECONDS = metrics.histogram("telegram_callback_seconds", "Callback query handler latency", ["route"])
+CALLBACK_ERRORS = metrics.counter("telegram_callback_errors_total", "Callback query handlers that raised", ["route"])
+
+class HandlerStats:
+    """Call/error counts plus a window of sampled latencies for one route"""
+    def __init__(self, name, window=200):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds, sample):
+        self.calls += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if sample:
+            self.samples.append(seconds)
+
+    def p95(self):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[int((len(ordered) - 1) * 0.95)]
+
+    @property
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+class CallbackRouter:
+    """Maps callback_data to handlers by exact match or longest prefix.
+
+    Exact handlers are called as handler(query); prefix handlers as
+    handler(query, rest) where rest is callback_data with the prefix removed.
+    """
+    def __init__(self, sample_every=1, slow_threshold=1.0):
+        self.exact_routes = {}
+        self.prefix_routes = []
+        self.stats = {}
+        self.sample_every = max(int(sample_every), 1)
+        self.slow_threshold = slow_threshold
+
+    def exact(self, data, handler):
+        if data in self.exact_routes:
+            logger.warning(f"Route '{data}' registered twice, replacing")
+        self.exact_routes[data] = handler
+        self.stats.setdefault(data, HandlerStats(data))
+
+    def prefix(self, prefix, handler):
+        self.prefix_routes.append((prefix, handler))
+        self.prefix_routes.sort(key=lambda route: len(route[0]), reverse=True)
+        self.stats.setdefault(prefix + "*", HandlerStats(prefix + "*"))
+
+    def resolve(self, data):
+        """(route_name, handler, args) for callback_data, or None"""
+        handler = self.exact_routes.get(data)
+        if handler:
+            return data, handler, ()
+        for prefix, handler in self.prefix_routes:
+            if data.startswith(prefix):
+                return prefix + "*", handler, (data[len(prefix):],)
+        return None
+
+    async def dispatch(self, query):
+        """Run the handler for query.data; returns False when no route matches"""
+        resolved = self.resolve(query.data)
+        if resolved is None:
+            return False
+        name, handler, args = resolved
+        stats = self.stats[name]
+        start = time.perf_counter()
+        try:
+            await handler(query, *args)
+        except Exception:
+            stats.errors += 1
+            CALLBACK_ERRORS.labels(name).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.observe(elapsed, stats.calls % self.sample_every == 0)
+            CALLBACK_SECONDS.labels(name).observe(elapsed)
+            if elapsed > self.slow_threshold:
+                logger.warning(f"Slow callback handler '{name}': {elapsed:.2f}s")
+        return True
+
+    def slowest(self, n=10):
+        called = [s for s in self.stats.values() if s.calls]
+        return sorted(called, key=lambda s: s.p95(), reverse=True)[:n]
+
+    def report(self, n=10):
+        """Text table of the slowest handlers by p95 latency"""
+        rows = self.slowest(n)
+        if not rows:
+            return "No callback handlers called yet."
+        lines = ["route | calls | err | mean | p95 | max"]
+        for s in rows:
+            lines.append(
+                f"{s.name} | {s.calls} | {s.errors} | {s.mean * 1000:.0f}ms | "
+                f"{s.p95() * 1000:.0f}ms | {s.max * 1000:.0f}ms"
+            )
+        return "\n".join(lines)
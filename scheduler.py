@@ -0,0 +1,285 @@
+# scheduler.py - Supervised background job scheduler (periodic, cron-like and long-running jobs)
+import asyncio
+import inspect
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+logger = logging.getLogger("Scheduler")
+
+def _parse_cron_field(field, low, high):
+    """Expand one cron field ('*', '*/5', '1,15', '9-17', '0-30/10') into a set of ints"""
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+        else:
+            start = end = int(part)
+        if start < low or end > high:
+            raise ValueError(f"Cron value out of range {low}-{high}: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSpec:
+    """Minimal 5-field cron expression: minute hour day-of-month month day-of-week (0=Sunday)"""
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expr}")
+        self.expr = expr
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12)
+        self.weekdays = _parse_cron_field(fields[4], 0, 6)
+        # Vixie cron: with both day fields restricted, either one matching is enough
+        self.days_restricted = not fields[2].startswith("*")
+        self.weekdays_restricted = not fields[4].startswith("*")
+
+    def matches_day(self, t):
+        if t.month not in self.months:
+            return False
+        day_ok = t.day in self.days
+        weekday_ok = (t.isoweekday() % 7) in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, now):
+        """First matching minute strictly after now (local time)"""
+        t = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366)
+        while t < limit:
+            if not self.matches_day(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"Cron expression never fires: {self.expr}")
+
+class Job:
+    """A named unit of background work plus its run history"""
+    def __init__(self, name, func, kind, interval=None, cron=None, jitter=0.0,
+                 max_concurrency=1, restart=True, backoff=5.0, run_immediately=False):
+        self.name = name
+        self.func = func
+        self.kind = kind                      # 'interval', 'cron', 'service' or 'oneshot'
+        self.interval = interval
+        self.cron = CronSpec(cron) if cron else None
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.restart = restart
+        self.backoff = backoff
+        self.run_immediately = run_immediately
+        self.paused = False
+        self.running = 0
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_start = None
+        self.last_duration = None
+        self.last_error = None
+        self.next_run = None
+
+    def next_delay(self):
+        if self.cron:
+            delay = (self.cron.next_after(datetime.now()) - datetime.now()).total_seconds()
+        else:
+            delay = self.interval
+        return max(delay + random.uniform(0, self.jitter), 0)
+
+    def schedule_text(self):
+        if self.kind == "interval":
+            return f"every {self.interval:g}s"
+        if self.kind == "cron":
+            return f"cron '{self.cron.expr}'"
+        return self.kind
+
+class Scheduler:
+    """Owns every background task so failures are logged, restarted and visible in Telegram"""
+    def __init__(self):
+        self.jobs = {}
+        self._loops = {}
+        self._inflight = set()
+        self._started = False
+        self._stopping = False
+
+    def every(self, name, seconds, func, jitter=0.0, max_concurrency=1, run_immediately=False):
+        """Run func every `seconds` (+ up to `jitter` seconds of random delay)"""
+        return self._add(Job(name, func, "interval", interval=seconds, jitter=jitter,
+                             max_concurrency=max_concurrency, run_immediately=run_immediately))
+
+    def cron(self, name, expr, func, jitter=0.0, max_concurrency=1):
+        """Run func whenever the 5-field cron expression matches (local time)"""
+        return self._add(Job(name, func, "cron", cron=expr, jitter=jitter, max_concurrency=max_concurrency))
+
+    def service(self, name, func, restart=True, backoff=5.0):
+        """Long-running coroutine (poll loops etc.), restarted with backoff if it raises"""
+        return self._add(Job(name, func, "service", restart=restart, backoff=backoff))
+
+    def spawn(self, name, func):
+        """Run func once in the background, tracked like any other job; returns False if already running"""
+        job = self.jobs.get(name)
+        if job is None:
+            job = Job(name, func, "oneshot")
+            self.jobs[name] = job
+        job.func = func
+        if job.running >= job.max_concurrency:
+            job.skipped += 1
+            return False
+        self._launch(job)
+        return True
+
+    def _add(self, job):
+        if job.name in self.jobs:
+            self.cancel(job.name)
+        self.jobs[job.name] = job
+        if self._started:
+            self._start_loop(job)
+        return job
+
+    async def start(self):
+        self._started = True
+        for job in self.jobs.values():
+            if job.kind != "oneshot" and job.name not in self._loops:
+                self._start_loop(job)
+        logger.info(f"Scheduler started with {len(self._loops)} jobs")
+
+    def _start_loop(self, job):
+        runner = self._run_service if job.kind == "service" else self._run_periodic
+        self._loops[job.name] = asyncio.create_task(runner(job), name=f"job:{job.name}")
+
+    def cancel(self, name):
+        task = self._loops.pop(name, None)
+        if task:
+            task.cancel()
+
+    def pause(self, name):
+        self.jobs[name].paused = True
+
+    def resume(self, name):
+        self.jobs[name].paused = False
+
+    async def _run_periodic(self, job):
+        first = True
+        while not self._stopping:
+            delay = 0 if (first and job.run_immediately) else job.next_delay()
+            first = False
+            job.next_run = time.time() + delay
+            await asyncio.sleep(delay)
+            if job.paused:
+                continue
+            if job.running >= job.max_concurrency:
+                job.skipped += 1
+                logger.warning(f"Job {job.name} still running, skipping this run")
+                continue
+            self._launch(job)
+
+    async def _run_service(self, job):
+        while not self._stopping:
+            if job.paused:
+                await asyncio.sleep(1)
+                continue
+            ok = await self._execute(job)
+            if ok or not job.restart or self._stopping:
+                return
+            logger.warning(f"Service {job.name} crashed, restarting in {job.backoff:g}s")
+            job.next_run = time.time() + job.backoff
+            await asyncio.sleep(job.backoff)
+
+    def _launch(self, job):
+        task = asyncio.create_task(self._execute(job), name=f"run:{job.name}")
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, job):
+        job.running += 1
+        job.last_start = time.time()
+        start = time.perf_counter()
+        try:
+            result = job.func()
+            if inspect.isawaitable(result):
+                await result
+            job.last_error = None
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.failures += 1
+            job.last_error = f"{type(e).__name__}: {e}"
+            logger.error(f"Job {job.name} failed: {e}", exc_info=True)
+            return False
+        finally:
+            job.running -= 1
+            job.runs += 1
+            job.last_duration = time.perf_counter() - start
+
+    async def shutdown(self, timeout=10.0):
+        """Cancel all loops and give in-flight runs `timeout` seconds to finish"""
+        self._stopping = True
+        loops = list(self._loops.values())
+        for task in loops:
+            task.cancel()
+        await asyncio.gather(*loops, return_exceptions=True)
+        self._loops.clear()
+        if self._inflight:
+            done, pending = await asyncio.wait(set(self._inflight), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.info("Scheduler stopped")
+
+    def report(self):
+        lines = []
+        for job in self.jobs.values():
+            if job.paused:
+                state = "⏸️"
+            elif job.running:
+                state = "🔄"
+            elif job.last_error:
+                state = "❌"
+            else:
+                state = "🟢"
+            last = datetime.fromtimestamp(job.last_start).strftime('%H:%M:%S') if job.last_start else "never"
+            duration = f"{job.last_duration:.2f}s" if job.last_duration is not None else "-"
+            lines.append(f"{state} {job.name} ({job.schedule_text()})")
+            lines.append(f"   last {last} took {duration} | runs {job.runs} | fails {job.failures} | skipped {job.skipped}")
+            if job.next_run and job.kind in ("interval", "cron"):
+                lines.append(f"   next {datetime.fromtimestamp(job.next_run).strftime('%H:%M:%S')}")
+            if job.last_error:
+                lines.append(f"   error: {job.last_error[:80]}")
+        return "\n".join(lines) or "No background jobs registered."
+
+    async def show_menu(self, query):
+        keyboard = []
+        for job in self.jobs.values():
+            if job.kind in ("interval", "cron"):
+                label = f"▶️ Resume {job.name}" if job.paused else f"⏸️ Pause {job.name}"
+                keyboard.append([InlineKeyboardButton(label, callback_data=f"job_toggle:{job.name}"[:64])])
+        keyboard.append([InlineKeyboardButton("🔄 Refresh", callback_data="jobs_menu")])
+        keyboard.append([InlineKeyboardButton("◀️ Back to Settings", callback_data="settings_menu")])
+        await query.edit_message_text(f"⏱️ BACKGROUND JOBS\n\n{self.report()}", reply_markup=InlineKeyboardMarkup(keyboard))
+
+    async def on_toggle(self, query, name):
+        job = self.jobs.get(name)
+        if job:
+            job.paused = not job.paused
+            await query.answer(f"{name} {'paused' if job.paused else 'resumed'}")
+        await self.show_menu(query)
+
+    def register_routes(self, router):
+        """Register this module's callback handlers with the CallbackRouter"""
+        router.exact("jobs_menu", self.show_menu)
+        router.prefix("job_toggle:", self.on_toggle)
@@ -0,0 +1,23 @@
+# startup.py - Startup phase timing report
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger("Startup")
+
+started_at = time.perf_counter()
+phases = []
+
+@contextmanager
+def phase(name):
+    """Time one startup phase; results are kept in `phases` for the report"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases.append((name, time.perf_counter() - start))
+
+def report():
+    lines = [f"{name}: {seconds * 1000:.0f}ms" for name, seconds in phases]
+    lines.append(f"Total since startup module import: {(time.perf_counter() - started_at) * 1000:.0f}ms")
+    return "\n".join(lines)
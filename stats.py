@@ -0,0 +1,70 @@
+# stats.py - In-memory dashboard counters served to every Telegram menu
+import time
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger("Stats")
+
+def utc_today():
+    """Same calendar day SQLite's date('now') uses for seen.timestamp"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+class StatsSnapshot:
+    """Dashboard counters loaded once from SQLite and updated incrementally on writes"""
+    def __init__(self, conn):
+        self.conn = conn
+        self.refresh()
+
+    def refresh(self):
+        """Reload every counter from the database (startup and periodic reconciliation)"""
+        self.inventory_parts = self.conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+        self.seen_total, self.seen_replied = self.conn.execute(
+            "SELECT COUNT(*), COUNT(CASE WHEN replied=1 THEN 1 END) FROM seen"
+        ).fetchone()
+        self.day = utc_today()
+        self.today_total, self.today_replied = self.conn.execute(
+            "SELECT COUNT(*), COUNT(CASE WHEN replied=1 THEN 1 END) FROM seen WHERE date(timestamp) = ?",
+            (self.day,)
+        ).fetchone()
+        self.refreshed_at = self.updated_at = time.time()
+
+    def _roll_day(self):
+        today = utc_today()
+        if today != self.day:
+            self.day = today
+            self.today_total = self.today_replied = 0
+
+    def on_inventory_replaced(self, parts_count):
+        self.inventory_parts = parts_count
+        self.updated_at = time.time()
+
+    def on_seen(self, replied=True):
+        self._roll_day()
+        self.seen_total += 1
+        self.today_total += 1
+        if replied:
+            self.seen_replied += 1
+            self.today_replied += 1
+        self.updated_at = time.time()
+
+    @property
+    def leads_today(self):
+        self._roll_day()
+        return self.today_total
+
+    @property
+    def replied_today(self):
+        self._roll_day()
+        return self.today_replied
+
+    def staleness_text(self):
+        """Footer line telling the owner how fresh the numbers are"""
+        age = int(time.time() - self.updated_at)
+        if age < 60:
+            ago = f"{age}s ago"
+        elif age < 3600:
+            ago = f"{age // 60}m ago"
+        else:
+            ago = f"{age // 3600}h ago"
+        synced = datetime.fromtimestamp(self.refreshed_at).strftime('%H:%M')
+        return f"🕒 Stats updated {ago} (DB sync {synced})"
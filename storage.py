@@ -1,20 +1,51 @@
 # storage.py - EXPANDED SCHEMA - NOV 20 2025
+import asyncio
+import time
 import sqlite3
 import json
-from pathlib import Path
-import pandas as pd
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 import io
 import logging
 
+from inventory import InventoryIndex
+from retrieval import InventoryRetriever
+from stats import StatsSnapshot
+from pagination import KeysetPager, parse_page_callback
+from config_store import ConfigStore
+from analytics import SalesAnalytics, install_rollups, upgrade_week_keys
+from inventory_history import InventoryHistory, install_history, record_import
+from metrics import TimedConnection
+
 logger = logging.getLogger("Storage")
 
 class Storage:
     def __init__(self):
-        self.conn = sqlite3.connect("empire.db", check_same_thread=False)
+        self.db_path = "empire.db"
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=TimedConnection)
         self.conn.row_factory = sqlite3.Row
+        # WAL lets the WhatsApp worker processes read and write while the console does
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=10000")
+
+        # Set to a JobQueue when WhatsApp runs in separate worker processes
+        self.jobs = None
+        # False in WhatsApp workers: they read the search index, the console writes it
+        self.maintain_search_index = True
+
+        # Audit rows buffered by queue_action and written in batches
+        self._pending_actions = []
+        self._flush_scheduled = False
+
+        # Built on first use (or by warm_up) so startup only pays for migrations
+        self._stats = None
+        self._inventory_index = None
+        self._retriever = None
+
+        # JSON config files (templates, groups, accounts, WA numbers), shared with CRUDHandlers
+        self.config = ConfigStore()
         
         # Run migrations
         self._run_migrations()
@@ -130,29 +161,277 @@ class Storage:
             self.conn.commit()
             logger.info("Migration 2 complete")
 
+        # Migration 3: BM25 search index over inventory
+        if current_version < 3:
+            logger.info("Running migration 3: Inventory search index")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_docs (
+                    doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    signature TEXT UNIQUE,
+                    part TEXT,
+                    price REAL,
+                    stock INTEGER,
+                    vehicle TEXT,
+                    year TEXT,
+                    length INTEGER
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_postings (
+                    term TEXT,
+                    doc_id INTEGER,
+                    tf INTEGER,
+                    PRIMARY KEY (term, doc_id)
+                ) WITHOUT ROWID
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_doc ON search_postings(doc_id)")
+            self.conn.execute("INSERT INTO schema_meta (version) VALUES (3)")
+            self.conn.commit()
+
+        # Migration 4: Daily rollup of old automation logs
+        if current_version < 4:
+            logger.info("Running migration 4: Automation log rollups")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS automation_log_daily (
+                    day TEXT,
+                    source TEXT,
+                    action TEXT,
+                    count INTEGER,
+                    PRIMARY KEY (day, source, action)
+                )
+            """)
+            self.conn.execute("INSERT INTO schema_meta (version) VALUES (4)")
+            self.conn.commit()
+
+        # Migration 5: Indexes backing the keyset-paginated browse filters
+        if current_version < 5:
+            logger.info("Running migration 5: Browse filter indexes")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_inventory_stock ON inventory(stock)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_quality ON seen(lead_quality)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_timestamp ON seen(timestamp)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_status ON conversations(status)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_method ON sales(payment_method)")
+            self.conn.execute("INSERT INTO schema_meta (version) VALUES (5)")
+            self.conn.commit()
+
+        # Migration 6: Trigger-maintained sales/conversion rollups
+        if current_version < 6:
+            logger.info("Running migration 6: Sales analytics rollups")
+            install_rollups(self.conn)
+            self.conn.execute("INSERT INTO schema_meta (version) VALUES (6)")
+            self.conn.commit()
+
+        # Migration 7: Cross-process job queue and worker heartbeats
+        if current_version < 7:
+            logger.info("Running migration 7: Job queue")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    queue TEXT,
+                    kind TEXT,
+                    payload_json TEXT,
+                    status TEXT DEFAULT 'pending',
+                    attempts INTEGER DEFAULT 0,
+                    claimed_by TEXT,
+                    created_at TEXT DEFAULT (datetime('now')),
+                    claimed_at TEXT,
+                    finished_at TEXT,
+                    error TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(queue, status, id)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS workers (
+                    worker_id TEXT PRIMARY KEY,
+                    role TEXT,
+                    pid INTEGER,
+                    last_seen TEXT,
+                    info_json TEXT
+                )
+            """)
+            self.conn.execute("INSERT INTO schema_meta (version) VALUES (7)")
+            self.conn.commit()
+
+        # Migration 8: Delta-encoded inventory price/stock history
+        if current_version < 8:
+            logger.info("Running migration 8: Inventory history")
+            install_history(self.conn)
+            self.conn.execute("INSERT INTO schema_meta (version) VALUES (8)")
+            self.conn.commit()
+
+        # Migration 9: ISO 8601 week keys in sales_weekly
+        if current_version < 9:
+            logger.info("Running migration 9: ISO week keys for weekly sales")
+            upgrade_week_keys(self.conn)
+            self.conn.execute("INSERT INTO schema_meta (version) VALUES (9)")
+            self.conn.commit()
+
         # Auto-create templates with perfect 8/8/4 ratio
-        self.fb_templates = self.load_or_create("fb_templates.json", self.default_fb_templates())
-        self.wa_templates = self.load_or_create("wa_templates.json", self.default_wa_templates())
+        self.load_or_create("fb_templates.json", self.default_fb_templates())
+        self.load_or_create("wa_templates.json", self.default_wa_templates())
+        for filename in ("fb_templates.json", "wa_templates.json", "accounts.json", "groups.json", "wa_numbers.json"):
+            self.config.subscribe(filename, lambda data, filename=filename: self.on_config_changed(filename, data))
+
+        self.pagers = self._build_pagers()
+        self.analytics = SalesAnalytics(self.conn)
+        self.history = InventoryHistory(self.conn)
+
+    def _build_pagers(self):
+        quality_emoji = {"hot": "🔥", "warm": "🟡"}
+        pagers = [
+            KeysetPager(
+                "inv", lambda: f"📦 INVENTORY ({self.stats.inventory_parts} parts)", "inventory",
+                ["part", "price", "stock", "vehicle", "year"],
+                lambda r: f"🔧 {r[1]}\n   KES {r[2]:,.0f} | Stock: {r[3]} | {r[4]} {r[5]}",
+                "db_menu",
+                filters={"out": ("stock = 0", ())},
+                empty_text="No parts loaded. Upload a CSV file to add inventory.\n\nRequired columns: part, price, stock, vehicle, year",
+                extra_buttons=[[InlineKeyboardButton("📤 Upload New CSV", callback_data="upload_csv")]]
+            ),
+            KeysetPager(
+                "lead", "📊 LEADS", "seen",
+                ["timestamp", "lead_quality", "text"],
+                lambda r: f"{quality_emoji.get(r[2], '❄️')} {(r[1] or '')[:16]}\n   {(r[3] or '')[:60]}",
+                "leads_menu",
+                filters={
+                    "today": ("timestamp >= date('now')", ()),
+                    "hot": ("lead_quality = ?", ("hot",)),
+                    "warm": ("lead_quality = ?", ("warm",)),
+                    "cold": ("lead_quality = ?", ("cold",)),
+                },
+                newest_first=True,
+                empty_text="No leads captured yet. Keep hunting! 🎯",
+                extra_buttons=[[InlineKeyboardButton("📥 Export CSV", callback_data="leads_export")]]
+            ),
+            KeysetPager(
+                "conv", "💬 CONVERSATIONS", "conversations",
+                ["platform", "lead_id", "thread_ref", "last_message", "status", "updated_at"],
+                lambda r: f"{'🟢' if r[5] == 'active' else '⚪'} {r[2]} via {r[3] or '-'} ({(r[6] or '')[:16]})\n   {(r[4] or '')[:60]}",
+                "leads_menu",
+                filters={"active": ("status = ?", ("active",))},
+                newest_first=True,
+                empty_text="No conversations recorded yet."
+            ),
+            KeysetPager(
+                "sale", "💰 SALES", "sales",
+                ["amount", "currency", "parts", "payment_method", "mpesa_ref", "closed_at"],
+                # amount is nullable (record_sale doesn't require one); show a dash instead of failing the page
+                lambda r: f"{r[2] or 'KES'} {'—' if r[1] is None else f'{r[1]:,.0f}'} | {r[4] or '-'} {r[5] or ''}\n   {(r[3] or '')[:50]} ({(r[6] or '')[:16]})",
+                "leads_menu",
+                filters={
+                    "mpesa": ("payment_method = ?", ("mpesa",)),
+                    "bank": ("payment_method = ?", ("bank",)),
+                    "cash": ("payment_method = ?", ("cash",)),
+                },
+                newest_first=True,
+                empty_text="No sales recorded yet."
+            ),
+        ]
+        return {pager.key: pager for pager in pagers}
+
+    async def show_page(self, query, rest):
+        """Callback handler for pg:<key>:<dir>:<cursor>:<filter> navigation"""
+        key, forward, cursor, filter_key = parse_page_callback(rest)
+        pager = self.pagers.get(key)
+        if pager is None:
+            await query.answer("Unknown list")
+            return
+        await pager.show(query, self.conn, cursor, forward, filter_key)
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            self._stats = StatsSnapshot(self.conn)
+        return self._stats
+
+    @property
+    def inventory_index(self):
+        if self._inventory_index is None:
+            self.refresh_inventory_index()
+        return self._inventory_index
 
-        self.fb_accounts = self.load_json("fb_accounts.json")
-        self.groups = self.load_json("groups.json")
-        self.wa_numbers = self.load_json("wa_numbers.json")
+    @property
+    def retriever(self):
+        if self._retriever is None:
+            self.refresh_inventory_index()
+        return self._retriever
+
+    async def warm_up(self):
+        """Build the deferred subsystems ahead of the first request that needs them"""
+        self.stats
+        if self._inventory_index is None:
+            await self.reload_inventory()
+            if self.maintain_search_index and self.jobs:
+                # Workers may have started before the index was synced; have them reload its stats
+                try:
+                    self.jobs.broadcast("wa", "reload_inventory")
+                except Exception as e:
+                    logger.error(f"Worker reload broadcast after warm-up failed: {e}")
+
+    def refresh_inventory_index(self):
+        """Rebuild the in-memory inventory snapshot and search index in the calling thread (blocking)"""
+        self._swap_inventory(*self._load_inventory_snapshot())
+
+    async def reload_inventory(self):
+        """Build a new inventory snapshot and sync the search index in a worker thread, then swap on the loop"""
+        start = time.perf_counter()
+        index, retriever = await asyncio.to_thread(self._load_inventory_snapshot)
+        self._swap_inventory(index, retriever)
+        logger.info(f"Inventory snapshot rebuilt off-loop in {time.perf_counter() - start:.2f}s")
+
+    def _load_inventory_snapshot(self):
+        # Own connection: the worker thread must not share a cursor with the loop
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        try:
+            index = InventoryIndex.from_connection(conn)
+            retriever = self._retriever or InventoryRetriever(self.conn, conn, db_path=self.db_path)
+            if self.maintain_search_index:
+                retriever.sync(index, conn)
+            else:
+                retriever.load_stats(conn)
+            return index, retriever
+        finally:
+            conn.close()
+
+    def _swap_inventory(self, index, retriever):
+        self._inventory_index = index
+        self._retriever = retriever
+        logger.info(f"Inventory snapshot: {len(index)} parts")
 
     def load_json(self, filename):
-        path = Path(filename)
-        if path.exists():
-            return json.loads(path.read_text(encoding="utf-8"))
-        return []
+        return self.config.get(filename, [])
 
     def load_or_create(self, filename, default_list):
-        path = Path(filename)
-        if path.exists():
-            data = json.loads(path.read_text(encoding="utf-8"))
-            return data.get("templates", default_list)
-        else:
+        data = self.config.get(filename)
+        if data is None:
             data = {"templates": default_list}
-            path.write_text(json.dumps(data, indent=4, ensure_ascii=False), encoding="utf-8")
-            return default_list
+            self.config.save(filename, data, indent=4)
+        return data.get("templates", default_list)
+
+    @property
+    def fb_templates(self):
+        return self.config.get("fb_templates.json", {}).get("templates", [])
+
+    @property
+    def wa_templates(self):
+        return self.config.get("wa_templates.json", {}).get("templates", [])
+
+    @property
+    def fb_accounts(self):
+        return self.load_json("accounts.json")
+
+    @property
+    def groups(self):
+        return self.load_json("groups.json")
+
+    @property
+    def wa_numbers(self):
+        return self.load_json("wa_numbers.json")
+
+    def on_config_changed(self, filename, data):
+        entries = len(data.get("templates", [])) if isinstance(data, dict) else len(data)
+        logger.info(f"Config {filename} updated: {entries} entries")
+        self.queue_action('storage', 'config_changed', {'file': filename, 'entries': entries})
 
     def default_fb_templates(self):
         return [
@@ -218,6 +497,7 @@ class Storage:
         
         path = "uploaded_inventory.csv"
         await file.download_to_drive(path)
+        import pandas as pd
         
         try:
             df = pd.read_csv(path)
@@ -251,20 +531,9 @@ class Storage:
                         )
                     )
                 
+                import_id, changed, removed = record_import(self.conn, filename)
                 self.conn.commit()
-                cursor.execute("DROP TABLE IF EXISTS inventory_backup")
                 logger.info(f"Inventory update committed successfully: {len(records)} parts")
-                
-                await self.log_action('storage', 'uploaded_csv', {
-                    'filename': filename,
-                    'parts_count': len(records),
-                    'status': 'success'
-                })
-                await update.message.reply_text(
-                    f"✅ INVENTORY UPDATED\n\n"
-                    f"Loaded {len(records)} parts from {filename}\n\n"
-                    f"All inventory replaced successfully."
-                )
             
             except Exception as e:
                 logger.error(f"Error during inventory update, rolling back: {e}", exc_info=True)
@@ -274,10 +543,54 @@ class Storage:
                     cursor.execute("INSERT INTO inventory SELECT * FROM inventory_backup")
                     cursor.execute("DROP TABLE IF EXISTS inventory_backup")
                     self.conn.commit()
+                    self.stats.refresh()
                     logger.info("Rollback successful, inventory restored from backup")
                 except Exception as rollback_err:
                     logger.error(f"Rollback failed: {rollback_err}")
                 raise
+
+            # The import is committed: failures from here on leave a stale snapshot, never a lost import
+            try:
+                cursor.execute("DROP TABLE IF EXISTS inventory_backup")
+            except Exception as e:
+                logger.warning(f"Could not drop inventory_backup: {e}")
+            reload_error = None
+            try:
+                self.stats.on_inventory_replaced(len(records))
+                await self.reload_inventory()
+            except Exception as e:
+                reload_error = e
+                logger.error(f"Inventory imported but snapshot reload failed: {e}", exc_info=True)
+            if self.jobs:
+                try:
+                    self.jobs.broadcast("wa", "reload_inventory")
+                except Exception as e:
+                    reload_error = reload_error or e
+                    logger.error(f"Inventory imported but worker reload broadcast failed: {e}", exc_info=True)
+
+            await self.log_action('storage', 'uploaded_csv', {
+                'filename': filename,
+                'parts_count': len(records),
+                'import_id': import_id,
+                'changed': changed,
+                'removed': removed,
+                'status': 'success' if reload_error is None else 'imported_reload_failed'
+            })
+            if reload_error is None:
+                await update.message.reply_text(
+                    f"✅ INVENTORY UPDATED\n\n"
+                    f"Loaded {len(records)} parts from {filename}\n"
+                    f"Price/stock changes: {changed}, removed: {removed}\n\n"
+                    f"All inventory replaced successfully."
+                )
+            else:
+                await update.message.reply_text(
+                    f"⚠️ INVENTORY IMPORTED, RELOAD FAILED\n\n"
+                    f"Saved {len(records)} parts from {filename}\n"
+                    f"Price/stock changes: {changed}, removed: {removed}\n\n"
+                    f"The bot is still answering from the previous stock list: {str(reload_error)[:100]}\n"
+                    f"It will pick up the new one on the next restart or upload."
+                )
                 
         except pd.errors.EmptyDataError:
             await self.log_action('storage', 'csv_upload_failed', {
@@ -332,21 +645,24 @@ class Storage:
 
     async def show_leads_menu(self, query):
         keyboard = [
-            [InlineKeyboardButton("📅 Today's Leads", callback_data="leads_today")],
+            [InlineKeyboardButton("📅 Today's Leads", callback_data="leads_today"),
+             InlineKeyboardButton("📋 All Leads", callback_data="pg:lead:n::all")],
+            [InlineKeyboardButton("💬 Conversations", callback_data="pg:conv:n::all"),
+             InlineKeyboardButton("💰 Sales", callback_data="pg:sale:n::all")],
+            [InlineKeyboardButton("📈 Sales Reports", callback_data="reports_menu")],
             [InlineKeyboardButton("📥 Export All CSV", callback_data="leads_export")],
             [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        total_seen = self.conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
-        total_replied = self.conn.execute("SELECT COUNT(*) FROM seen WHERE replied=1").fetchone()[0]
-        today_count = self.conn.execute("SELECT COUNT(*) FROM seen WHERE date(timestamp) = date('now')").fetchone()[0]
+        stats = self.stats
         
         text = (
             f"📊 LEADS & ANALYTICS\n\n"
-            f"Today: {today_count} leads\n"
-            f"All Time: {total_seen} seen\n"
-            f"Replied: {total_replied}\n"
-            f"Pending: {total_seen - total_replied}"
+            f"Today: {stats.leads_today} leads\n"
+            f"All Time: {stats.seen_total} seen\n"
+            f"Replied: {stats.seen_replied}\n"
+            f"Pending: {stats.seen_total - stats.seen_replied}\n\n"
+            f"{stats.staleness_text()}"
         )
         await query.edit_message_text(text, reply_markup=reply_markup)
 
@@ -357,13 +673,13 @@ class Storage:
             [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        inventory_count = self.conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
         
         text = (
             f"📁 DATABASE MANAGER\n\n"
-            f"Inventory Parts: {inventory_count}\n"
+            f"Inventory Parts: {self.stats.inventory_parts}\n"
             f"Tables: 7 (seen, inventory, conversations, sales, accounts_health, automation_logs, schema_meta)\n\n"
-            "Manage your inventory and data"
+            "Manage your inventory and data\n\n"
+            f"{self.stats.staleness_text()}"
         )
         await query.edit_message_text(text, reply_markup=reply_markup)
 
@@ -387,8 +703,6 @@ class Storage:
         await query.edit_message_text(text, reply_markup=reply_markup)
     
     async def show_fb_groups_menu(self, query):
-        self.reload_groups()
-        
         keyboard = [
             [InlineKeyboardButton("➕ Add Group", callback_data="fb_groups_add"),
              InlineKeyboardButton("📋 List Groups", callback_data="fb_groups_list")],
@@ -413,19 +727,10 @@ class Storage:
         
         await query.edit_message_text(text, reply_markup=reply_markup)
     
-    def reload_groups(self):
-        """Reload groups from groups.json to ensure fresh data"""
-        try:
-            with open('groups.json', 'r') as f:
-                self.groups = json.load(f)
-        except Exception as e:
-            logger.error(f"Failed to reload groups: {e}")
-            if not hasattr(self, 'groups') or self.groups is None:
-                self.groups = []
-
     async def show_settings_menu(self, query):
         keyboard = [
             [InlineKeyboardButton("🧠 Groq API", callback_data="settings_groq")],
+            [InlineKeyboardButton("⏱️ Background Jobs", callback_data="jobs_menu")],
             [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")],
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -447,7 +752,7 @@ class Storage:
         return result is not None
 
     def mark_seen(self, post_id, group, text, lead_quality='warm'):
-        self.conn.execute(
+        cursor = self.conn.execute(
             "INSERT OR IGNORE INTO seen (post_id, group_url, text, replied, lead_quality, engagement_score) VALUES (?, ?, ?, 1, ?, 0.5)", 
             (post_id, group, text, lead_quality)
         )
@@ -456,17 +761,17 @@ class Storage:
             ('fb_engine', 'replied_to_post', json.dumps({'post_id': post_id, 'group': group}))
         )
         self.conn.commit()
+        if cursor.rowcount == 1:
+            self.stats.on_seen(replied=True)
 
     async def show_leads_today(self, query):
         await self.log_action('storage', 'view_leads_today', {})
-        today = datetime.now().strftime('%Y-%m-%d')
-        cursor = self.conn.execute(
-            "SELECT post_id, group_url, text, lead_quality, timestamp FROM seen WHERE date(timestamp) = date(?)",
-            (today,)
-        )
-        leads = cursor.fetchall()
+        counts = dict(self.conn.execute(
+            "SELECT lead_quality, COUNT(*) FROM seen WHERE timestamp >= date('now') GROUP BY lead_quality"
+        ).fetchall())
+        total = sum(counts.values())
         
-        if not leads:
+        if not total:
             keyboard = [[InlineKeyboardButton("◀️ Back to Leads", callback_data="leads_menu")]]
             await query.edit_message_text(
                 "📅 NO LEADS TODAY\n\n"
@@ -476,82 +781,91 @@ class Storage:
             )
             return
         
-        hot = sum(1 for l in leads if l[3] == 'hot')
-        warm = sum(1 for l in leads if l[3] == 'warm')
-        cold = sum(1 for l in leads if l[3] == 'cold')
-        
-        text = f"📅 TODAY'S LEADS ({len(leads)})\n\n"
-        text += f"🔥 Hot: {hot} | 🟡 Warm: {warm} | ❄️ Cold: {cold}\n\n"
-        
-        for i, lead in enumerate(leads[:5], 1):
-            quality_emoji = "🔥" if lead[3] == "hot" else "🟡" if lead[3] == "warm" else "❄️"
-            text += f"{i}. {quality_emoji} {lead[4][:16]}\n"
-            text += f"   {lead[2][:50]}...\n\n"
-        
-        if len(leads) > 5:
-            text += f"+ {len(leads) - 5} more leads (export for full list)\n"
-        
-        keyboard = [
-            [InlineKeyboardButton("📥 Export CSV", callback_data="leads_export")],
-            [InlineKeyboardButton("◀️ Back to Leads", callback_data="leads_menu")]
-        ]
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+        header = (
+            f"📅 Today: {total}\n"
+            f"🔥 Hot: {counts.get('hot', 0)} | 🟡 Warm: {counts.get('warm', 0)} | ❄️ Cold: {counts.get('cold', 0)}\n\n"
+        )
+        await self.pagers["lead"].show(query, self.conn, filter_key="today", header=header)
     
     async def export_leads_csv(self, query, bot):
         await self.log_action('storage', 'export_leads_csv', {})
-        cursor = self.conn.execute(
+        leads = self.conn.execute(
             "SELECT post_id, group_url, text, replied, timestamp, engagement_score, lead_quality FROM seen"
+        ).fetchall()
+        await self.send_csv(
+            query, bot, leads,
+            ['post_id', 'group_url', 'text', 'replied', 'timestamp', 'engagement_score', 'lead_quality'],
+            "leads_export", f"Leads Export: {len(leads)} total leads"
         )
-        leads = cursor.fetchall()
-        
-        df = pd.DataFrame(leads, columns=['post_id', 'group_url', 'text', 'replied', 'timestamp', 'engagement_score', 'lead_quality'])
+        await query.answer("CSV exported and sent!")
+
+    async def send_csv(self, query, bot, rows, columns, name, caption):
+        """Send rows to the chat as a timestamped CSV document"""
+        import pandas as pd
+        df = pd.DataFrame([tuple(row) for row in rows], columns=columns)
         
         csv_buffer = io.StringIO()
         df.to_csv(csv_buffer, index=False)
         csv_buffer.seek(0)
         
         csv_bytes = io.BytesIO(csv_buffer.getvalue().encode('utf-8'))
-        csv_bytes.name = f"leads_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        csv_bytes.name = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         
         await bot.send_document(
             chat_id=query.message.chat_id,
             document=csv_bytes,
             filename=csv_bytes.name,
-            caption=f"Leads Export: {len(leads)} total leads"
+            caption=caption
         )
-        await query.answer("CSV exported and sent!")
-    
-    async def show_inventory(self, query):
-        await self.log_action('storage', 'view_inventory', {})
-        cursor = self.conn.execute("SELECT part, price, stock, vehicle, year FROM inventory LIMIT 15")
-        items = cursor.fetchall()
-        
-        total = self.conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
-        
-        if not items:
-            keyboard = [[InlineKeyboardButton("📤 Upload CSV", callback_data="upload_csv")],
-                        [InlineKeyboardButton("◀️ Back", callback_data="db_menu")]]
-            await query.edit_message_text(
-                "📦 NO INVENTORY\n\n"
-                "No parts loaded. Upload a CSV file to add inventory.\n\n"
-                "Required columns: part, price, stock, vehicle, year",
-                reply_markup=InlineKeyboardMarkup(keyboard)
+
+    def record_conversation(self, platform, lead_id, thread_ref, message):
+        """Upsert the active conversation for (platform, lead, thread) with the latest message"""
+        row = self.conn.execute(
+            "SELECT id FROM conversations WHERE lead_id = ? AND platform = ? AND thread_ref = ? ORDER BY id DESC LIMIT 1",
+            (lead_id, platform, thread_ref)
+        ).fetchone()
+        if row:
+            self.conn.execute(
+                "UPDATE conversations SET last_message = ?, status = 'active', updated_at = datetime('now') WHERE id = ?",
+                (message[:500], row[0])
             )
-            return
-        
-        text = f"📦 INVENTORY ({total} parts)\n\nShowing first 15:\n\n"
-        for i, item in enumerate(items, 1):
-            text += f"{i}. 🔧 {item[0]}\n"
-            text += f"   KES {item[1]:,.0f} | Stock: {item[2]} | {item[3]} {item[4]}\n\n"
-        
-        if total > 15:
-            text += f"+ {total - 15} more parts in database"
-        
+        else:
+            self.conn.execute(
+                "INSERT INTO conversations (platform, lead_id, thread_ref, last_message) VALUES (?, ?, ?, ?)",
+                (platform, lead_id, thread_ref, message[:500])
+            )
+        self.conn.commit()
+
+    def record_sale(self, lead_id, amount, payment_method, parts, mpesa_ref=None, currency="KES"):
+        """Insert a closed sale; the analytics rollups are updated by trigger in the same transaction"""
+        cursor = self.conn.execute(
+            "INSERT INTO sales (lead_id, amount, currency, parts, payment_method, mpesa_ref) VALUES (?, ?, ?, ?, ?, ?)",
+            (lead_id, amount, currency, parts, payment_method.lower(), mpesa_ref)
+        )
+        self.conn.commit()
+        self.queue_action('storage', 'sale_recorded', {'lead_id': lead_id, 'amount': amount, 'method': payment_method})
+        return cursor.lastrowid
+
+    async def show_reports_menu(self, query):
+        await self.log_action('storage', 'view_reports', {})
         keyboard = [
-            [InlineKeyboardButton("📤 Upload New CSV", callback_data="upload_csv")],
-            [InlineKeyboardButton("◀️ Back to Database", callback_data="db_menu")]
+            [InlineKeyboardButton("🔄 Refresh", callback_data="reports_menu"),
+             InlineKeyboardButton("📥 Export CSV", callback_data="reports_export")],
+            [InlineKeyboardButton("💰 Sales List", callback_data="pg:sale:n::all")],
+            [InlineKeyboardButton("◀️ Back to Leads", callback_data="leads_menu")],
         ]
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+        text = f"📈 SALES REPORTS\n\n{self.analytics.report_text()}"
+        await query.edit_message_text(text[:4000], reply_markup=InlineKeyboardMarkup(keyboard))
+
+    async def export_reports_csv(self, query, bot):
+        await self.log_action('storage', 'export_reports_csv', {})
+        for name, columns, rows in self.analytics.export_tables():
+            await self.send_csv(query, bot, rows, columns, name, f"Report: {name} ({len(rows)} rows)")
+        await query.answer("Reports exported and sent!")
+    
+    async def show_inventory(self, query):
+        await self.log_action('storage', 'view_inventory', {})
+        await self.pagers["inv"].show(query, self.conn)
     
     async def prompt_csv_upload(self, query):
         keyboard = [[InlineKeyboardButton("◀️ Back to Database", callback_data="db_menu")]]
@@ -592,9 +906,68 @@ class Storage:
         await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
     
     async def log_action(self, source, action, payload):
-        self.conn.execute(
-            "INSERT INTO automation_logs (source, action, payload_json) VALUES (?, ?, ?)",
-            (source, action, json.dumps(payload))
-        )
+        self.queue_action(source, action, payload)
+
+    def queue_action(self, source, action, payload):
+        """Buffer an audit log row; rows are written in one batch shortly after the caller returns"""
+        self._pending_actions.append((source, action, json.dumps(payload)))
+        if self._flush_scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_actions()
+            return
+        self._flush_scheduled = True
+        loop.call_later(0.5, self.flush_actions)
+
+    def flush_actions(self):
+        """Write all buffered audit rows in a single transaction"""
+        self._flush_scheduled = False
+        if not self._pending_actions:
+            return
+        batch, self._pending_actions = self._pending_actions, []
+        try:
+            self.conn.executemany(
+                "INSERT INTO automation_logs (source, action, payload_json) VALUES (?, ?, ?)",
+                batch
+            )
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} audit log rows: {e}")
+
+    def rollup_logs(self, keep_days=30):
+        """Fold automation_logs older than keep_days into daily per-action counts"""
+        cutoff = f"-{int(keep_days)} days"
+        self.conn.execute("""
+            INSERT INTO automation_log_daily (day, source, action, count)
+            SELECT date(created_at), source, action, COUNT(*) FROM automation_logs
+            WHERE created_at < datetime('now', ?)
+            GROUP BY date(created_at), source, action
+            ON CONFLICT(day, source, action) DO UPDATE SET count = count + excluded.count
+        """, (cutoff,))
+        deleted = self.conn.execute(
+            "DELETE FROM automation_logs WHERE created_at < datetime('now', ?)", (cutoff,)
+        ).rowcount
         self.conn.commit()
+        logger.info(f"Rolled up {deleted} automation log rows older than {keep_days} days")
+        return deleted
+
+    def register_routes(self, router):
+        """Register this module's callback handlers with the CallbackRouter"""
+        router.exact("fb_groups_menu", self.show_fb_groups_menu)
+        router.exact("templates_menu", self.show_templates_menu)
+        router.exact("leads_menu", self.show_leads_menu)
+        router.exact("db_menu", self.show_db_menu)
+        router.exact("fb_accounts", self.show_fb_accounts_menu)
+        router.exact("settings_menu", self.show_settings_menu)
+        router.exact("leads_today", self.show_leads_today)
+        router.exact("leads_export", lambda query: self.export_leads_csv(query, query.get_bot()))
+        router.exact("reports_menu", self.show_reports_menu)
+        router.exact("reports_export", lambda query: self.export_reports_csv(query, query.get_bot()))
+        router.exact("upload_csv", self.prompt_csv_upload)
+        router.exact("view_inventory", self.show_inventory)
+        router.exact("edit_fb", lambda query: self.show_edit_templates(query, "fb"))
+        router.exact("edit_wa", lambda query: self.show_edit_templates(query, "wa"))
+        router.prefix("pg:", self.show_page)
 
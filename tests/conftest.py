@@ -0,0 +1,5 @@
+# tests/conftest.py - Import the flat top-level modules from the repo root, as bench/ does
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,35 @@
+# Startup budgets from bench/import_time.py, with wide margins so a busy CI box doesn't flake;
+# the bench script keeps the tight budgets for local measurement.
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("telegram")
+
+BENCH = Path(__file__).resolve().parent.parent / "bench" / "import_time.py"
+spec = importlib.util.spec_from_file_location("bench_import_time", BENCH)
+import_time = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(import_time)
+
+FIRST_BOOT_BUDGET = 5.0
+RESTART_BUDGET = 3.0
+FIRST_USE_BUDGET = 10.0
+
+@pytest.fixture(scope="module")
+def workdir(tmp_path_factory):
+    return tmp_path_factory.mktemp("import-time")
+
+def test_first_boot_and_restart_stay_within_budget(workdir):
+    # Same directory: the first run creates empire.db and migrates, the second is a restart
+    for budget in (FIRST_BOOT_BUDGET, RESTART_BUDGET):
+        seconds, loaded, _, _ = import_time.measure_startup(workdir)
+        assert not loaded, f"heavy modules imported eagerly: {loaded}"
+        assert seconds < budget
+
+@pytest.mark.parametrize("name", sorted(import_time.LAZY_MODULES))
+def test_first_use_of_lazy_module_stays_within_budget(name, workdir):
+    seconds = import_time.measure_first_use(import_time.LAZY_MODULES[name], workdir)
+    if seconds is None:
+        pytest.skip(f"{name} not installed")
+    assert seconds < FIRST_USE_BUDGET
@@ -0,0 +1,25 @@
+from inventory import InventoryIndex, answer_from_inventory, extract_intent
+
+ROWS = [
+    ("Brake Pads", 4500, 6, "Toyota Vitz", "2008-2014"),
+    ("Shock Absorbers", 9500, 4, "Toyota Fielder", "2007-2012"),
+    ("Headlight Assembly", 12500, 2, "Mazda Demio", "2008-2014"),
+    ("Oil Filter", 850, 40, "Toyota Vitz", "2005-2018"),
+    ("Air Filter", 1200, 10, "Toyota Vitz", "2005-2018"),
+]
+
+def test_short_part_names_match_the_stock_list_name():
+    index = InventoryIndex(ROWS)
+    assert extract_intent("Niko na Vitz 2010, pads za mbele ni how much?", index)["part"] == "brake pads"
+    assert extract_intent("shocks za fielder ziko?", index)["part"] == "shock absorbers"
+    assert extract_intent("Headlight ya demio bei gani", index)["part"] == "headlight assembly"
+    assert extract_intent("Headlamp ya demio iko?", index)["part"] == "headlight assembly"
+
+def test_ambiguous_short_name_defers_to_the_llm():
+    index = InventoryIndex(ROWS)
+    assert extract_intent("filter ya vitz bei gani", index)["part"] is None
+    assert answer_from_inventory("filter ya vitz bei gani", index) is None
+
+def test_short_name_is_answered_locally():
+    reply = answer_from_inventory("shocks za fielder ziko?", InventoryIndex(ROWS))
+    assert "Shock Absorbers" in reply and "9,500" in reply
@@ -0,0 +1,22 @@
+import sqlite3
+
+from inventory_history import InventoryHistory, install_history, record_import
+
+def load(conn, rows, filename):
+    conn.execute("DELETE FROM inventory")
+    conn.executemany("INSERT INTO inventory VALUES (?, ?, ?, ?, ?)", rows)
+    record_import(conn, filename)
+    conn.commit()
+
+def test_trend_matches_vehicle_substring():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE inventory (part TEXT, price REAL, stock INTEGER, vehicle TEXT, year TEXT)")
+    install_history(conn)
+    load(conn, [("Brake pads", 4500, 6, "Toyota Vitz", "2012"), ("Brake pads", 5200, 3, "Subaru Forester", "2010")], "a.csv")
+    load(conn, [("Brake pads", 4800, 6, "Toyota Vitz", "2012"), ("Brake pads", 5200, 3, "Subaru Forester", "2010")], "b.csv")
+
+    history = InventoryHistory(conn)
+    rows = history.trend("Brake pads", "vitz")
+    assert [(r[0], r[3]) for r in rows] == [("Toyota Vitz", 4500), ("Toyota Vitz", 4800)]
+    assert "Toyota Vitz" in history.trend_text("Brake pads", "Vitz")
+    assert "Forester" not in history.trend_text("Brake pads", "Vitz")
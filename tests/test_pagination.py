@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from storage import Storage
+
+class FakeQuery:
+    def __init__(self):
+        self.text = None
+
+    async def edit_message_text(self, text, reply_markup=None):
+        self.text = text
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    s = Storage()
+    yield s
+    s.conn.close()
+
+def test_sales_page_renders_null_amount(storage):
+    storage.record_sale("254700000001", 18500, "mpesa", "Clutch kit Vitz", mpesa_ref="QWE12RTY")
+    storage.conn.execute("INSERT INTO sales (lead_id, amount, currency, parts, payment_method) VALUES (?, NULL, NULL, ?, ?)",
+                         ("254700000002", "Brake pads", "cash"))
+    storage.conn.commit()
+
+    query = FakeQuery()
+    asyncio.run(storage.pagers["sale"].show(query, storage.conn))
+    assert "KES 18,500 | mpesa QWE12RTY" in query.text
+    assert "KES — | cash" in query.text
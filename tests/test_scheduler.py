@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from scheduler import CronSpec
+
+def test_restricted_day_of_month_and_weekday_fire_on_either():
+    spec = CronSpec("0 3 15 * 1")  # the 15th of the month, and every Monday
+    # 2025-11-10 is a Monday: the 15th (a Saturday) comes first, then Monday the 17th
+    assert spec.next_after(datetime(2025, 11, 10, 12, 0)) == datetime(2025, 11, 15, 3, 0)
+    assert spec.next_after(datetime(2025, 11, 15, 12, 0)) == datetime(2025, 11, 17, 3, 0)
+
+def test_wildcard_day_field_keeps_the_other_restriction():
+    assert CronSpec("0 3 * * 1").next_after(datetime(2025, 11, 20, 12, 0)) == datetime(2025, 11, 24, 3, 0)
+    assert CronSpec("0 3 1 * *").next_after(datetime(2025, 11, 20, 12, 0)) == datetime(2025, 12, 1, 3, 0)
+    assert CronSpec("*/15 * * * *").next_after(datetime(2025, 11, 20, 12, 7)) == datetime(2025, 11, 20, 12, 15)
@@ -0,0 +1,135 @@
+# traffic.py - Opt-in recorder of inbound WhatsApp traffic, anonymized, for replay.py
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger("Traffic")
+
+FORMAT_VERSION = 1
+
+# Things a customer may type that identify them; names can't be caught this way
+PHONE_RE = re.compile(r"(?:\+?254|0)\s?[17]\d{2}\s?\d{3}\s?\d{3}\b")
+# M-Pesa receipt codes start with a letter; OEM part numbers (04465B1010) start with a digit and are kept
+MPESA_RE = re.compile(r"\b(?=[A-Z0-9]*\d)[A-Z][A-Z0-9]{9}\b")
+EMAIL_RE = re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b")
+URL_RE = re.compile(r"https?://\S+")
+
+class Anonymizer:
+    """Keyed pseudonyms: stable within one recording, unlinkable across recordings.
+
+    The key is random per recording and never written out, so senders can't
+    be recovered from the file, but the same customer keeps the same
+    pseudonym and conversations still group the way they did live.
+    """
+    def __init__(self, key=None):
+        self.key = key or secrets.token_bytes(32)
+
+    def _digest(self, kind, value):
+        return hmac.new(self.key, f"{kind}:{value}".encode("utf-8"), hashlib.sha256).digest()
+
+    def digits(self, kind, value, length):
+        number = int.from_bytes(self._digest(kind, value), "big")
+        return str(number)[-length:].zfill(length)
+
+    def sender(self, jid):
+        # Keep the JID shape (254XXXXXXXXX@s.whatsapp.net) so parsing code sees realistic input
+        user, _, domain = str(jid).partition("@")
+        fake = "2547" + self.digits("sender", user, 8)
+        return f"{fake}@{domain}" if domain else fake
+
+    def session(self, name):
+        return "s" + self._digest("session", name).hex()[:6]
+
+    def text(self, message):
+        message = URL_RE.sub("https://example.com/link", message)
+        message = EMAIL_RE.sub(lambda m: f"user{self.digits('email', m.group(), 4)}@example.com", message)
+        message = PHONE_RE.sub(lambda m: "07" + self.digits("phone", re.sub(r"\D", "", m.group())[-9:], 8), message)
+        message = MPESA_RE.sub(lambda m: "R" + self._digest("mpesa", m.group()).hex()[:9].upper(), message)
+        return message
+
+class TrafficRecorder:
+    """Appends one compact gzipped JSON line per inbound message.
+
+    The first line is a header; each message line is
+    {"t": seconds since start, "s": sender, "n": session, "m": text}.
+    Every record is sync-flushed, so a crash loses at most the message
+    being written and the file stays readable while recording.
+    """
+    def __init__(self, path, anonymize=True):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.anonymizer = Anonymizer() if anonymize else None
+        self.started = time.monotonic()
+        self.count = 0
+        self._file = gzip.open(self.path, "wt", encoding="utf-8", compresslevel=6)
+        self._write({
+            "version": FORMAT_VERSION,
+            "started_at": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+            "anonymized": anonymize,
+        })
+        logger.info(f"Recording WhatsApp traffic to {self.path}{' (anonymized)' if anonymize else ''}")
+
+    def _write(self, obj):
+        self._file.write(json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def record(self, msg):
+        sender = msg.get("from", "Unknown")
+        session = msg.get("sessionName", "default")
+        text = msg.get("message", "")
+        if self.anonymizer:
+            sender = self.anonymizer.sender(sender)
+            session = self.anonymizer.session(session)
+            text = self.anonymizer.text(text)
+        try:
+            self._write({"t": round(time.monotonic() - self.started, 3), "s": sender, "n": session, "m": text})
+            self.count += 1
+        except (OSError, ValueError) as e:
+            logger.error(f"Traffic recording failed, disabling: {e}")
+            self.close()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            logger.info(f"Recorded {self.count} messages to {self.path}")
+
+def recorder_from_env(worker_id="console"):
+    """TrafficRecorder when WA_RECORD_DIR is set, else None"""
+    directory = os.getenv("WA_RECORD_DIR")
+    if not directory:
+        return None
+    anonymize = os.getenv("WA_RECORD_RAW", "0") != "1"
+    name = f"wa-{worker_id}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+    return TrafficRecorder(Path(directory) / name, anonymize=anonymize)
+
+def read_recording(path):
+    """(header, messages) where each message is a dict in the shape the Baileys server returns"""
+    lines = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    lines.append(line)
+        except EOFError:
+            pass  # recorder was killed mid-write; everything sync-flushed before that is intact
+    if not lines:
+        raise ValueError(f"{path} is empty")
+    header = json.loads(lines[0])
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported recording version {header.get('version')}")
+    messages = []
+    for line in lines[1:]:
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            break  # torn last line from a crash
+        messages.append({"t": rec["t"], "from": rec["s"], "sessionName": rec["n"], "message": rec["m"]})
+    return header, messages
@@ -5,22 +5,64 @@ import subprocess
 import httpx
 import json
 import os
+import time
+from collections import deque
 from pathlib import Path
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from datetime import datetime
 
+import metrics
+
 logger = logging.getLogger("WAEngine")
 
+POLL_SECONDS = metrics.histogram("wa_poll_seconds", "One Baileys poll cycle including processing the batch")
+POLL_LAG = metrics.gauge("wa_poll_lag_seconds", "How late the last poll started versus its 5s schedule")
+QUEUE_DEPTH = metrics.gauge("wa_queue_depth", "Messages fetched but not yet processed")
+MESSAGE_SECONDS = metrics.histogram("wa_message_seconds", "Receive-to-reply time for one WhatsApp message")
+SENDS = metrics.counter("wa_sends_total", "WhatsApp send attempts by result", ["result"])
+SEND_OK = SENDS.labels("ok")
+SEND_FAILED = SENDS.labels("failed")
+STATUS_UPDATES = metrics.counter("wa_status_updates_total", "Session status cache updates by source", ["source"])
+STATUS_AGE = metrics.gauge("wa_status_age_seconds", "Age of the cached WhatsApp session status")
+
+# Fallback poll of Baileys /status; connection changes normally arrive sooner as [STATUS] lines
+STATUS_REFRESH_SECONDS = float(os.getenv("WA_STATUS_REFRESH", "15"))
+STATUS_PREFIX = "[STATUS] "
+
+# Baileys /messages returns the tail of a queue it never drains, so each poll sees
+# earlier messages again; remember this many recent keys to hand each one on once
+SEEN_MESSAGES = 1000
+
 class WAEngine:
-    def __init__(self, brain, storage):
+    def __init__(self, brain, storage, scheduler):
         self.brain = brain
         self.storage = storage
+        self.scheduler = scheduler
         self.active = False
         self.baileys_process = None
         self.baileys_url = "http://localhost:3000"
         self.sessions = {}
-        self.message_poll_task = None
         self.qr_callbacks = {}
+
+        # Worker deployment (launcher.py): the poller worker pushes incoming messages to
+        # `inbox` for any worker to answer; the console drives workers through `remote`
+        self.inbox = None
+        self.remote = None
+
+        # traffic.TrafficRecorder when WA_RECORD_DIR is set (input for replay.py)
+        self.recorder = None
+
+        # Keys of messages already handed on from Baileys (see message_key)
+        self._seen = set()
+        self._seen_order = deque()
+
+        # Session status as last pushed by baileys_client.js or fetched by refresh_status();
+        # menus render from here instead of calling /status
+        self.status_clients = {}
+        self.status_queue = 0
+        self.status_updated = None
+        self.status_source = None
+        STATUS_AGE.func = lambda: time.time() - self.status_updated if self.status_updated else float("nan")
         
     async def start_baileys_server(self):
         """Start the Baileys WhatsApp server with async subprocess management"""
@@ -42,7 +84,8 @@ class WAEngine:
                 start_new_session=True
             )
             
-            asyncio.create_task(self._drain_baileys_output())
+            self.scheduler.spawn("baileys_output", self._drain_baileys_output)
+            self.scheduler.every("wa_status_refresh", STATUS_REFRESH_SECONDS, self.refresh_status, run_immediately=True)
             
             await asyncio.sleep(5)
             
@@ -79,7 +122,9 @@ class WAEngine:
                         if not line:
                             break
                         decoded_line = line.decode('utf-8').strip()
-                        if decoded_line:
+                        if decoded_line.startswith(STATUS_PREFIX):
+                            self.apply_status_event(decoded_line[len(STATUS_PREFIX):])
+                        elif decoded_line:
                             logger.debug(f"Baileys {stream_name}: {decoded_line}")
                 except Exception as e:
                     logger.error(f"Error reading {stream_name}: {e}")
@@ -91,6 +136,8 @@ class WAEngine:
             )
         except Exception as e:
             logger.error(f"Error draining Baileys output: {e}")
+        # Output ends when the Node process exits: no session is connected any more
+        self._set_status({}, 0, "exit")
     
     async def stop_baileys_server(self):
         """Stop the Baileys WhatsApp server with async-safe process termination"""
@@ -109,16 +156,68 @@ class WAEngine:
                 self.baileys_process = None
                 logger.info("Baileys server stopped")
     
-    async def get_status(self):
-        """Get status of all WhatsApp sessions"""
+    def _set_status(self, clients, queue, source):
+        self.status_clients = clients
+        self.status_queue = queue
+        self.status_updated = time.time()
+        self.status_source = source
+        STATUS_UPDATES.labels(source).inc()
+
+    def apply_status_event(self, line):
+        """Apply one pushed connection event: {"session", "event", "status", "messagesInQueue"}"""
+        try:
+            event = json.loads(line)
+            clients = dict(self.status_clients)
+            if event.get("status"):
+                clients[event["session"]] = event["status"]
+            else:
+                clients.pop(event["session"], None)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Bad Baileys status line {line[:200]!r}: {e}")
+            return
+        self._set_status(clients, event.get("messagesInQueue", self.status_queue), "push")
+        logger.info(f"WhatsApp session {event['session']}: {event.get('event')}")
+
+    async def refresh_status(self):
+        """Fallback poll of /status; on failure the cache keeps its last value and just ages"""
         try:
             async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.baileys_url}/status", timeout=5.0)
-                if response.status_code == 200:
-                    return response.json()
+                response = await client.get(f"{self.baileys_url}/status", timeout=2.0)
+                response.raise_for_status()
+                data = response.json()
         except Exception as e:
-            logger.error(f"Failed to get Baileys status: {e}")
-        return {"clients": [], "messagesInQueue": 0}
+            logger.debug(f"Baileys status refresh failed: {e}")
+            return
+        clients = {c["name"]: c.get("status", {}) for c in data.get("clients", [])}
+        self._set_status(clients, data.get("messagesInQueue", 0), "poll")
+
+    def status_snapshot(self):
+        """Cache contents for the worker heartbeat, so the console can render it"""
+        return {
+            "clients": self.status_clients,
+            "queue": self.status_queue,
+            "updated": self.status_updated,
+            "source": self.status_source,
+        }
+
+    def get_status(self, workers=None):
+        """Cached session status: this process's, or the poller worker's from its heartbeat"""
+        if self.remote:
+            workers = self.remote.live_workers("wa") if workers is None else workers
+            for w in workers:
+                if w["info"].get("poller") and w["info"].get("status"):
+                    return w["info"]["status"]
+            return {"clients": {}, "queue": 0, "updated": None, "source": None}
+        return self.status_snapshot()
+
+    @staticmethod
+    def status_age_text(status):
+        if not status.get("updated"):
+            return "Status: not received yet"
+        age = max(time.time() - status["updated"], 0)
+        when = datetime.fromtimestamp(status["updated"]).strftime('%H:%M:%S')
+        stale = " ⚠️ stale" if age > STATUS_REFRESH_SECONDS * 3 else ""
+        return f"Status as of {when} ({age:.0f}s ago, {status.get('source')}){stale}"
     
     async def add_whatsapp_number(self, session_name, query=None, bot=None):
         """Add a new WhatsApp number and generate QR code with proper process management"""
@@ -307,24 +406,59 @@ class WAEngine:
     
     async def poll_messages(self, bot, owner_id):
         """Poll for new WhatsApp messages and process them"""
+        interval = 5
+        next_poll = time.perf_counter()
         while self.active:
+            started = time.perf_counter()
+            POLL_LAG.set(max(started - next_poll, 0.0))
             try:
                 async with httpx.AsyncClient() as client:
                     response = await client.get(f"{self.baileys_url}/messages?limit=10", timeout=5.0)
                     
                     if response.status_code == 200:
                         messages = response.json()
+                        QUEUE_DEPTH.set(len(messages))
                         
                         for msg in messages:
-                            await self.process_message(msg, bot, owner_id)
+                            if not self.mark_seen(msg):
+                                QUEUE_DEPTH.dec()
+                                continue
+                            if self.recorder:
+                                self.recorder.record(msg)
+                            if self.inbox:
+                                self.inbox.put("wa_inbox", "message", msg)
+                            else:
+                                await self.process_message(msg, bot, owner_id)
+                            QUEUE_DEPTH.dec()
                 
             except Exception as e:
                 logger.error(f"Error polling messages: {e}")
+            finally:
+                QUEUE_DEPTH.set(0)
+                POLL_SECONDS.observe(time.perf_counter() - started)
             
-            await asyncio.sleep(5)
+            next_poll = time.perf_counter() + interval
+            await asyncio.sleep(interval)
     
+    @staticmethod
+    def message_key(msg):
+        """WhatsApp message id, or (session, receivedAt, sender) if Baileys didn't give one"""
+        return msg.get("id") or (msg.get("sessionName"), msg.get("receivedAt"), msg.get("from"))
+
+    def mark_seen(self, msg):
+        """True the first time a polled message is seen, False for repeats"""
+        key = self.message_key(msg)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self._seen_order.append(key)
+        if len(self._seen_order) > SEEN_MESSAGES:
+            self._seen.discard(self._seen_order.popleft())
+        return True
+
     async def process_message(self, msg, bot, owner_id):
         """Process an incoming WhatsApp message"""
+        start = time.perf_counter()
         try:
             sender = msg.get('from', 'Unknown')
             message_text = msg.get('message', '')
@@ -337,6 +471,7 @@ class WAEngine:
                 'session': session_name,
                 'message': message_text[:100]
             })
+            self.storage.record_conversation('whatsapp', sender, session_name, message_text)
             
             reply = await self.brain.generate_response(
                 message_text,
@@ -350,6 +485,8 @@ class WAEngine:
             logger.info(f"Generated reply for WhatsApp: {reply[:50]}...")
             
             sent = await self.send_message(session_name, sender, reply)
+            (SEND_OK if sent else SEND_FAILED).inc()
+            MESSAGE_SECONDS.observe(time.perf_counter() - start)
             
             await self.storage.log_action('wa_engine', 'auto_reply', {
                 'to': sender,
@@ -362,9 +499,10 @@ class WAEngine:
 
     async def show_menu(self, query):
         """Show WhatsApp manager menu"""
-        status_data = await self.get_status()
-        num_clients = len(status_data.get('clients', []))
-        messages_in_queue = status_data.get('messagesInQueue', 0)
+        workers = self.remote.live_workers("wa") if self.remote else None
+        status_data = self.get_status(workers)
+        num_clients = sum(1 for c in status_data["clients"].values() if c.get("isConnected"))
+        messages_in_queue = status_data["queue"]
         
         toggle_text = "⏸️ Stop Service" if self.active else "▶️ Start Service"
         keyboard = [
@@ -376,7 +514,11 @@ class WAEngine:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         status_emoji = "🟢 ACTIVE" if self.active else "⚪ PAUSED"
-        baileys_status = "🟢 RUNNING" if self.baileys_process and self.baileys_process.returncode is None else "⚪ STOPPED"
+        if self.remote:
+            baileys_running = any(w["info"].get("baileys") for w in workers)
+        else:
+            baileys_running = self.baileys_process and self.baileys_process.returncode is None
+        baileys_status = "🟢 RUNNING" if baileys_running else "⚪ STOPPED"
         
         text = (
             f"💬 WHATSAPP MANAGER\n\n"
@@ -384,32 +526,66 @@ class WAEngine:
             f"Baileys Server: {baileys_status}\n"
             f"Connected Sessions: {num_clients}\n"
             f"Numbers Configured: {len(self.storage.wa_numbers)}\n"
-            f"Messages in Queue: {messages_in_queue}\n\n"
-            f"✨ Full Baileys integration active!\n"
-            f"Ready to scan QR codes and receive messages."
+            f"Messages in Queue: {messages_in_queue}\n"
+            f"{self.status_age_text(status_data)}\n\n"
         )
+        if self.remote:
+            text += f"⚙️ Worker processes: {len(workers)} live | inbox backlog {self.remote.depth('wa_inbox')}\n"
+            for w in workers:
+                role = "poller" if w["info"].get("poller") else "replier"
+                text += f"   {w['worker_id']} ({role}, pid {w['pid']}) seen {w['last_seen'][11:]} UTC\n"
+        else:
+            text += (
+                f"✨ Full Baileys integration active!\n"
+                f"Ready to scan QR codes and receive messages."
+            )
         await query.edit_message_text(text, reply_markup=reply_markup)
 
+    async def on_toggle(self, query):
+        status = await self.toggle()
+        await query.answer(f"WhatsApp service {status}!")
+        await self.show_menu(query)
+
+    async def show_add_wizard(self, query):
+        keyboard = [[InlineKeyboardButton("◀️ Cancel", callback_data="wa_menu")]]
+        await query.edit_message_text(
+            "📱 ADD WHATSAPP NUMBER\n\n"
+            "To add a WhatsApp number, use the command:\n"
+            "/add_wa_number\n\n"
+            "This will start a wizard that generates a QR code\n"
+            "for you to scan with WhatsApp.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+    def register_routes(self, router):
+        """Register this module's callback handlers with the CallbackRouter"""
+        router.exact("wa_menu", self.show_menu)
+        router.exact("wa_toggle", self.on_toggle)
+        router.exact("wa_list", self.list_numbers)
+        router.exact("wa_add_wizard", self.show_add_wizard)
+
     async def toggle(self):
         """Toggle WhatsApp service on/off"""
         self.active = not self.active
         status = "started" if self.active else "stopped"
         logger.info(f"WhatsApp service {status}")
         
-        if self.active:
-            await self.start_baileys_server()
+        if self.remote:
+            sent = self.remote.broadcast("wa", "set_active", {"active": self.active})
+            logger.info(f"Sent set_active={self.active} to {sent} WhatsApp workers")
+        elif self.active:
+            if await self.start_baileys_server() and getattr(self, 'bot', None):
+                self.start_polling()
         else:
-            if self.message_poll_task:
-                self.message_poll_task.cancel()
-                self.message_poll_task = None
+            self.scheduler.cancel("wa_poll")
         
         await self.storage.log_action('wa_engine', 'toggle_service', {'active': self.active})
         return status
     
     async def list_numbers(self, query):
         """List all configured WhatsApp numbers"""
-        status_data = await self.get_status()
-        connected_sessions = {client['name']: client['status'] for client in status_data.get('clients', [])}
+        status_data = self.get_status()
+        connected_sessions = status_data["clients"]
         
         if not self.storage.wa_numbers and not connected_sessions:
             keyboard = [
@@ -442,6 +618,7 @@ class WAEngine:
             text += "No active sessions.\n\n"
         
         text += f"\nConfigured in wa_numbers.json: {len(self.storage.wa_numbers)}"
+        text += f"\n{self.status_age_text(status_data)}"
         
         keyboard = [
             [InlineKeyboardButton("➕ Add Number", callback_data="wa_add_wizard")],
@@ -459,12 +636,24 @@ class WAEngine:
         
         if await self.start_baileys_server():
             logger.info("✅ WhatsApp service started successfully")
-            self.message_poll_task = asyncio.create_task(
-                self.poll_messages(bot, owner_id)
-            )
+            self.start_polling()
         else:
             logger.error("❌ Failed to start Baileys server")
             self.active = False
-        
-        while self.active:
-            await asyncio.sleep(60)
+
+    async def handle_command(self, kind, payload):
+        """Commands sent by the console to a worker process over the job queue"""
+        if kind == "set_active":
+            if payload.get("active") and not self.active:
+                await self.start_all(getattr(self, 'bot', None), getattr(self, 'owner_id', None))
+            elif not payload.get("active") and self.active:
+                self.active = False
+                self.scheduler.cancel("wa_poll")
+        elif kind == "reload_inventory":
+            await self.storage.reload_inventory()
+        else:
+            logger.warning(f"Unknown worker command: {kind}")
+
+    def start_polling(self):
+        """Run the message poll loop as a supervised scheduler service"""
+        self.scheduler.service("wa_poll", lambda: self.poll_messages(self.bot, self.owner_id))
@@ -0,0 +1,107 @@
+# wa_worker.py - WhatsApp worker process: answers customer messages off the Telegram console's core
+# Usage: python wa_worker.py --id wa-0 --poller    (normally started by launcher.py)
+import argparse
+import asyncio
+import logging
+import os
+import signal
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from brain import GroqBrain
+from storage import Storage
+from wa_engine import WAEngine
+from scheduler import Scheduler
+from jobqueue import JobQueue
+import metrics
+import loop_watchdog
+from traffic import recorder_from_env
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+logger = logging.getLogger("WAWorker")
+
+async def run(worker_id, poller):
+    storage = Storage()
+    # The console keeps the shared search index in sync; workers only read it
+    storage.maintain_search_index = False
+    scheduler = Scheduler()
+    brain = GroqBrain(os.getenv("GROQ_KEY", ""), storage)
+    wa = WAEngine(brain, storage, scheduler)
+    queue = JobQueue(storage.db_path, worker_id)
+    wa.inbox = queue
+    watchdog = loop_watchdog.LoopWatchdog(threshold=float(os.getenv("LOOP_STALL_THRESHOLD", "0.5")))
+
+    metrics_port = int(os.getenv("METRICS_PORT", "0"))
+    if metrics_port:
+        try:
+            metrics.serve(metrics_port)
+        except OSError as e:
+            logger.error(f"Metrics endpoint not started on port {metrics_port}: {e}")
+
+    async def on_command(kind, payload):
+        # Only the poller owns the Baileys server; repliers just keep draining the inbox
+        if kind == "set_active" and not poller:
+            wa.active = bool(payload.get("active"))
+            return
+        await wa.handle_command(kind, payload)
+
+    def heartbeat():
+        queue.heartbeat("wa", {
+            "poller": poller,
+            "active": wa.active,
+            "baileys": bool(wa.baileys_process and wa.baileys_process.returncode is None),
+            "status": wa.status_snapshot() if poller else None,
+        })
+
+    heartbeat()
+    scheduler.every("heartbeat", 5, heartbeat)
+    scheduler.service("commands", lambda: queue.consume(f"worker:{worker_id}", on_command))
+    # Leave the inbox alone while WhatsApp is switched off from the console
+    scheduler.service("inbox", lambda: queue.consume(
+        "wa_inbox", lambda kind, msg: wa.process_message(msg, None, None), ready=lambda: wa.active
+    ))
+    if poller:
+        scheduler.every("requeue_stale", 60, queue.requeue_stale)
+        scheduler.cron("prune_jobs", "30 3 * * *", queue.prune)
+    scheduler.every("audit_flush", 5, storage.flush_actions)
+
+    watchdog.start()
+    await scheduler.start()
+    scheduler.spawn("warm_up", storage.warm_up)
+    if poller:
+        wa.recorder = recorder_from_env(worker_id)
+        scheduler.spawn("wa_start", lambda: wa.start_all(None, None))
+    else:
+        wa.active = True
+    logger.info(f"WhatsApp worker {worker_id} running ({'poller' if poller else 'replier'})")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    try:
+        await stop.wait()
+    finally:
+        logger.info(f"WhatsApp worker {worker_id} shutting down...")
+        await watchdog.stop()
+        await scheduler.shutdown()
+        if poller:
+            await wa.stop_baileys_server()
+            if wa.recorder:
+                wa.recorder.close()
+        storage.flush_actions()
+
+def main():
+    parser = argparse.ArgumentParser(description="EMPIRE WhatsApp worker process")
+    parser.add_argument("--id", default=f"wa-{os.getpid()}", help="worker id, also its command queue name")
+    parser.add_argument("--poller", action="store_true", help="own the Baileys server and poll for messages")
+    args = parser.parse_args()
+    asyncio.run(run(args.id, args.poller))
+
+if __name__ == "__main__":
+    main()